@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import json
+import sys
+from optparse import OptionParser
+
+from src import logging_utils
+from src.benchmark_suite import BenchmarkSuite
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-o", "--output_json_file_path",
+                      type="str",
+                      default="benchmark_results.json",
+                      help="Where to write the benchmark results.")
+    parser.add_option("-b", "--baseline_json_file_path",
+                      type="str",
+                      default=None,
+                      help="Results of a previous run - exit with an error if any benchmark regressed.")
+    parser.add_option("-t", "--tolerance",
+                      type="float",
+                      default=BenchmarkSuite.DEFAULT_TOLERANCE,
+                      help="Allowed slowdown relative to the baseline, e.g. 0.25 for 25%.")
+    parser.add_option("-r", "--repeats",
+                      type="int",
+                      default=BenchmarkSuite.DEFAULT_REPEATS,
+                      help="How many times to repeat every benchmark.")
+    parser.add_option("-s", "--image_sizes",
+                      type="str",
+                      default=",".join(f"{w}x{h}" for w, h in BenchmarkSuite.DEFAULT_IMAGE_SIZES),
+                      help="Comma separated image sizes, e.g. 512x384,2048x1536.")
+    params, _ = parser.parse_args()
+
+    logging_utils.init_logger()
+    image_sizes = [tuple(int(s) for s in image_size.split("x")) for image_size in params.image_sizes.split(",")]
+    suite = BenchmarkSuite(image_sizes, params.repeats)
+    results = suite.run()
+    suite.write_json(params.output_json_file_path)
+    suite.release()
+
+    if params.baseline_json_file_path is not None:
+        baseline = json.load(open(params.baseline_json_file_path, 'r'))
+        regressions = BenchmarkSuite.find_regressions(results, baseline, params.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
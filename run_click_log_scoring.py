@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import os
+from optparse import OptionParser
+
+from PIL import Image
+
+from src import logging_utils
+from src.click_log_scoring import ClickLogScorer
+from src.graphic_engine.image_source import MAXIMAL_IMAGE_PIXELS
+from src.scene_session import Scene, SceneSession
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="%prog [options] click_log.csv|click_log.ndjson")
+    parser.add_option("-p", "--playlist",
+                      type="str",
+                      default=None,
+                      help="JSON list of the scenes that the clicks refer to (by index), "
+                           "by default the where-is-waldo image in the data folder.")
+    parser.add_option("-o", "--results_file_path",
+                      type="str",
+                      default=None,
+                      help="Where to write the scored clicks, CSV if it ends with .csv and NDJSON otherwise.")
+    parser.add_option("-s", "--summary_json_file_path",
+                      type="str",
+                      default="click_log_summary.json",
+                      help="Where to write the hits and distances of every scene.")
+    parser.add_option("-j", "--num_processes",
+                      type="int",
+                      default=None,
+                      help="How many processes score the clicks, by default the number of CPUs.")
+    parser.add_option("-c", "--chunk_size_clicks",
+                      type="int",
+                      default=ClickLogScorer.DEFAULT_CHUNK_SIZE_CLICKS,
+                      help="How many clicks every process scores at once.")
+    params, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error("Expected a single click log file")
+
+    logging_utils.init_logger()
+    Image.MAX_IMAGE_PIXELS = MAXIMAL_IMAGE_PIXELS
+    if params.playlist is not None:
+        scenes = SceneSession.load_playlist(params.playlist)
+    else:
+        scenes = [Scene(os.path.join("data", "where_is_waldo.jpeg"), os.path.join("data", "waldo_bounding_box.json"))]
+    ClickLogScorer(scenes, params.num_processes, params.chunk_size_clicks).score(
+        args[0], params.results_file_path, params.summary_json_file_path)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+from optparse import OptionParser
+
+from PIL import Image
+
+from src import logging_utils
+from src.benchmark_suite import BenchmarkSuite
+from src.bounding_box import BoundingBoxCollection
+from src.graphic_engine.image_source import MAXIMAL_IMAGE_PIXELS
+from src.headless_runner import HeadlessRunner
+from src.input_recording import InputReplayer
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="%prog [options] input_log")
+    parser.add_option("-i", "--image_path",
+                      type="str",
+                      default=os.path.join("data", "where_is_waldo.jpeg"),
+                      help="The image of the recorded session.")
+    parser.add_option("-w", "--waldo_bounding_box_json_file_path",
+                      type="str",
+                      default=os.path.join("data", "waldo_bounding_box.json"),
+                      help="Bounding box of where is waldo.")
+    parser.add_option("-H", "--headless",
+                      default=False,
+                      action="store_true",
+                      help="Replay with the headless runner, without a window.")
+    parser.add_option("-R", "--real_time",
+                      default=False,
+                      action="store_true",
+                      help="Keep the recorded delays between events, instead of replaying as fast as possible.")
+    parser.add_option("-m", "--minimap",
+                      default=False,
+                      action="store_true",
+                      help="Show the minimap, to replay the clicks on it (headless replays always apply them).")
+    parser.add_option("-o", "--output_json_file_path",
+                      type="str",
+                      default="replay_results.json",
+                      help="Where to write the latency of every event, and a summary per event type.")
+    parser.add_option("-b", "--baseline_json_file_path",
+                      type="str",
+                      default=None,
+                      help="Results of a previous replay - exit with an error if any event type regressed.")
+    parser.add_option("-t", "--tolerance",
+                      type="float",
+                      default=BenchmarkSuite.DEFAULT_TOLERANCE,
+                      help="Allowed slowdown relative to the baseline, e.g. 0.25 for 25%.")
+    params, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error("Expected a single input log file")
+
+    Image.MAX_IMAGE_PIXELS = MAXIMAL_IMAGE_PIXELS
+    if params.headless:
+        logging_utils.init_logger()
+        replayer = InputReplayer(args[0])
+        runner = HeadlessRunner(Image.open(params.image_path), replayer.initial_window_size,
+                                BoundingBoxCollection.from_file(params.waldo_bounding_box_json_file_path))
+        results = replayer.replay(runner, params.real_time)
+        runner.destroy()
+    else:
+        from src.window_manager import WindowManager
+        app = WindowManager(params.image_path, params.waldo_bounding_box_json_file_path, use_image_cache=False,
+                            minimap=params.minimap)
+        results = app.replay_input(args[0], params.real_time)
+
+    json.dump(results, open(params.output_json_file_path, 'w'), indent=4)
+    for name, result in results["results"].items():
+        print(f"{name}: {result['count']} events, median {result['median_ms']:.3f}ms, p99 {result['p99_ms']:.3f}ms")
+
+    if params.baseline_json_file_path is not None:
+        baseline = json.load(open(params.baseline_json_file_path, 'r'))
+        regressions = BenchmarkSuite.find_regressions(results, baseline, params.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
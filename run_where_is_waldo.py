@@ -2,7 +2,7 @@
 import os
 from optparse import OptionParser
 
-from src.window_manager import WindowManager
+from src.startup_profiler import get_startup_profiler
 
 if __name__ == '__main__':
     parser = OptionParser()
@@ -18,11 +18,73 @@ if __name__ == '__main__':
                       default=False,
                       action="store_true",
                       help="Use this flag if you wish to see debug logs.")
+    parser.add_option("-g", "--gpu_markers",
+                      default=False,
+                      action="store_true",
+                      help="Use this flag to draw the failed detections with the graphic engine.")
+    parser.add_option("-c", "--image_cache_folder",
+                      type="str",
+                      default=None,
+                      help="Where to cache decoded images, so reopening an image is faster.")
+    parser.add_option("-n", "--no_image_cache",
+                      default=False,
+                      action="store_true",
+                      help="Use this flag to decode the image on every launch, without caching it.")
+    parser.add_option("-p", "--playlist",
+                      type="str",
+                      default=None,
+                      help="JSON list of scenes ({\"image_path\": ..., \"bounding_box_file_path\": ...}) to play "
+                           "one after the other, press 'n' and 'p' to move between them.")
+    parser.add_option("-f", "--profile_frames",
+                      default=False,
+                      action="store_true",
+                      help="Time the stages of every frame (F2 toggles it, F3 shows a HUD, F4 exports a trace).")
+    parser.add_option("-s", "--profile_startup", "--profile-startup",
+                      default=False,
+                      action="store_true",
+                      help="Print how long the imports and every step of the startup took, up to the first frame.")
+    parser.add_option("-r", "--record_input",
+                      type="str",
+                      default=None,
+                      help="Record the input events to this file, to replay them with run_input_replay.")
+    parser.add_option("-m", "--minimap",
+                      default=False,
+                      action="store_true",
+                      help="Show the whole image in a corner of the window, click on it to move the view.")
+    parser.add_option("-a", "--asyncio",
+                      default=False,
+                      action="store_true",
+                      help="Run the window in an asyncio loop, instead of the Tk main loop.")
     params, _ = parser.parse_args()
 
-    if params.image_path is None:
+    # The app (and with it Tkinter, ModernGL, NumPy, PyGLM and PIL) is only imported once the options are parsed,
+    # so --help and option errors are instant
+    startup_profiler = get_startup_profiler()
+    startup_profiler.enabled = params.profile_startup
+    if params.profile_startup:
+        startup_profiler.import_modules()
+    with startup_profiler.stage("import the app"):
+        from PIL import Image
+
+        from src.graphic_engine.image_source import MAXIMAL_IMAGE_PIXELS
+        from src.scene_session import SceneSession
+        from src.window_manager import WindowManager
+    Image.MAX_IMAGE_PIXELS = MAXIMAL_IMAGE_PIXELS
+
+    more_scenes = []
+    if params.playlist is not None:
+        first_scene, *more_scenes = SceneSession.load_playlist(params.playlist)
+        params.image_path, params.waldo_bounding_box_json_file_path = first_scene.image_path, \
+            first_scene.bounding_box_file_path
+    elif params.image_path is None:
         params.image_path = os.path.join("data", "where_is_waldo.jpeg")
         params.waldo_bounding_box_json_file_path = os.path.join("data", "waldo_bounding_box.json")
 
-    app = WindowManager(params.image_path, params.waldo_bounding_box_json_file_path, params.debug)
-    app.run()
+    app = WindowManager(params.image_path, params.waldo_bounding_box_json_file_path, params.debug,
+                        params.gpu_markers, params.image_cache_folder, not params.no_image_cache, more_scenes,
+                        params.profile_frames, params.record_input, params.minimap)
+    if params.asyncio:
+        import asyncio
+        asyncio.run(app.run_async())
+    else:
+        app.run()
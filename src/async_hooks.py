@@ -0,0 +1,89 @@
+import collections
+
+from attr import dataclass
+
+from src.logging_utils import get_logger
+
+
+@dataclass
+class ClickEvent:
+    """A click on the image, in both *window pixels* and *image pixels*."""
+    scene_index: int
+    x_window_pixels: int
+    y_window_pixels: int
+    x_image_pixels: int
+    y_image_pixels: int
+    is_hit: bool
+
+
+class AsyncEventHooks:
+    """
+    Lets coroutines react to the events of the window, when it runs in an asyncio loop (see WindowManager.run_async):
+
+    `await hooks.wait_for(AsyncEventHooks.CLICK)` returns the value of the next click,
+    and `hooks.add_callback(AsyncEventHooks.CLICK, coroutine_function)` runs coroutine_function(value) as a task
+    on every click - so the handler returns right away, and the task does its I/O without stalling a frame.
+
+    The events are fired by the Tk handlers, which run on the thread of the loop (inside root.update()),
+    so futures are resolved directly. Without a running loop (e.g. in WindowManager.run), firing does nothing,
+    and asyncio is not even imported - it is only imported once a coroutine waits for an event or handles one.
+    """
+    CLICK = "click"  # A ClickEvent
+    RESIZE = "resize"  # The new window size
+    DETECTION = "detection"  # The ClickEvent of the click that found the target
+
+    def __init__(self):
+        self._logger = get_logger()
+        # {event: [asyncio.Future]}
+        self._waiters: {str: list} = collections.defaultdict(list)
+        self._callbacks: {str: list} = collections.defaultdict(list)
+        # Tasks are referenced until they are done, otherwise they may be garbage collected while running
+        self._tasks: set = set()
+
+    def wait_for(self, event: str):
+        """:return: An asyncio.Future of the value of the next event."""
+        import asyncio
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[event] += [future]
+        return future
+
+    def add_callback(self, event: str, coroutine_function):
+        self._callbacks[event] += [coroutine_function]
+
+    def remove_callback(self, event: str, coroutine_function):
+        self._callbacks[event].remove(coroutine_function)
+
+    def fire(self, event: str, value):
+        waiters, self._waiters[event] = self._waiters[event], []
+        for future in waiters:
+            if not future.done():
+                future.set_result(value)
+        if len(self._callbacks[event]) == 0:
+            return
+        import asyncio
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        for coroutine_function in self._callbacks[event]:
+            task = loop.create_task(coroutine_function(value))
+            self._tasks.add(task)
+            task.add_done_callback(self._on_task_done)
+
+    def cancel_all(self):
+        """Cancels the futures that are still waited for and the running callbacks, e.g. when the window closes."""
+        for waiters in self._waiters.values():
+            for future in waiters:
+                future.cancel()
+        self._waiters.clear()
+        for task in list(self._tasks):
+            task.cancel()
+
+    @property
+    def num_running_tasks(self) -> int:
+        return len(self._tasks)
+
+    def _on_task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._logger.error("An event callback failed", exc_info=task.exception())
@@ -0,0 +1,195 @@
+import itertools
+import json
+import platform
+import statistics
+import time
+
+import moderngl
+import numpy as np
+from PIL import Image
+
+from src.bounding_box import BoundingBoxCollection
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+from src.graphic_engine.graphic_engine import GraphicEngine
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer
+from src.headless_runner import HeadlessRunner, create_headless_context
+from src.logging_utils import get_logger
+
+
+class BenchmarkSuite:
+    """
+    Measures the main stages of the app, using the headless runner, across image sizes.
+
+    Every benchmark is repeated, and its timings are summarized (in milliseconds).
+    Results are keyed by "<benchmark>/<width>x<height>" and can be compared to a stored baseline,
+    where a benchmark regressed if its median is slower than the baseline median by more than the tolerance.
+    """
+    DEFAULT_IMAGE_SIZES = ((512, 384), (2048, 1536), (4096, 3072))
+    DEFAULT_REPEATS = 10
+    DEFAULT_TOLERANCE = 0.25
+    NUM_CLICKS = 100000
+    NUM_BOUNDING_BOXES = 1000
+    RESIZE_STEPS = 20
+    PAN_STEP_PIXELS = 8
+    PAN_ZOOM = 4.0
+
+    def __init__(self, image_sizes: [(int, int)] = DEFAULT_IMAGE_SIZES, repeats: int = DEFAULT_REPEATS,
+                 context: moderngl.Context = None):
+        self._logger = get_logger()
+        self.image_sizes = [tuple(image_size) for image_size in image_sizes]
+        self.repeats = repeats
+        # A context that is passed in is released by whoever created it
+        self._owns_context = context is None
+        self.context = context or create_headless_context()
+        self.results = {}
+
+    def release(self):
+        if self._owns_context:
+            GraphicEngineInitializer.release_programs(self.context)
+            self.context.release()
+
+    def run(self) -> dict:
+        for image_size in self.image_sizes:
+            image = self._random_image(image_size)
+            self._benchmark_startup(image)
+            self._benchmark_texture_upload(image)
+
+            runner = HeadlessRunner(image, context=self.context)
+            self._benchmark_render(runner)
+            for mode in (FramebufferReadback.MODE_READ, FramebufferReadback.MODE_READ_INTO,
+                         FramebufferReadback.MODE_PIXEL_BUFFERS):
+                self._benchmark_readback(runner, mode)
+            self._benchmark_pan(runner)
+            self._benchmark_resize(runner)
+            self._benchmark_hit_test(runner, image_size)
+            runner.destroy()
+        return self.to_dict()
+
+    def to_dict(self) -> dict:
+        return {"environment": {"python": platform.python_version(),
+                                "platform": platform.platform(),
+                                "renderer": self.context.info.get('GL_RENDERER')},
+                "results": self.results}
+
+    def write_json(self, json_file_path: str):
+        json.dump(self.to_dict(), open(json_file_path, 'w'), indent=4)
+
+    @staticmethod
+    def find_regressions(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> [str]:
+        """:return: A description of every benchmark that is slower than its baseline by more than the tolerance."""
+        regressions = []
+        for name, baseline_result in baseline["results"].items():
+            if name not in results["results"]:
+                continue
+            median_ms, baseline_median_ms = results["results"][name]["median_ms"], baseline_result["median_ms"]
+            if median_ms > baseline_median_ms * (1 + tolerance):
+                regressions += [f"{name}: {median_ms:.3f}ms, baseline {baseline_median_ms:.3f}ms"]
+        return regressions
+
+    def _record(self, name: str, image_size: (int, int), timings_seconds: [float], **extra):
+        timings_ms = [t * 1000 for t in timings_seconds]
+        key = f"{name}/{image_size[0]}x{image_size[1]}"
+        self.results[key] = dict(median_ms=statistics.median(timings_ms), min_ms=min(timings_ms),
+                                 mean_ms=statistics.mean(timings_ms), repeats=len(timings_ms), **extra)
+        self._logger.info(f"{key}: median {self.results[key]['median_ms']:.3f}ms")
+
+    def _time(self, callback, setup=None) -> [float]:
+        timings = []
+        for _ in range(self.repeats):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            callback()
+            # Wait for the GPU, otherwise we only measure how long it takes to queue the commands
+            self.context.finish()
+            timings += [time.perf_counter() - start]
+        return timings
+
+    def _benchmark_startup(self, image: Image):
+        engines = []
+        self._record("startup", image.size, self._time(lambda: engines.append(GraphicEngine(self.context, image.size,
+                                                                                            image))))
+        for graphic_engine in engines:
+            graphic_engine.destroy()
+
+    def _benchmark_texture_upload(self, image: Image):
+        initializer, textures = GraphicEngineInitializer(), []
+        self._record("texture_upload", image.size,
+                     self._time(lambda: textures.append(initializer.load_image_to_texture(self.context, image))))
+        for texture in textures:
+            texture.release()
+
+    def _benchmark_render(self, runner: HeadlessRunner):
+        def render():
+            with runner.readback.scope:
+                runner.graphic_engine.clear()
+                runner.graphic_engine.render(flip_y=runner.readback.flip_y_in_projection)
+        self._record("render", runner.window_size, self._time(render))
+
+    def _benchmark_readback(self, runner: HeadlessRunner, mode: str):
+        readback = FramebufferReadback(self.context, runner.window_size, mode)
+
+        def render():
+            with readback.scope:
+                runner.graphic_engine.clear()
+                runner.graphic_engine.render(flip_y=readback.flip_y_in_projection)
+
+        def finish_and_take():
+            readback.finish_frame()
+            readback.take_pixels()
+
+        self._record(f"readback_{mode}", runner.window_size, self._time(finish_and_take, setup=render),
+                     bytes_copied=readback.bytes_copied_last_frame)
+        readback.release()
+
+    def _benchmark_pan(self, runner: HeadlessRunner):
+        """A small pan only renders and reads back the strip it exposed (see DamageTracker)."""
+        readback = FramebufferReadback(self.context, runner.window_size, FramebufferReadback.MODE_READ_INTO)
+        graphic_engine = runner.graphic_engine
+        graphic_engine.zoom(self.PAN_ZOOM, runner.window_size[0] // 2, runner.window_size[1] // 2)
+        graphic_engine.damage.take()
+        # Back and forth, so the pan never reaches the edge of the image
+        directions = itertools.cycle((1, -1))
+
+        def pan():
+            graphic_engine.pan(self.PAN_STEP_PIXELS * next(directions), 0)
+            damage = graphic_engine.damage.take()
+            rects = None if damage.is_full else damage.rects
+            with readback.scope:
+                if rects is None:
+                    graphic_engine.clear()
+                graphic_engine.render(flip_y=readback.flip_y_in_projection, rects=rects)
+            readback.finish_frame(rects)
+            readback.take_regions()
+
+        self._record("pan", runner.window_size, self._time(pan), bytes_copied=readback.bytes_copied_last_frame)
+        graphic_engine.reset_view()
+        readback.release()
+
+    def _benchmark_resize(self, runner: HeadlessRunner):
+        original_size = tuple(runner.window_size)
+        # A drag-resize from half the size up to the original size
+        sizes = [(int(original_size[0] * (0.5 + 0.5 * step / self.RESIZE_STEPS)),
+                  int(original_size[1] * (0.5 + 0.5 * step / self.RESIZE_STEPS)))
+                 for step in range(1, self.RESIZE_STEPS + 1)]
+
+        def resize_storm():
+            for size in sizes:
+                runner.resize(size)
+                runner.render()
+        self._record("resize", original_size, self._time(resize_storm, setup=lambda: runner.resize(sizes[0])))
+
+    def _benchmark_hit_test(self, runner: HeadlessRunner, image_size: (int, int)):
+        random_state = np.random.RandomState(0)
+        left_top = random_state.randint(0, image_size, (self.NUM_BOUNDING_BOXES, 2))
+        # Boxes of up to 2% of the image, like small targets in a large scene
+        max_box_size = np.maximum(2, np.asarray(image_size) // 50)
+        right_bottom = left_top + random_state.randint(1, max_box_size + 1, (self.NUM_BOUNDING_BOXES, 2))
+        runner.bounding_boxes = BoundingBoxCollection(np.hstack([left_top, right_bottom]))
+        clicks = random_state.randint(0, runner.window_size, (self.NUM_CLICKS, 2))
+        self._record("hit_test", image_size, self._time(lambda: runner.hit_test(clicks)), clicks=self.NUM_CLICKS)
+
+    @staticmethod
+    def _random_image(image_size: (int, int)) -> Image:
+        pixels = np.random.RandomState(0).randint(0, 256, (image_size[1], image_size[0], 3), dtype=np.uint8)
+        return Image.fromarray(pixels, 'RGB')
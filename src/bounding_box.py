@@ -1,5 +1,6 @@
 import json
 
+import numpy as np
 from attr import dataclass
 
 
@@ -27,3 +28,189 @@ class BoundingBox:
 
     def contains(self, x, y):
         return self.left <= x <= self.right and self.top <= y <= self.bottom
+
+
+class BoundingBoxCollection:
+    """
+    Many labeled bounding boxes (e.g. targets and distractors) in *image pixels* coordinates.
+
+    The boxes are stored as an (N, 4) array of (left, top, right, bottom), and indexed by a uniform grid:
+    every grid cell holds the indices of the boxes that overlap it, so a query only checks the boxes in its cells.
+
+    Boxes are inclusive on all sides, like BoundingBox.contains.
+    When a point is inside several boxes, the smallest one is considered the hit.
+    """
+    DEFAULT_LABEL = "waldo"
+    BOX_KEYS = ("left", "top", "right", "bottom")
+
+    def __init__(self, boxes: np.ndarray, labels: [str] = None, grid_cell_size_pixels: int = None):
+        self.boxes: np.ndarray = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        self.labels: [str] = list(labels) if labels is not None else [self.DEFAULT_LABEL] * len(self.boxes)
+        if len(self.labels) != len(self.boxes):
+            raise ValueError(f"Got {len(self.labels)} labels for {len(self.boxes)} bounding boxes")
+        # Every box's label as an integer code, so label queries compare arrays instead of strings
+        self._label_codes_by_label: {str: int} = {}
+        self._label_codes = np.array([self._label_codes_by_label.setdefault(label, len(self._label_codes_by_label))
+                                      for label in self.labels], dtype=np.int32)
+        self._areas = ((self.boxes[:, 2] - self.boxes[:, 0] + 1).astype(np.int64)
+                       * (self.boxes[:, 3] - self.boxes[:, 1] + 1))
+        self._build_grid(grid_cell_size_pixels)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __getitem__(self, idx: int) -> BoundingBox:
+        return BoundingBox(*self.boxes[idx].tolist())
+
+    def indices_of_label(self, label: str) -> [int]:
+        return np.flatnonzero(self._label_codes == self._label_codes_by_label.get(label, -1)).tolist()
+
+    @staticmethod
+    def from_bounding_boxes(bounding_boxes: [BoundingBox], labels: [str] = None):
+        return BoundingBoxCollection([bounding_box.to_list() for bounding_box in bounding_boxes], labels)
+
+    @staticmethod
+    def from_dicts(dicts: [dict]):
+        boxes = [[d[key] for key in BoundingBoxCollection.BOX_KEYS] for d in dicts]
+        labels = [d.get("label", BoundingBoxCollection.DEFAULT_LABEL) for d in dicts]
+        return BoundingBoxCollection(boxes, labels)
+
+    @staticmethod
+    def from_json(json_file_path: str):
+        """Supports a single box (like BoundingBox.from_json), a list of boxes, or {"boxes": [...]}."""
+        d = json.load(open(json_file_path, 'r'))
+        if isinstance(d, dict):
+            d = d["boxes"] if "boxes" in d else [d]
+        return BoundingBoxCollection.from_dicts(d)
+
+    @staticmethod
+    def from_ndjson(ndjson_file_path: str):
+        with open(ndjson_file_path, 'r') as f:
+            return BoundingBoxCollection.from_dicts([json.loads(line) for line in f if line.strip()])
+
+    @staticmethod
+    def from_file(file_path: str):
+        if file_path.endswith((".ndjson", ".jsonl")):
+            return BoundingBoxCollection.from_ndjson(file_path)
+        return BoundingBoxCollection.from_json(file_path)
+
+    def to_json(self, json_file_path: str):
+        d = [dict(zip(self.BOX_KEYS, box), label=label) for box, label in zip(self.boxes.tolist(), self.labels)]
+        json.dump(d, open(json_file_path, 'w'), indent=4)
+
+    def contains(self, points: np.ndarray) -> np.ndarray:
+        """
+        :param points: (M, 2) array of (x, y) in *image pixels*.
+        :return: (M,) array with the index of the (smallest) box that contains each point, or -1 if there is none.
+        """
+        points = np.asarray(points).reshape(-1, 2)
+        hits = np.full(len(points), -1, dtype=np.int64)
+        point_indices, box_indices = self._containing_pairs(points)
+        if len(box_indices) == 0:
+            return hits
+
+        # Sort by point and then by area, so the first hit of every point is its smallest box
+        order = np.lexsort((box_indices, self._areas[box_indices], point_indices))
+        point_indices, box_indices = point_indices[order], box_indices[order]
+        unique_point_indices, first = np.unique(point_indices, return_index=True)
+        hits[unique_point_indices] = box_indices[first]
+        return hits
+
+    def contains_label(self, points: np.ndarray, label: str) -> np.ndarray:
+        """
+        Unlike contains, a point inside a box with the label is a hit even if a smaller box with another label
+        (e.g. a distractor that overlaps the target) also contains it.
+        :param points: (M, 2) array of (x, y) in *image pixels*.
+        :return: (M,) boolean array, whether any box with the label contains each point.
+        """
+        points = np.asarray(points).reshape(-1, 2)
+        hits = np.zeros(len(points), dtype=bool)
+        if label not in self._label_codes_by_label:
+            return hits
+        point_indices, box_indices = self._containing_pairs(points)
+        hits[point_indices[self._label_codes[box_indices] == self._label_codes_by_label[label]]] = True
+        return hits
+
+    def query_point(self, x: float, y: float) -> np.ndarray:
+        """:return: Sorted indices of all the boxes that contain the point."""
+        cell = self._cell_of_points(np.array([[x, y]]))[0]
+        if cell < 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = self._cell_boxes[self._cell_offsets[cell]:self._cell_offsets[cell + 1]]
+        boxes = self.boxes[candidates]
+        is_inside = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+        return np.sort(candidates[is_inside])
+
+    def query_rect(self, left: float, top: float, right: float, bottom: float) -> np.ndarray:
+        """:return: Sorted indices of all the boxes that intersect the rectangle."""
+        if len(self.boxes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        first_column, first_row = self._clipped_cell_coordinates(left, top)
+        last_column, last_row = self._clipped_cell_coordinates(right, bottom)
+        cells = (np.arange(first_row, last_row + 1)[:, None] * self._grid_shape[0]
+                 + np.arange(first_column, last_column + 1)[None, :]).ravel()
+        _, candidates = self._candidates(cells)
+        candidates = np.unique(candidates)
+        boxes = self.boxes[candidates]
+        intersects = (boxes[:, 0] <= right) & (left <= boxes[:, 2]) & (boxes[:, 1] <= bottom) & (top <= boxes[:, 3])
+        return candidates[intersects]
+
+    def _build_grid(self, grid_cell_size_pixels: int):
+        if len(self.boxes) == 0:
+            self._grid_origin, self._grid_shape, self._cell_size = np.zeros(2), (0, 0), 1
+            self._cell_offsets, self._cell_boxes = np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            return
+
+        sizes = self.boxes[:, 2:] - self.boxes[:, :2] + 1
+        # Cells about the size of a typical box keep both the cells per box and the boxes per cell small
+        self._cell_size = int(grid_cell_size_pixels or max(1, int(np.median(sizes))))
+        self._grid_origin = self.boxes[:, :2].min(axis=0)
+        self._grid_shape = tuple(((self.boxes[:, 2:].max(axis=0) - self._grid_origin) // self._cell_size + 1).tolist())
+
+        first_cells = (self.boxes[:, :2] - self._grid_origin) // self._cell_size
+        last_cells = (self.boxes[:, 2:] - self._grid_origin) // self._cell_size
+        cells_per_box = (last_cells - first_cells + 1).prod(axis=1)
+
+        # All (cell, box) pairs, sorted by cell, in a compressed sparse row layout
+        box_indices = np.repeat(np.arange(len(self.boxes)), cells_per_box)
+        offset_in_box = np.arange(cells_per_box.sum()) - np.repeat(np.cumsum(cells_per_box) - cells_per_box, cells_per_box)
+        columns_per_box = (last_cells[:, 0] - first_cells[:, 0] + 1)[box_indices]
+        columns = first_cells[box_indices, 0] + offset_in_box % columns_per_box
+        rows = first_cells[box_indices, 1] + offset_in_box // columns_per_box
+        cells = rows * self._grid_shape[0] + columns
+
+        order = np.argsort(cells, kind='stable')
+        self._cell_boxes = box_indices[order]
+        self._cell_offsets = np.zeros(self._grid_shape[0] * self._grid_shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self._grid_shape[0] * self._grid_shape[1]), out=self._cell_offsets[1:])
+
+    def _cell_of_points(self, points: np.ndarray) -> np.ndarray:
+        """:return: The grid cell of every point, or -1 if it is outside of the grid."""
+        if len(self.boxes) == 0:
+            return np.full(len(points), -1, dtype=np.int64)
+        cell_coordinates = np.floor((points - self._grid_origin) / self._cell_size).astype(np.int64)
+        inside = np.all((cell_coordinates >= 0) & (cell_coordinates < np.asarray(self._grid_shape)), axis=1)
+        return np.where(inside, cell_coordinates[:, 1] * self._grid_shape[0] + cell_coordinates[:, 0], -1)
+
+    def _clipped_cell_coordinates(self, x: float, y: float) -> (int, int):
+        column = int(np.floor((x - self._grid_origin[0]) / self._cell_size))
+        row = int(np.floor((y - self._grid_origin[1]) / self._cell_size))
+        return min(max(column, 0), self._grid_shape[0] - 1), min(max(row, 0), self._grid_shape[1] - 1)
+
+    def _containing_pairs(self, points: np.ndarray) -> (np.ndarray, np.ndarray):
+        """:return: (point index, box index) for every box that contains every point."""
+        point_indices, box_indices = self._candidates(self._cell_of_points(points))
+        if len(box_indices) == 0:
+            return point_indices, box_indices
+        candidate_points, candidate_boxes = points[point_indices], self.boxes[box_indices]
+        is_inside = ((candidate_boxes[:, 0] <= candidate_points[:, 0]) & (candidate_points[:, 0] <= candidate_boxes[:, 2])
+                     & (candidate_boxes[:, 1] <= candidate_points[:, 1]) & (candidate_points[:, 1] <= candidate_boxes[:, 3]))
+        return point_indices[is_inside], box_indices[is_inside]
+
+    def _candidates(self, cells: np.ndarray) -> (np.ndarray, np.ndarray):
+        """:return: (index into cells, box index) for every box in every cell, cells that are -1 are skipped."""
+        valid = np.flatnonzero(cells >= 0)
+        starts = self._cell_offsets[cells[valid]]
+        counts = self._cell_offsets[cells[valid] + 1] - starts
+        offset_in_cell = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(valid, counts), self._cell_boxes[np.repeat(starts, counts) + offset_in_cell]
@@ -0,0 +1,348 @@
+import collections
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+from PIL import Image
+
+from src.bounding_box import BoundingBoxCollection
+from src.graphic_engine import coordinate_transforms
+from src.logging_utils import get_logger
+from src.scene_session import Scene
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+
+
+def file_format(file_path: str) -> str:
+    return FORMAT_CSV if file_path.lower().endswith(".csv") else FORMAT_NDJSON
+
+
+class ClickLogScorer:
+    """
+    Scores click logs (e.g. of annotation QA sessions) against scenes, without a display or a graphic context -
+    the clicks are converted to image pixels with the same math as GraphicEngine, using coordinate_transforms.
+
+    Every click is a CSV row or an NDJSON line with the fields:
+    scene: Index of the scene in the scenes list.
+    x, y: Window pixels of the click.
+    window_width, window_height: Optional, by default the size of the window when WindowManager opens the scene.
+    zoom, translation_x, translation_y: Optional, the view of GraphicEngine at the time of the click (1, 0, 0 by default).
+    Any other field (e.g. a user name) is copied to the results as it is.
+
+    The results add to every click: image_x, image_y (image pixels), hit (whether it is in any target box, like
+    WindowManager._is_this_waldo), label (of the smallest clicked box, if any) and distance_pixels
+    (to the nearest target box, which is 0 exactly for hits).
+    Clicks without a position, or without the index of one of the scenes, are skipped (and counted in the summary).
+
+    The click log is streamed in chunks of raw records (lines, or the lines of a CSV row with quoted line breaks),
+    which are parsed and scored by a process pool -
+    all the clicks of a scene in a chunk are scored at once with numpy. The results are written in the order
+    of the click log as the chunks complete, and a summary of every scene is updated after every chunk.
+    """
+    VIEW_FIELDS_DEFAULTS = {"window_width": None, "window_height": None,
+                            "zoom": 1.0, "translation_x": 0.0, "translation_y": 0.0}
+    RESULT_FIELDS = ("image_x", "image_y", "hit", "label", "distance_pixels")
+    TARGET_LABEL = BoundingBoxCollection.DEFAULT_LABEL
+    # Same as WindowManager.MAXIMAL_WINDOW_SIZE, which is not imported so that Tkinter is not needed
+    MAXIMAL_WINDOW_SIZE = (1600, 1200)
+    DEFAULT_CHUNK_SIZE_CLICKS = 50000
+    # Chunks that are read ahead per process, so the pool is kept busy while memory stays bounded
+    CHUNKS_IN_FLIGHT_PER_PROCESS = 2
+
+    def __init__(self, scenes: [Scene], num_processes: int = None,
+                 chunk_size_clicks: int = DEFAULT_CHUNK_SIZE_CLICKS):
+        """:param num_processes: Defaults to the number of CPUs, 1 scores everything in this process."""
+        self._logger = get_logger()
+        self.scenes: [Scene] = list(scenes)
+        self.num_processes = num_processes or os.cpu_count() or 1
+        self.chunk_size_clicks = chunk_size_clicks
+
+    def score(self, click_log_path: str, results_path: str = None, summary_path: str = None) -> dict:
+        """
+        :param results_path: Where to write the scored clicks, CSV if it ends with .csv and NDJSON otherwise.
+        :param summary_path: Where to write the summary JSON, which is rewritten after every chunk.
+        :return: The summary - {"clicks": ..., "hits": ..., "skipped_clicks": ...,
+                                "scenes": [per scene counts and mean distance]}.
+        """
+        input_format = file_format(click_log_path)
+        output_format = file_format(results_path) if results_path is not None else None
+        totals = collections.defaultdict(lambda: np.zeros(4))
+        num_skipped = 0
+
+        with open(click_log_path, 'r', newline='') as click_log:
+            fields = self._input_fields(click_log, input_format)
+            output_fields = fields + [field for field in self.RESULT_FIELDS if field not in fields]
+            results = open(results_path, 'w', newline='') if results_path is not None else None
+            if output_format == FORMAT_CSV:
+                csv.writer(results, lineterminator="\n").writerow(output_fields)
+
+            records = _csv_records(click_log) if input_format == FORMAT_CSV else click_log
+            chunks = ((input_format, fields, output_format, output_fields, lines)
+                      for lines in iter(lambda: list(itertools.islice(records, self.chunk_size_clicks)), []))
+            for chunk_index, (text, scene_totals, chunk_num_skipped) in enumerate(self._map_chunks(chunks)):
+                if results is not None:
+                    results.write(text)
+                for scene_index, scene_total in scene_totals.items():
+                    totals[scene_index] += scene_total
+                if chunk_num_skipped > 0:
+                    self._logger.warning(f"Skipped {chunk_num_skipped} clicks of chunk {chunk_index} without a position "
+                                         f"or with a scene index that is not in 0..{len(self.scenes) - 1}")
+                num_skipped += chunk_num_skipped
+                summary = self._summary(totals, num_skipped)
+                if summary_path is not None:
+                    self._write_json(summary_path, summary)
+            if results is not None:
+                results.close()
+
+        summary = self._summary(totals, num_skipped)
+        if summary_path is not None:
+            self._write_json(summary_path, summary)
+        self._logger.info(f"Scored {summary['clicks']} clicks, {summary['hits']} of them hit a target")
+        return summary
+
+    def _map_chunks(self, chunks):
+        """Yields the results of the chunks in order, with at most a few chunks in memory at once."""
+        if self.num_processes == 1:
+            _init_worker(self.scenes, self.TARGET_LABEL, self.MAXIMAL_WINDOW_SIZE)
+            yield from map(_score_chunk, chunks)
+            return
+
+        # The image pixels limit is passed on, since the processes may not inherit it (depending on the start method)
+        with multiprocessing.Pool(self.num_processes, initializer=_init_worker,
+                                  initargs=(self.scenes, self.TARGET_LABEL, self.MAXIMAL_WINDOW_SIZE,
+                                            Image.MAX_IMAGE_PIXELS)) as pool:
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(_score_chunk, (chunk,)))
+                if len(pending) >= self.num_processes * self.CHUNKS_IN_FLIGHT_PER_PROCESS:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    @staticmethod
+    def _input_fields(click_log, input_format: str) -> [str]:
+        """Reads the CSV header, or peeks at the first NDJSON line (without consuming it)."""
+        if input_format == FORMAT_CSV:
+            return next(csv.reader([click_log.readline()]), [])
+        position = click_log.tell()
+        first_line = click_log.readline()
+        click_log.seek(position)
+        return list(json.loads(first_line).keys()) if first_line.strip() else []
+
+    def _summary(self, totals: {int: np.ndarray}, num_skipped: int) -> dict:
+        scenes = []
+        for scene_index in sorted(totals):
+            clicks, hits, distance_sum, distance_count = totals[scene_index].tolist()
+            scenes += [{"scene": scene_index, "image_path": self.scenes[scene_index].image_path,
+                        "clicks": int(clicks), "hits": int(hits), "hit_rate": hits / clicks if clicks else None,
+                        "mean_distance_pixels": distance_sum / distance_count if distance_count else None}]
+        return {"clicks": sum(scene["clicks"] for scene in scenes), "hits": sum(scene["hits"] for scene in scenes),
+                "skipped_clicks": num_skipped, "scenes": scenes}
+
+    @staticmethod
+    def _write_json(json_file_path: str, d: dict):
+        # Replaced in one step, so a reader never sees a partially written summary
+        temporary_path = json_file_path + ".tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(d, f, indent=4)
+        os.replace(temporary_path, json_file_path)
+
+
+class _SceneGeometry:
+    """What is needed to score the clicks of a scene, loaded once per process."""
+    def __init__(self, scene: Scene, target_label: str, maximal_window_size: (int, int)):
+        # Only the header is read, which is cheap
+        with Image.open(scene.image_path) as image:
+            self.image_size: (int, int) = image.size
+        self.window_size: [int, int] = coordinate_transforms.initial_window_size(self.image_size, maximal_window_size)
+        self.bounding_boxes = BoundingBoxCollection.from_file(scene.bounding_box_file_path)
+        self.target_label = target_label
+        self.target_boxes = self.bounding_boxes.boxes[self.bounding_boxes.indices_of_label(target_label)]
+
+    def score(self, points_window_pixels: np.ndarray, window_sizes: np.ndarray, zooms: np.ndarray,
+              translations_xy: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        """
+        :return: (image pixels, index of the (smallest) clicked box or -1, whether the click is in any target box,
+                  distance to the nearest target box or NaN).
+        """
+        window_sizes = np.where(np.isnan(window_sizes), self.window_size, window_sizes)
+        points_window_xy = coordinate_transforms.window_pixels_to_window_xy(points_window_pixels, window_sizes)
+        points_xy = coordinate_transforms.undo_zoom_and_translation(points_window_xy, zooms, translations_xy)
+        points_image_pixels = coordinate_transforms.xy_to_image_pixels(points_xy, self.image_size)
+        hits = self.bounding_boxes.contains(points_image_pixels)
+        # A target may be partly covered by a smaller box with another label, so a hit is not decided by hits
+        is_hit = self.bounding_boxes.contains_label(points_image_pixels, self.target_label)
+
+        if len(self.target_boxes) == 0:
+            return points_image_pixels, hits, is_hit, np.full(len(points_image_pixels), np.nan)
+        # Distance to a box is 0 inside of it, (N, targets) is small since scenes have a few targets
+        x, y = points_image_pixels[:, 0, None], points_image_pixels[:, 1, None]
+        dx = np.maximum(np.maximum(self.target_boxes[:, 0] - x, x - self.target_boxes[:, 2]), 0)
+        dy = np.maximum(np.maximum(self.target_boxes[:, 1] - y, y - self.target_boxes[:, 3]), 0)
+        return points_image_pixels, hits, is_hit, np.hypot(dx, dy).min(axis=1)
+
+
+# The state of every pool process, set once by _init_worker
+_worker_state = {}
+
+
+def _init_worker(scenes: [Scene], target_label: str, maximal_window_size: (int, int),
+                 max_image_pixels: int = None):
+    if max_image_pixels is not None:
+        Image.MAX_IMAGE_PIXELS = max_image_pixels
+    _worker_state.update(scenes=scenes, target_label=target_label, maximal_window_size=maximal_window_size,
+                         geometries={})
+
+
+def _scene_geometry(scene_index: int) -> _SceneGeometry:
+    geometries = _worker_state["geometries"]
+    if scene_index not in geometries:
+        geometries[scene_index] = _SceneGeometry(_worker_state["scenes"][scene_index], _worker_state["target_label"],
+                                                 _worker_state["maximal_window_size"])
+    return geometries[scene_index]
+
+
+def _csv_records(lines):
+    """Yields the CSV rows as they are, joining the lines of a row with quoted line breaks, so chunks never split it."""
+    record = ""
+    for line in lines:
+        record += line
+        # An odd number of quotes means a quoted field goes on in the next line ("" is an escaped quote)
+        if record.count('"') % 2 == 0:
+            yield record
+            record = ""
+    if record:
+        yield record
+
+
+def _csv_text(value) -> str:
+    """:return: The value as a CSV field, quoted if needed."""
+    if value is None:
+        return ""
+    text = io.StringIO()
+    csv.writer(text, lineterminator="").writerow([value])
+    return text.getvalue()
+
+
+class _Records:
+    """The clicks of a chunk - CSV rows are kept as lists (and as their text), NDJSON lines are parsed to dicts."""
+    def __init__(self, input_format: str, fields: [str], lines: [str]):
+        self.input_format = input_format
+        self.fields = fields
+        if input_format == FORMAT_CSV:
+            self.lines = [line.rstrip("\r\n") for line in lines if line.strip()]
+            self.rows = list(csv.reader(self.lines))
+        else:
+            self.rows = [json.loads(line) for line in lines if line.strip()]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def keep(self, mask: np.ndarray):
+        """Drops the clicks where mask is False."""
+        self.rows = [row for row, keep in zip(self.rows, mask.tolist()) if keep]
+        if self.input_format == FORMAT_CSV:
+            self.lines = [line for line, keep in zip(self.lines, mask.tolist()) if keep]
+
+    def column(self, field: str, default) -> np.ndarray:
+        """:return: The field of every click as float64, with default (None for NaN) where it is missing or empty."""
+        default = np.nan if default is None else default
+        if self.input_format == FORMAT_CSV:
+            if field not in self.fields:
+                return np.full(len(self.rows), default, dtype=np.float64)
+            field_index = self.fields.index(field)
+            values = np.array([row[field_index] for row in self.rows])
+            missing = values == ""
+        else:
+            values = np.array([row.get(field) for row in self.rows], dtype=object)
+            missing = np.equal(values, None) | np.equal(values, "")
+        values[missing] = "nan" if self.input_format == FORMAT_CSV else np.nan
+        try:
+            column = values.astype(np.float64)
+        except (TypeError, ValueError):
+            # Values that are not numbers are NaN, one by one only when there are any
+            column = np.array([_to_float(value) for value in values.tolist()], dtype=np.float64)
+        column[missing] = default
+        return column
+
+    def dicts(self) -> [dict]:
+        return [dict(zip(self.fields, row)) for row in self.rows] if self.input_format == FORMAT_CSV else self.rows
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _score_chunk(chunk) -> (str, {int: np.ndarray}, int):
+    """
+    :return: (the formatted results of the chunk,
+              {scene index: [clicks, hits, sum of the distances, number of distances]},
+              the number of clicks that were skipped).
+    """
+    input_format, fields, output_format, output_fields, lines = chunk
+    records = _Records(input_format, fields, lines)
+    if len(records) == 0:
+        return "", {}, 0
+    scenes = records.column("scene", None)
+    points = np.stack([records.column("x", None), records.column("y", None)], axis=1)
+    # NaN fails all the comparisons, so missing and unparsable values are invalid too
+    is_valid = ((scenes >= 0) & (scenes < len(_worker_state["scenes"])) & (scenes == np.floor(scenes))
+                & np.all(np.isfinite(points), axis=1))
+    num_skipped = len(records) - int(is_valid.sum())
+    if num_skipped > 0:
+        records.keep(is_valid)
+        scenes, points = scenes[is_valid], points[is_valid]
+        if len(records) == 0:
+            return "", {}, num_skipped
+    defaults = ClickLogScorer.VIEW_FIELDS_DEFAULTS
+    scene_indices = scenes.astype(np.int64)
+    window_sizes = np.stack([records.column(field, defaults[field]) for field in ("window_width", "window_height")],
+                            axis=1)
+    zooms = records.column("zoom", defaults["zoom"])
+    translations = np.stack([records.column(field, defaults[field]) for field in ("translation_x", "translation_y")],
+                            axis=1)
+
+    image_pixels = np.zeros((len(records), 2), dtype=np.int64)
+    labels = np.empty(len(records), dtype=object)
+    is_hit = np.zeros(len(records), dtype=bool)
+    distances = np.full(len(records), np.nan)
+    totals = {}
+    for scene_index in np.unique(scene_indices).tolist():
+        mask = scene_indices == scene_index
+        geometry = _scene_geometry(scene_index)
+        image_pixels[mask], hits, is_hit[mask], distances[mask] = geometry.score(points[mask], window_sizes[mask],
+                                                                                  zooms[mask], translations[mask])
+        box_labels = np.array(geometry.bounding_boxes.labels + [None], dtype=object)
+        labels[mask] = box_labels[hits]
+        scene_distances = distances[mask][~np.isnan(distances[mask])]
+        totals[scene_index] = np.array([mask.sum(), is_hit[mask].sum(), scene_distances.sum(), len(scene_distances)])
+
+    if output_format is None:
+        return "", totals, num_skipped
+    results = list(zip(image_pixels[:, 0].tolist(), image_pixels[:, 1].tolist(), is_hit.tolist(), labels.tolist(),
+                       [None if np.isnan(distance) else round(distance, 3) for distance in distances.tolist()]))
+    text = io.StringIO()
+    if output_format == FORMAT_NDJSON:
+        text.writelines(json.dumps(dict(record, **dict(zip(ClickLogScorer.RESULT_FIELDS, result)))) + "\n"
+                        for record, result in zip(records.dicts(), results))
+        return text.getvalue(), totals, num_skipped
+
+    if input_format == FORMAT_CSV and output_fields == fields + list(ClickLogScorer.RESULT_FIELDS):
+        # The results are appended to the lines as they are, without parsing and formatting them again
+        label_texts = {label: _csv_text(label) for label in set(labels.tolist())}
+        text.writelines(f"{line},{x},{y},{hit},{label_texts[label]},{'' if distance is None else distance}\n"
+                        for line, (x, y, hit, label, distance) in zip(records.lines, results))
+    else:
+        writer = csv.DictWriter(text, output_fields, restval="", extrasaction='ignore', lineterminator="\n")
+        writer.writerows(dict(record, **{field: "" if value is None else value
+                                         for field, value in zip(ClickLogScorer.RESULT_FIELDS, result)})
+                         for record, result in zip(records.dicts(), results))
+    return text.getvalue(), totals, num_skipped
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+from src.graphic_engine.image_source import image_components, to_supported_mode
+from src.logging_utils import get_logger
+
+
+class DecodedImageCache:
+    """
+    An on-disk cache of decoded images, so reopening the same image skips decoding it.
+
+    Every entry holds the raw pixels (grayscale, RGB or RGBA, top row first, like the textures expect them) of one or more pyramid levels,
+    each in its own file, and is keyed by a hash of the file content and of the decode parameters -
+    so an edited image, or a change in how images are decoded, never hits a stale entry.
+
+    Entries are read back as read-only numpy.memmap arrays, which can be uploaded to a texture directly,
+    without copying them to a bytes object first.
+
+    The total size is capped by max_size_bytes, and the least recently used entries are evicted
+    (the modification time of the metadata file is the last use time).
+
+    If the cache folder can not be created (e.g. a read-only home folder), the cache is not available -
+    every get misses and put stores nothing, so the app runs as if there were no cache.
+    """
+    DEFAULT_MAX_SIZE_BYTES = 4 * 1024 * 1024 * 1024
+    DECODE_PARAMETERS = {"mode": "native", "rows": "top_first", "version": 2}
+    METADATA_SUFFIX = ".json"
+    LEVEL_SUFFIX = ".raw"
+    HASH_CHUNK_SIZE_BYTES = 1024 * 1024
+
+    def __init__(self, cache_folder: str = None, max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES):
+        """:param cache_folder: Defaults to a folder in the user cache folder ($XDG_CACHE_HOME or ~/.cache)."""
+        self._logger = get_logger()
+        self.cache_folder = cache_folder or self.default_cache_folder()
+        self.max_size_bytes = max_size_bytes
+        self.is_available = True
+        try:
+            os.makedirs(self.cache_folder, exist_ok=True)
+        except OSError as e:
+            self._logger.warning(f"Could not create the decoded image cache folder {self.cache_folder} ({e}), "
+                                 f"running without the cache")
+            self.is_available = False
+
+    @staticmethod
+    def default_cache_folder() -> str:
+        user_cache_folder = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(user_cache_folder, "py_graphics_gui", "decoded_images")
+
+    def key(self, image_path: str, num_levels: int = 1) -> str:
+        content_hash = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE_BYTES), b''):
+                content_hash.update(chunk)
+        decode_parameters = json.dumps(dict(self.DECODE_PARAMETERS, num_levels=num_levels), sort_keys=True)
+        return hashlib.sha256(f"{content_hash.hexdigest()}:{decode_parameters}".encode()).hexdigest()
+
+    def get(self, image_path: str, num_levels: int = 1) -> [np.memmap]:
+        """:return: The pyramid levels as (height, width, components) arrays, starting with the full image, or None on a miss."""
+        return self.get_by_key(self.key(image_path, num_levels))
+
+    def get_by_key(self, key: str) -> [np.memmap]:
+        if not self.is_available:
+            return None
+        metadata_path = self._metadata_path(key)
+        try:
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+            levels = [np.memmap(self._level_path(key, level), dtype=np.uint8, mode='r',
+                                shape=(height, width, metadata["components"]))
+                      for level, (width, height) in enumerate(metadata["level_sizes"])]
+        except (OSError, ValueError, KeyError) as e:
+            self._logger.debug(f"Decoded image cache miss for {key} ({e})")
+            return None
+        # Marks the entry as recently used
+        os.utime(metadata_path)
+        self._logger.debug(f"Decoded image cache hit for {key}")
+        return levels
+
+    def put(self, image_path: str, image: Image, num_levels: int = 1) -> [np.memmap]:
+        """
+        Stores the decoded image, and num_levels - 1 levels that are each downscaled by 2 from the one before it.
+        :return: The stored levels, like get, or None if the cache is not available.
+        """
+        return self.put_by_key(self.key(image_path, num_levels), image, num_levels)
+
+    def put_by_key(self, key: str, image: Image, num_levels: int = 1) -> [np.memmap]:
+        if not self.is_available:
+            return None
+        image = to_supported_mode(image)
+        level_sizes = []
+        for level in range(num_levels):
+            if level > 0:
+                image = image.reduce(2)
+            self._write_level(key, level, image)
+            level_sizes += [image.size]
+
+        # The metadata is written last, so an entry is never read before all of its levels are complete
+        temporary_metadata_path = self._metadata_path(key) + ".tmp"
+        with open(temporary_metadata_path, 'w') as f:
+            json.dump({"level_sizes": level_sizes, "components": image_components(image)}, f)
+        os.replace(temporary_metadata_path, self._metadata_path(key))
+        self._evict(keep_key=key)
+        return self.get_by_key(key)
+
+    def size_bytes(self) -> int:
+        if not self.is_available:
+            return 0
+        return sum(size for _, _, size in self._entries())
+
+    def _write_level(self, key: str, level: int, image: Image):
+        temporary_level_path = self._level_path(key, level) + ".tmp"
+        level_pixels = np.memmap(temporary_level_path, dtype=np.uint8, mode='w+',
+                                 shape=(image.size[1], image.size[0], image_components(image)))
+        level_pixels[:] = np.asarray(image).reshape(level_pixels.shape)
+        level_pixels.flush()
+        del level_pixels
+        os.replace(temporary_level_path, self._level_path(key, level))
+
+    def _entries(self) -> [(float, str, int)]:
+        """:return: (last use time, key, size in bytes) of every entry."""
+        entries = []
+        for file_name in os.listdir(self.cache_folder):
+            if not file_name.endswith(self.METADATA_SUFFIX):
+                continue
+            key = file_name[:-len(self.METADATA_SUFFIX)]
+            level_paths = self._existing_level_paths(key)
+            entries += [(os.path.getmtime(self._metadata_path(key)), key,
+                         sum(os.path.getsize(path) for path in level_paths))]
+        return entries
+
+    def _evict(self, keep_key: str):
+        entries = sorted(self._entries())
+        total_size_bytes = sum(size for _, _, size in entries)
+        for _, key, size in entries:
+            if total_size_bytes <= self.max_size_bytes:
+                return
+            if key == keep_key:
+                continue
+            try:
+                for path in [self._metadata_path(key)] + self._existing_level_paths(key):
+                    os.remove(path)
+            except OSError as e:  # e.g. on Windows, if the entry is still mapped
+                self._logger.debug(f"Could not evict {key} from the decoded image cache ({e})")
+                continue
+            total_size_bytes -= size
+            self._logger.debug(f"Evicted {key} from the decoded image cache")
+
+    def _existing_level_paths(self, key: str) -> [str]:
+        paths, level = [], 0
+        while os.path.exists(self._level_path(key, level)):
+            paths += [self._level_path(key, level)]
+            level += 1
+        return paths
+
+    def _metadata_path(self, key: str) -> str:
+        return os.path.join(self.cache_folder, key + self.METADATA_SUFFIX)
+
+    def _level_path(self, key: str, level: int) -> str:
+        return os.path.join(self.cache_folder, f"{key}.{level}{self.LEVEL_SUFFIX}")
@@ -0,0 +1,143 @@
+import json
+import os
+import time
+from contextlib import suppress
+
+import numpy as np
+
+
+class _Stage:
+    __slots__ = ("_profiler", "_stage_id", "_start_seconds")
+
+    def __init__(self, profiler, stage_id: int):
+        self._profiler = profiler
+        self._stage_id = stage_id
+
+    def __enter__(self):
+        # time.perf_counter_ns needs Python 3.7
+        self._start_seconds = time.perf_counter()
+
+    def __exit__(self, *args):
+        self._profiler.record_ns(self._stage_id, int(self._start_seconds * 1e9), int(time.perf_counter() * 1e9))
+
+
+class FrameProfiler:
+    """
+    Times the stages of every frame (e.g. render, readback, paste), with low overhead.
+
+    Samples are kept in a fixed size ring buffer (so only the latest `capacity` samples are kept),
+    and can be summarized into percentiles, exported as a Chrome trace (open it in chrome://tracing or Perfetto),
+    or shown as a short text for an on-screen HUD.
+
+    Profiling can be switched on and off at runtime - when it is off, stage() returns a shared no-op context,
+    so the instrumented code costs a single method call.
+    """
+    DEFAULT_CAPACITY = 8192
+    FRAME_STAGE = "frame"
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, enabled: bool = False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self._stage_names: [str] = []
+        self._stages: {str: int} = {}
+        # Suppressing no exceptions is a reusable no-op context (contextlib.nullcontext needs Python 3.7)
+        self._disabled_stage = suppress()
+        self._start_ns = np.zeros(capacity, dtype=np.int64)
+        self._duration_ns = np.zeros(capacity, dtype=np.int64)
+        self._stage_ids = np.zeros(capacity, dtype=np.int32)
+        self._num_samples = 0  # Including the ones that were overwritten
+
+    def stage(self, name: str):
+        """Usage: `with profiler.stage("render"): ...`"""
+        if not self.enabled:
+            return self._disabled_stage
+        return _Stage(self, self._stage_id(name))
+
+    def frame(self):
+        return self.stage(self.FRAME_STAGE)
+
+    def record(self, name: str, start_seconds: float, end_seconds: float):
+        """Records a sample that was timed elsewhere, in time.perf_counter seconds."""
+        if self.enabled:
+            self.record_ns(self._stage_id(name), int(start_seconds * 1e9), int(end_seconds * 1e9))
+
+    def record_ns(self, stage_id: int, start_ns: int, end_ns: int):
+        idx = self._num_samples % self.capacity
+        self._start_ns[idx] = start_ns
+        self._duration_ns[idx] = end_ns - start_ns
+        self._stage_ids[idx] = stage_id
+        self._num_samples += 1
+
+    def clear(self):
+        self._num_samples = 0
+
+    def __len__(self):
+        return min(self._num_samples, self.capacity)
+
+    def durations_ms(self, name: str) -> np.ndarray:
+        """:return: The durations of the stage, oldest first."""
+        start_ns, duration_ns, stage_ids = self._ordered_samples()
+        if name not in self._stages:
+            return np.zeros(0)
+        return duration_ns[stage_ids == self._stages[name]] / 1e6
+
+    def summary(self) -> {str: dict}:
+        """:return: For every stage - the number of samples, their mean and their percentiles, in milliseconds."""
+        summary = {}
+        for name in self._stage_names:
+            durations_ms = self.durations_ms(name)
+            if len(durations_ms) == 0:
+                continue
+            percentiles = np.percentile(durations_ms, self.PERCENTILES)
+            summary[name] = dict(count=len(durations_ms), mean_ms=float(durations_ms.mean()),
+                                 **{f"p{p}_ms": float(value) for p, value in zip(self.PERCENTILES, percentiles)})
+        return summary
+
+    def fps(self, window_seconds: float = 1.0) -> float:
+        """:return: Frames per second, over the last window_seconds (of recorded frames)."""
+        start_ns, _, stage_ids = self._ordered_samples()
+        frame_starts_ns = start_ns[stage_ids == self._stages.get(self.FRAME_STAGE, -1)]
+        if len(frame_starts_ns) < 2:
+            return 0.0
+        recent = frame_starts_ns[frame_starts_ns >= frame_starts_ns[-1] - window_seconds * 1e9]
+        if len(recent) < 2:
+            return 0.0
+        return (len(recent) - 1) / ((recent[-1] - recent[0]) / 1e9)
+
+    def hud_text(self) -> str:
+        lines = [f"{self.fps():5.1f} fps"]
+        for name, stage_summary in self.summary().items():
+            lines += [f"{name:>10} p50 {stage_summary['p50_ms']:6.2f}ms  p99 {stage_summary['p99_ms']:6.2f}ms"]
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, json_file_path: str):
+        """Writes the samples in the Chrome trace event format, as complete ("X") events in microseconds."""
+        start_ns, duration_ns, stage_ids = self._ordered_samples()
+        pid = os.getpid()
+        events = [{"name": self._stage_names[stage_id], "ph": "X", "ts": start / 1e3, "dur": duration / 1e3,
+                   "pid": pid, "tid": 0 if self._stage_names[stage_id] == self.FRAME_STAGE else 1}
+                  for start, duration, stage_id in zip(start_ns.tolist(), duration_ns.tolist(), stage_ids.tolist())]
+        with open(json_file_path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def _stage_id(self, name: str) -> int:
+        if name not in self._stages:
+            self._stages[name] = len(self._stage_names)
+            self._stage_names += [name]
+        return self._stages[name]
+
+    def _ordered_samples(self) -> (np.ndarray, np.ndarray, np.ndarray):
+        num_samples = len(self)
+        # Once the ring buffer is full, the oldest sample is the next one to be overwritten
+        first = self._num_samples % self.capacity if self._num_samples > self.capacity else 0
+        order = (np.arange(num_samples) + first) % self.capacity
+        return self._start_ns[order], self._duration_ns[order], self._stage_ids[order]
+
+
+_profiler = FrameProfiler()
+
+
+def get_profiler() -> FrameProfiler:
+    """The profiler that is shared by the whole app, like the logger of logging_utils."""
+    return _profiler
@@ -0,0 +1,55 @@
+import time
+import tkinter as tk
+
+
+class FrameScheduler:
+    """
+    Renders on demand - request_frame() marks the view as dirty, and the render callback then runs
+    once Tk is idle, but no more than once every frame_interval_ms.
+    Many requests between two frames are coalesced into a single frame, and when nothing is dirty nothing runs at all.
+    """
+    FRAME_INTERVAL_MS = 16
+
+    def __init__(self, root: tk.Misc, render_callback, frame_interval_ms: int = FRAME_INTERVAL_MS):
+        self._root = root
+        self._render_callback = render_callback
+        self._frame_interval_seconds = frame_interval_ms / 1000
+        self._last_frame_time = None
+        self._scheduled_callback_id: str = None
+
+        self.is_dirty = False
+        self.frames_rendered = 0
+
+    def request_frame(self):
+        self.is_dirty = True
+        if self._scheduled_callback_id is not None:
+            return
+
+        delay_seconds = 0
+        if self._last_frame_time is not None:
+            delay_seconds = self._last_frame_time + self._frame_interval_seconds - time.perf_counter()
+        if delay_seconds > 0:
+            self._scheduled_callback_id = self._root.after(int(delay_seconds * 1000) + 1, self._on_frame)
+        else:
+            self._scheduled_callback_id = self._root.after_idle(self._on_frame)
+
+    def render_now(self):
+        """Renders the requested frame right away (if any), instead of when it is scheduled."""
+        if self._scheduled_callback_id is not None:
+            self._root.after_cancel(self._scheduled_callback_id)
+        self._on_frame()
+
+    def cancel(self):
+        if self._scheduled_callback_id is not None:
+            self._root.after_cancel(self._scheduled_callback_id)
+            self._scheduled_callback_id = None
+        self.is_dirty = False
+
+    def _on_frame(self):
+        self._scheduled_callback_id = None
+        if not self.is_dirty:
+            return
+        self.is_dirty = False
+        self._last_frame_time = time.perf_counter()
+        self.frames_rendered += 1
+        self._render_callback()
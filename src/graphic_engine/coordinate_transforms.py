@@ -0,0 +1,76 @@
+"""
+Vectorized versions of the coordinate conversions of GraphicEngine, for many points at once.
+
+All points are numpy arrays of shape (N, 2), and the same coordinate systems as in GraphicEngine are used:
+*window pixels* (top left is [0, 0]), *window xy* (what the model matrix maps *xy* to, [-1, 1] on the window),
+*xy* ([-1, 1] on the image) and *image pixels* (top left is [0, 0]).
+
+Since these functions only need numpy, they can be used without a graphic context.
+"""
+import numpy as np
+
+
+def mat4_to_numpy(mat) -> np.ndarray:
+    """
+    :param mat: A glm.mat4 (PyGLM is not imported here, since it is only needed by the graphic engine).
+    :return: A (4, 4) array where [row, column] is the same element as mat[column][row].
+    """
+    return np.array([[mat[column][row] for column in range(4)] for row in range(4)], dtype=np.float64)
+
+
+def apply_model_mat(model_mat: np.ndarray, points_xy: np.ndarray) -> np.ndarray:
+    # The model matrix of the window is 2D affine (zoom and translation), so the z and w coordinates are not needed
+    return points_xy @ model_mat[:2, :2].T + model_mat[:2, 3]
+
+
+def undo_zoom_and_translation(points_window_xy: np.ndarray, zoom, translation_xy) -> np.ndarray:
+    """
+    The inverse of the model matrix of GraphicEngine (a zoom and then a translation), where zoom may be an (N,) array
+    and translation_xy an (N, 2) array, for points that were each seen with a different view.
+    """
+    # Applied like the inverse model matrix in apply_model_mat, so the results are the same
+    inverse_zoom = 1.0 / np.asarray(zoom, dtype=np.float64)[..., None]
+    return points_window_xy * inverse_zoom + (-np.asarray(translation_xy, dtype=np.float64) * inverse_zoom)
+
+
+def initial_window_size(image_size: (int, int), maximal_window_size: (int, int)) -> [int, int]:
+    """:return: The image size, or the largest size with the image aspect ratio that fits in maximal_window_size."""
+    if image_size[0] <= maximal_window_size[0] and image_size[1] <= maximal_window_size[1]:
+        return list(image_size)
+
+    # For more info on this calculation, see https://stackoverflow.com/a/62307044/2934048
+    image_to_window_ratio = (image_size[0] / image_size[1]) / (maximal_window_size[0] / maximal_window_size[1])
+    if image_to_window_ratio > 1:  # image is wider than window
+        return [maximal_window_size[0], int(maximal_window_size[1] * (1 / image_to_window_ratio))]
+    # window is wider than image
+    return [int(maximal_window_size[0] * image_to_window_ratio), maximal_window_size[1]]
+
+
+def window_pixels_to_window_xy(points_window_pixels: np.ndarray, window_size_pixels: (int, int)) -> np.ndarray:
+    u_and_one_minus_v = np.asarray(points_window_pixels, dtype=np.float64) / np.asarray(window_size_pixels)
+    points_window_xy = u_and_one_minus_v * 2 - 1.0
+    points_window_xy[:, 1] *= -1
+    return points_window_xy
+
+
+def window_xy_to_window_pixels(points_window_xy: np.ndarray, window_size_pixels: (int, int)) -> (np.ndarray, np.ndarray):
+    """
+    :return: (window pixels of type int, mask of the points that are inside the window).
+             Pixels of points outside of the window are still computed, but should not be used.
+    """
+    inside_window = np.all(np.abs(points_window_xy) <= 1, axis=1)
+    u_and_v = (0.5 * points_window_xy) + 0.5
+    u_and_v[:, 1] = 1 - u_and_v[:, 1]
+    return np.trunc(u_and_v * np.asarray(window_size_pixels)).astype(np.int64), inside_window
+
+
+def xy_to_image_pixels(points_xy: np.ndarray, image_size_pixels: (int, int)) -> np.ndarray:
+    u_and_v = (0.5 * np.asarray(points_xy, dtype=np.float64)) + 0.5
+    u_and_v[:, 1] = 1 - u_and_v[:, 1]
+    return np.trunc(u_and_v * np.asarray(image_size_pixels)).astype(np.int64)
+
+
+def window_pixels_to_image_pixels(points_window_pixels: np.ndarray, window_size_pixels: (int, int),
+                                  image_size_pixels: (int, int), model_mat_inverse: np.ndarray) -> np.ndarray:
+    points_xy = apply_model_mat(model_mat_inverse, window_pixels_to_window_xy(points_window_pixels, window_size_pixels))
+    return xy_to_image_pixels(points_xy, image_size_pixels)
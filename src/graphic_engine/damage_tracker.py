@@ -0,0 +1,123 @@
+from attr import Factory, dataclass
+
+
+def rect_to_viewport(rect: (int, int, int, int), frame_height: int, flip_y: bool) -> (int, int, int, int):
+    """
+    (left, top, right, bottom) in *window pixels* => (x, y, width, height) in the framebuffer (bottom row first),
+    for scissoring and reading back a rect.
+    :param flip_y: Whether the frame is rendered upside down (see GraphicEngine.FLIP_Y_PROJECTION_MAT),
+                   so the top row of the window is the first row of the framebuffer.
+    """
+    left, top, right, bottom = rect
+    return left, top if flip_y else frame_height - bottom, right - left, bottom - top
+
+
+def rect_area(rect: (int, int, int, int)) -> int:
+    return (rect[2] - rect[0]) * (rect[3] - rect[1])
+
+
+@dataclass
+class Damage:
+    """
+    What changed in the window since the last frame.
+
+    Unless the whole frame changed (is_full), the previous frame is first moved by scroll_pixels,
+    and then only rects (left, top, right, bottom) in *window pixels* are rendered again.
+    """
+    is_full: bool
+    scroll_pixels: (int, int) = (0, 0)
+    rects: [(int, int, int, int)] = Factory(list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.is_full and self.scroll_pixels == (0, 0) and len(self.rects) == 0
+
+
+class DamageTracker:
+    """
+    Collects the damage of the window between frames, so a frame only renders, reads back and pastes what changed.
+
+    A pan by whole pixels is a scroll - the previous frame is moved, and only the strips it exposed are damaged
+    (along with the rects that were already damaged, which move with it).
+    Everything else that changes the view (zoom, resize, a new texture) damages the whole frame.
+    """
+    # Beyond this many rects, they are merged into their bounding rect
+    MAX_RECTS = 8
+    # When this much of the window is damaged, a single readback of the whole frame is cheaper than many small ones
+    FULL_FRAME_AREA_FRACTION = 0.5
+    # Scrolling further than this fraction of the window redraws it
+    MAX_SCROLL_FRACTION = 0.5
+    # A pan is a scroll only if it moves the image by whole pixels
+    WHOLE_PIXELS_TOLERANCE = 1e-3
+
+    def __init__(self, window_size_pixels: (int, int)):
+        self.window_size_pixels: (int, int) = tuple(window_size_pixels)
+        self._is_full = True
+        self._scroll_pixels: (int, int) = (0, 0)
+        self._rects: [(int, int, int, int)] = []
+
+    @property
+    def is_damaged(self) -> bool:
+        return self._is_full or self._scroll_pixels != (0, 0) or len(self._rects) > 0
+
+    def resize(self, window_size_pixels: (int, int)):
+        self.window_size_pixels = tuple(window_size_pixels)
+        self.damage_all()
+
+    def damage_all(self):
+        self._is_full, self._scroll_pixels, self._rects = True, (0, 0), []
+
+    def damage(self, rect: (int, int, int, int)):
+        """:param rect: (left, top, right, bottom) in *window pixels*, it is clipped to the window."""
+        rect = self._clip(rect)
+        if self._is_full or rect is None:
+            return
+        self._rects += [rect]
+        if len(self._rects) > self.MAX_RECTS:
+            self._rects = [self._bounding_rect(self._rects)]
+
+    def scroll(self, dx_pixels: float, dy_pixels: float):
+        """The content of the window moved by (dx_pixels, dy_pixels), right and down are positive."""
+        if self._is_full:
+            return
+        dx, dy = round(dx_pixels), round(dy_pixels)
+        if (dx, dy) == (0, 0) and max(abs(dx_pixels), abs(dy_pixels)) <= self.WHOLE_PIXELS_TOLERANCE:
+            return
+        scroll_x, scroll_y = self._scroll_pixels[0] + dx, self._scroll_pixels[1] + dy
+        width, height = self.window_size_pixels
+        is_whole_pixels = max(abs(dx_pixels - dx), abs(dy_pixels - dy)) <= self.WHOLE_PIXELS_TOLERANCE
+        if not is_whole_pixels or abs(scroll_x) > self.MAX_SCROLL_FRACTION * width \
+                or abs(scroll_y) > self.MAX_SCROLL_FRACTION * height:
+            self.damage_all()
+            return
+
+        self._scroll_pixels = (scroll_x, scroll_y)
+        rects = [self._clip((left + dx, top + dy, right + dx, bottom + dy)) for left, top, right, bottom in self._rects]
+        self._rects = [rect for rect in rects if rect is not None]
+        # The strips the scroll exposed
+        if dx != 0:
+            self.damage((0, 0, dx, height) if dx > 0 else (width + dx, 0, width, height))
+        if dy != 0:
+            self.damage((0, 0, width, dy) if dy > 0 else (0, height + dy, width, height))
+
+    def take(self) -> Damage:
+        """:return: The damage since the previous call."""
+        width, height = self.window_size_pixels
+        damaged_area = sum(rect_area(rect) for rect in self._rects)
+        if self._is_full or damaged_area >= self.FULL_FRAME_AREA_FRACTION * width * height:
+            damage = Damage(is_full=True)
+        else:
+            damage = Damage(is_full=False, scroll_pixels=self._scroll_pixels, rects=self._rects)
+        self._is_full, self._scroll_pixels, self._rects = False, (0, 0), []
+        return damage
+
+    def _clip(self, rect: (int, int, int, int)):
+        """:return: The rect inside the window, or None if it is empty."""
+        left, top = max(int(rect[0]), 0), max(int(rect[1]), 0)
+        right, bottom = min(int(rect[2]), self.window_size_pixels[0]), min(int(rect[3]), self.window_size_pixels[1])
+        return (left, top, right, bottom) if left < right and top < bottom else None
+
+    @staticmethod
+    def _bounding_rect(rects: [(int, int, int, int)]) -> (int, int, int, int):
+        return (min(rect[0] for rect in rects), min(rect[1] for rect in rects),
+                max(rect[2] for rect in rects), max(rect[3] for rect in rects))
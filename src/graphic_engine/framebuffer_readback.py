@@ -0,0 +1,174 @@
+import contextlib
+
+import moderngl
+
+from src.graphic_engine.damage_tracker import Damage, rect_area, rect_to_viewport
+
+
+class FramebufferReadback:
+    """
+    Owns the offscreen framebuffer the graphic engine renders into, and copies its pixels back to the CPU.
+
+    The framebuffer only ever grows (in steps of CAPACITY_STEP_PIXELS), and we render into its bottom-left corner
+    using a viewport of the current size, so resizing reuses the same framebuffer instead of allocating a new one.
+
+    Readback modes:
+    ---------------
+
+    MODE_READ: fbo.read() - allocates a new bytes object every frame, rows are bottom-to-top (OpenGL order).
+    MODE_READ_INTO: fbo.read_into() a buffer that is allocated once per capacity.
+                    Rows are top-to-bottom, since the vertical flip is done by the projection (see flip_y_in_projection).
+    MODE_PIXEL_BUFFERS: Like MODE_READ_INTO, but the framebuffer is first copied into a GPU pixel buffer,
+                        which returns immediately.
+                        The pixels are only copied to the CPU when they are taken (usually when Tk is idle),
+                        so the GPU can finish the frame while python handles other events.
+                        A single pixel buffer is enough - frames are rendered on demand, so a frame is taken once
+                        Tk is idle, and not a frame later (which would hold back the last frame until the next one).
+
+    A frame can also read back only some rects of the framebuffer (see finish_frame), which are packed one after the
+    other, and are then taken with take_regions.
+    """
+    MODE_READ = 'read'
+    MODE_READ_INTO = 'read_into'
+    MODE_PIXEL_BUFFERS = 'pbo'
+    CAPACITY_STEP_PIXELS = 256
+
+    def __init__(self, ctx: moderngl.Context, size: (int, int), mode: str = MODE_READ_INTO):
+        if mode not in (self.MODE_READ, self.MODE_READ_INTO, self.MODE_PIXEL_BUFFERS):
+            raise ValueError(f"Unknown readback mode: {mode}")
+        self.ctx = ctx
+        self.mode = mode
+        self.fbo: moderngl.Framebuffer = None
+        self.scope = None
+        self.size: (int, int) = (0, 0)
+        self.bytes_copied_last_frame = 0
+
+        self._capacity: (int, int) = (0, 0)
+        self._host_buffer: bytearray = None
+        self._pixel_buffer: moderngl.Buffer = None
+        self._pending_frame = None
+        # The rects of the pending frame, None for the whole frame
+        self._pending_rects: [(int, int, int, int)] = None
+        self._pending_size_bytes = 0
+        self.resize(size)
+
+    @property
+    def components(self) -> int:
+        # 4 components let PIL wrap the host buffer without copying it (PIL only maps RGBA-like modes)
+        return 3 if self.mode == self.MODE_READ else 4
+
+    @property
+    def flip_y_in_projection(self) -> bool:
+        return self.mode != self.MODE_READ
+
+    @property
+    def frame_size_bytes(self) -> int:
+        return self.size[0] * self.size[1] * self.components
+
+    @property
+    def has_pending_frame(self) -> bool:
+        return self._pending_frame is not None
+
+    def resize(self, size: (int, int)):
+        self.size = (max(1, int(size[0])), max(1, int(size[1])))
+        if self.size[0] > self._capacity[0] or self.size[1] > self._capacity[1]:
+            self._allocate(self.compute_capacity(self.size, self._capacity))
+        self.fbo.viewport = (0, 0, *self.size)
+        # A frame that is still in a pixel buffer has the old size, so it is dropped
+        self._pending_frame = None
+
+    def finish_frame(self, rects: [(int, int, int, int)] = None):
+        """
+        Called after rendering - MODE_PIXEL_BUFFERS only starts the transfer, the other modes copy right away.
+        :param rects: Only read back these rects (left, top, right, bottom) in *window pixels*, see take_regions.
+        """
+        viewports = [(0, 0, *self.size)] if rects is None else \
+            [rect_to_viewport(rect, self.size[1], self.flip_y_in_projection) for rect in rects]
+        self._pending_rects = None if rects is None else list(rects)
+        self._pending_size_bytes = sum(width * height for _, _, width, height in viewports) * self.components
+        if self.mode == self.MODE_READ:
+            self._pending_frame = b"".join(self.fbo.read(viewport=viewport, components=self.components)
+                                           for viewport in viewports)
+            self.bytes_copied_last_frame = self._pending_size_bytes
+        elif self.mode == self.MODE_READ_INTO:
+            self._read_into(self._host_buffer, viewports)
+            self._pending_frame = memoryview(self._host_buffer)[:self._pending_size_bytes]
+            self.bytes_copied_last_frame = self._pending_size_bytes
+        else:
+            self._read_into(self._pixel_buffer, viewports)
+            self._pending_frame = self._pixel_buffer
+            self.bytes_copied_last_frame = 0
+
+    @contextlib.contextmanager
+    def frame(self, damage: Damage = None):
+        """
+        Renders the `with` block into the framebuffer, and then finishes the frame - like TkinterFramebuffer.frame.
+        :param damage: Only read back its rects, the whole frame if None.
+        """
+        with self.scope:
+            yield self
+        self.finish_frame(None if damage is None or damage.is_full else damage.rects)
+
+    def take_pixels(self):
+        """
+        :return: The pixels of the last finished frame (bytes-like, tightly packed), or None if there is none.
+                 In MODE_READ_INTO and MODE_PIXEL_BUFFERS the returned view is only valid until the next frame.
+        """
+        pixels, self._pending_frame = self._pending_frame, None
+        if isinstance(pixels, moderngl.Buffer):
+            pixels.read_into(self._host_buffer, size=self._pending_size_bytes)
+            pixels = memoryview(self._host_buffer)[:self._pending_size_bytes]
+            self.bytes_copied_last_frame += self._pending_size_bytes
+        return pixels
+
+    def take_regions(self) -> [((int, int, int, int), memoryview)]:
+        """
+        Like take_pixels, split into the rects of the frame (see finish_frame), or a single rect for the whole frame.
+        :return: [(rect, its pixels)], or None if there is no frame.
+                 The rows of every rect are in the order of the frame (see flip_y_in_projection).
+        """
+        rects = [(0, 0, *self.size)] if self._pending_rects is None else self._pending_rects
+        pixels = self.take_pixels()
+        if pixels is None:
+            return None
+        pixels, regions, offset = memoryview(pixels), [], 0
+        for rect in rects:
+            size_bytes = rect_area(rect) * self.components
+            regions += [(rect, pixels[offset:offset + size_bytes])]
+            offset += size_bytes
+        return regions
+
+    def release(self):
+        if self.fbo is not None:
+            self.fbo.release()
+            self.scope.release()
+            self.fbo, self.scope = None, None
+        if self._pixel_buffer is not None:
+            self._pixel_buffer.release()
+            self._pixel_buffer = None
+        self._host_buffer = None
+        self._pending_frame = None
+        self._capacity = (0, 0)
+
+    @classmethod
+    def compute_capacity(cls, size: (int, int), current_capacity: (int, int) = (0, 0)) -> (int, int):
+        step = cls.CAPACITY_STEP_PIXELS
+        return tuple(max(current, -(-requested // step) * step) for requested, current in zip(size, current_capacity))
+
+    def _read_into(self, buffer, viewports: [(int, int, int, int)]):
+        offset = 0
+        for viewport in viewports:
+            self.fbo.read_into(buffer, viewport=viewport, components=self.components, write_offset=offset)
+            offset += viewport[2] * viewport[3] * self.components
+
+    def _allocate(self, capacity: (int, int)):
+        self.release()
+        self._capacity = capacity
+        self.fbo = self.ctx.simple_framebuffer(capacity)
+        self.scope = self.ctx.scope(self.fbo)
+
+        capacity_bytes = capacity[0] * capacity[1] * self.components
+        if self.mode != self.MODE_READ:
+            self._host_buffer = bytearray(capacity_bytes)
+        if self.mode == self.MODE_PIXEL_BUFFERS:
+            self._pixel_buffer = self.ctx.buffer(reserve=capacity_bytes)
@@ -1,8 +1,16 @@
 import glm
 import moderngl
+import numpy as np
 from PIL import Image
 
-from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer
+from src.frame_profiler import get_profiler
+from src.graphic_engine import coordinate_transforms
+from src.graphic_engine.damage_tracker import DamageTracker, rect_to_viewport
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer, TextureSettings, mat4_to_bytes, \
+    texture_gpu_bytes
+from src.graphic_engine.marker_layer import MarkerLayer
+from src.graphic_engine.progressive_texture_upload import ProgressiveTextureUpload
+from src.graphic_engine.tiled_texture import TiledTexture
 from src.logging_utils import get_logger
 
 
@@ -25,37 +33,250 @@ class GraphicEngine:
                   This corresponds to the "image" coordinate system, where (0.5, 0.5) is the center.
 
     """
-    def __init__(self, context: moderngl.Context, window_size_pixels: (int, int), image: Image):
+    # Flips the rendered frame upside down, so it is read back with rows in top-to-bottom order
+    FLIP_Y_PROJECTION_MAT = glm.scale(glm.mat4(), glm.vec3(1, -1, 1))
+    MIN_ZOOM = 1.0
+    MAX_ZOOM = 64.0
+
+    def __init__(self, context: moderngl.Context, window_size_pixels: (int, int), image: Image, tiled: bool = None,
+                 image_size_pixels: (int, int) = None, texture_settings: TextureSettings = None):
+        """
+        :param image_size_pixels: The size of the full image, if the given image is only a preview (or a placeholder)
+                                  of it. Coordinates are always in the pixels of the full image
+                                  (even if the texture was downscaled to fit texture_settings.memory_budget_bytes).
+        :param texture_settings: The format, filtering and memory budget of the textures the engine uploads.
+        """
         self._logger = get_logger()
 
         self._context = context
 
         initializer: GraphicEngineInitializer = GraphicEngineInitializer()
 
-        self._image_size_pixels: Image = image.size
-        self._texture: moderngl.Texture = initializer.load_image_to_texture(self._context, image)
+        self._image_size_pixels: (int, int) = tuple(image_size_pixels or image.size)
+        self._tiled = tiled
+        self.texture_settings: TextureSettings = texture_settings or TextureSettings()
+        # A TiledTexture if the image is too large for a single texture
+        self._texture: moderngl.Texture = initializer.load_image_to_texture(self._context, image, tiled,
+                                                                            settings=self.texture_settings)
+        # Whether the texture was created (and is released) by the engine, see set_texture
+        self._owns_texture = True
+        # Used by start_progressive_image_upload
+        self._pending_upload: ProgressiveTextureUpload = None
 
         self._program: moderngl.Program = initializer.init_program(self._context)
         self._program['texture_idx'].value = 0
         self._window_model_mat: glm.mat4 = glm.mat4()
+        self._window_model_mat_inverse: glm.mat4 = glm.mat4()
+        # The same matrices as numpy arrays, for the batch conversions
+        self._window_model_mat_np: np.ndarray = np.eye(4)
+        self._window_model_mat_inverse_np: np.ndarray = np.eye(4)
 
         self._vertex_array: moderngl.VertexArray = initializer.init_vertex_array(self._context, self._program)
 
         self._window_width_pixels, self._window_height_pixels = window_size_pixels
+        # Created by enable_markers
+        self._marker_layer: MarkerLayer = None
+        # What has to be rendered again since the last frame, see render
+        self.damage: DamageTracker = DamageTracker(window_size_pixels)
 
     def destroy(self):
-        self._texture.release()
+        self._release_texture()
+        self._cancel_progressive_image_upload()
+        if self._marker_layer is not None:
+            self._marker_layer.release()
+        self._vertex_array.release()
+        if not GraphicEngineInitializer.is_shared_program(self._context, self._program):
+            self._program.release()
+
+    def enable_markers(self, radius_pixels: float, line_width_pixels: float = 3.0,
+                       color: (float, float, float, float) = (1.0, 0.0, 0.0, 1.0)):
+        """Markers are rendered by the engine on top of the image, instead of being drawn by the window manager."""
+        if self._marker_layer is not None:
+            self._marker_layer.release()
+        self._marker_layer = MarkerLayer(self._context, radius_pixels, line_width_pixels, color)
+        self.damage.damage_all()
+
+    def add_marker(self, x: float, y: float):
+        self._marker_layer.add_marker(x, y)
+        xy_pixels = self.xy_coordinates_to_window_pixel_coordinates(x, y)
+        if xy_pixels is not None:
+            # The marker quad spans the radius, and a pixel more for rounding
+            r = int(self._marker_layer.radius_pixels) + 1
+            self.damage.damage((xy_pixels[0] - r, xy_pixels[1] - r, xy_pixels[0] + r + 1, xy_pixels[1] + r + 1))
+        else:
+            # The center is outside of the window, but the marker may still be partly inside
+            self.damage.damage_all()
+
+    def clear_markers(self):
+        self._marker_layer.clear()
+        self.damage.damage_all()
+
+    def replace_image(self, image, levels: list = None):
+        """
+        Shows a different image (e.g. a higher resolution preview), the image size in pixels does not change.
+        :param image: PIL image, or an array of shape (height, width, 3) with the top row first.
+        :param levels: Pyramid levels, if they are already available (used only if the image is tiled).
+        """
+        self._cancel_progressive_image_upload()
+        texture = GraphicEngineInitializer().load_image_to_texture(self._context, image, self._tiled, levels,
+                                                                   self.texture_settings)
+        self._release_texture()
+        self._texture, self._owns_texture = texture, True
+        self.damage.damage_all()
+
+    def set_texture(self, texture, image_size_pixels: (int, int), reset_view: bool = True):
+        """
+        Shows a texture that is owned by the caller (e.g. by a TextureCache), so the engine never releases it.
+        :param texture: moderngl.Texture, or TiledTexture.
+        :param reset_view: Whether to show the whole image, since this is usually a different image.
+        """
+        self._cancel_progressive_image_upload()
+        self._release_texture()
+        self._texture, self._owns_texture = texture, False
+        self._image_size_pixels = tuple(image_size_pixels)
+        self.damage.damage_all()
+        if reset_view:
+            self.reset_view()
+
+    @property
+    def texture(self):
+        """The texture of the image that is shown (moderngl.Texture, or TiledTexture), see ViewGroup."""
+        return self._texture
+
+    @property
+    def texture_gpu_bytes(self) -> int:
+        """The GPU memory used by the texture of the image that is shown."""
+        return texture_gpu_bytes(self._texture)
+
+    def reset_view(self):
+        self._set_window_model_mat(glm.mat4())
+
+    def start_progressive_image_upload(self, image, rows_per_strip: int = 256, levels: list = None):
+        """
+        Uploads the image to a new texture a strip of rows at a time (see upload_next_image_strip),
+        so the upload can be spread between frames. Meanwhile, the current texture is still rendered.
+
+        :param image: A PIL image, or an array of shape (height, width, 3) with the top row first.
+        :param levels: Pyramid levels, if they are already available (used only if the image is tiled).
+        """
+        self._cancel_progressive_image_upload()
+        self._pending_upload = ProgressiveTextureUpload(self._context, image, rows_per_strip, self._tiled, levels,
+                                                        self.texture_settings)
+
+    @property
+    def is_uploading_image(self) -> bool:
+        return self._pending_upload is not None
+
+    def upload_next_image_strip(self) -> bool:
+        """
+        Uploads the next strip of the progressive upload, and switches to the new texture after the last one.
+        :return: Whether the upload is complete.
+        """
+        if self._pending_upload is None:
+            return True
+        if not self._pending_upload.upload_next_strip():
+            return False
+
+        self._release_texture()
+        self._texture, self._owns_texture, self._pending_upload = self._pending_upload.texture, True, None
+        self.damage.damage_all()
+        return True
+
+    def _cancel_progressive_image_upload(self):
+        if self._pending_upload is not None:
+            self._pending_upload.release()
+            self._pending_upload = None
+
+    def _release_texture(self):
+        if self._owns_texture:
+            self._texture.release()
 
     def clear(self, color=(0, 0, 0, 0)):
         self._context.clear(*color)
 
-    def render(self):
-        self._program['model'].write(bytes(self._window_model_mat))
-        self._vertex_array.render()
+    def render(self, flip_y: bool = False, rects: [(int, int, int, int)] = None, clear_color=(0, 0, 0, 0)):
+        """
+        :param rects: Only render these rects (left, top, right, bottom) in *window pixels*, e.g. the rects of
+                      damage.take(), each one is cleared (with clear_color) and then rendered with scissoring.
+                      By default the whole frame is rendered, and it is up to the caller to clear it first.
+        """
+        # Only measures issuing the draw calls, the GPU work itself is waited for by the readback
+        with get_profiler().stage("render"):
+            projection_mat_bytes = mat4_to_bytes(self.FLIP_Y_PROJECTION_MAT if flip_y else glm.mat4())
+            window_model_mat_bytes = mat4_to_bytes(self._window_model_mat)
+            self._program['projection'].write(projection_mat_bytes)
+            self._program['model'].write(window_model_mat_bytes)
+            if rects is None:
+                self._render_image_and_markers(window_model_mat_bytes, projection_mat_bytes)
+                return
+            try:
+                for rect in rects:
+                    self._context.scissor = rect_to_viewport(rect, self._window_height_pixels, flip_y)
+                    self.clear(clear_color)
+                    self._render_image_and_markers(window_model_mat_bytes, projection_mat_bytes)
+            finally:
+                self._context.scissor = None
+
+    def _render_image_and_markers(self, window_model_mat_bytes: bytes, projection_mat_bytes: bytes):
+        if not isinstance(self._texture, TiledTexture):
+            self._texture.use(0)
+            # The program may be shared with an engine of a tiled texture, which moves the quad
+            self._program['quad_xy_rect'].value = GraphicEngineInitializer.FULL_QUAD_XY_RECT
+            self._vertex_array.render()
+        else:
+            self._render_tiles()
+
+        if self._marker_layer is not None:
+            self._marker_layer.render(window_model_mat_bytes, projection_mat_bytes, self._window_size_pixels)
+
+    def _render_tiles(self):
+        for tile_texture, tile_xy_rect in self._texture.visible_tiles(self._window_model_mat, self._window_size_pixels):
+            tile_texture.use(0)
+            self._program['quad_xy_rect'].value = tile_xy_rect
+            self._vertex_array.render()
+        self._program['quad_xy_rect'].value = GraphicEngineInitializer.FULL_QUAD_XY_RECT
 
     def on_resize(self, new_size_pixels: (int, int)):
         self._window_width_pixels, self._window_height_pixels = new_size_pixels
-        self._logger.debug(f"Updated windows after resize. New size: {new_size_pixels}.")
+        self.damage.resize(new_size_pixels)
+        self._logger.debug("Updated windows after resize. New size: %s.", new_size_pixels)
+
+    def zoom(self, factor: float, x_window_pixels: int, y_window_pixels: int) -> bool:
+        """
+        Zooms in (factor > 1) or out (factor < 1), keeping the image point under the given window pixel in place.
+        :return: Whether the view has changed.
+        """
+        zoom = self._zoom
+        new_zoom = min(max(zoom * factor, self.MIN_ZOOM), self.MAX_ZOOM)
+        x_window, y_window = self._window_pixels_coordinates_to_window_xy_coordinates(x_window_pixels, y_window_pixels)
+        x, y = (x_window - self._window_model_mat[3].x) / zoom, (y_window - self._window_model_mat[3].y) / zoom
+        return self._set_zoom_and_translation(new_zoom, x_window - new_zoom * x, y_window - new_zoom * y)
+
+    def pan(self, dx_window_pixels: int, dy_window_pixels: int) -> bool:
+        """
+        Moves the image along with the mouse, by the given offset in window pixels.
+        :return: Whether the view has changed.
+        """
+        translation_x = self._window_model_mat[3].x + 2 * dx_window_pixels / self._window_width_pixels
+        translation_y = self._window_model_mat[3].y - 2 * dy_window_pixels / self._window_height_pixels
+        return self._set_zoom_and_translation(self._zoom, translation_x, translation_y)
+
+    @property
+    def view_zoom(self) -> float:
+        return self._zoom
+
+    @property
+    def view_center_xy(self) -> (float, float):
+        """The point of the image at the center of the window."""
+        return -self._window_model_mat[3].x / self._zoom, -self._window_model_mat[3].y / self._zoom
+
+    def look_at(self, center_xy: (float, float), zoom: float) -> bool:
+        """
+        Shows the image point center_xy at the center of the window (as far as the image still covers the window).
+        :return: Whether the view has changed.
+        """
+        zoom = min(max(zoom, self.MIN_ZOOM), self.MAX_ZOOM)
+        return self._set_zoom_and_translation(zoom, -zoom * center_xy[0], -zoom * center_xy[1])
 
     def window_pixel_coordinates_to_image_pixel_coordinates(self, x_window_pixels: int, y_window_pixels: int) -> (int, int):
         x, y = self.window_pixels_coordinates_to_xy_coordinates(x_window_pixels, y_window_pixels)
@@ -67,6 +288,11 @@ class GraphicEngine:
         return x_image_pixels, y_image_pixels
 
     def window_pixels_coordinates_to_xy_coordinates(self, x_pixels: int, y_pixels: int) -> (float, float):
+        x_window, y_window = self._window_pixels_coordinates_to_window_xy_coordinates(x_pixels, y_pixels)
+        x, y = (self._window_model_mat_inverse * glm.vec4(x_window, y_window, 0, 1)).xy
+        return x, y
+
+    def _window_pixels_coordinates_to_window_xy_coordinates(self, x_pixels: int, y_pixels: int) -> (float, float):
         # x_pixels,y_pixels are represented in pixels from the top left corner,
         # viewport coordinates are represented in [-1,1]X[-1,1] starting at bottom left corner at (-1,-1)
         u, one_minus_v = x_pixels / self._window_width_pixels, y_pixels / self._window_height_pixels
@@ -74,8 +300,7 @@ class GraphicEngine:
         # So we want to make the transformation [0,1]X[0,1] => [1,-1]X[-1,1]
         x_window = (u * 2) - 1.0
         y_window = ((1.0 - one_minus_v) * 2) - 1.0
-        x, y = (glm.inverse(self._window_model_mat) * glm.vec4(x_window, y_window, 0, 1)).xy
-        return x, y
+        return x_window, y_window
 
     def xy_coordinates_to_window_pixel_coordinates(self, x: float, y: float) -> (int, int):
         x_window, y_window = (self._window_model_mat * glm.vec4(x, y, 0, 1)).xy
@@ -90,6 +315,56 @@ class GraphicEngine:
 
         return x_pixels, y_pixels
 
+    def window_pixel_coordinates_to_image_pixel_coordinates_batch(self, points_window_pixels: np.ndarray) -> np.ndarray:
+        """(N, 2) window pixels => (N, 2) image pixels, see window_pixel_coordinates_to_image_pixel_coordinates"""
+        return coordinate_transforms.window_pixels_to_image_pixels(points_window_pixels, self._window_size_pixels,
+                                                                   self._image_size_pixels,
+                                                                   self._window_model_mat_inverse_np)
+
+    def window_pixels_coordinates_to_xy_coordinates_batch(self, points_window_pixels: np.ndarray) -> np.ndarray:
+        """(N, 2) window pixels => (N, 2) xy, see window_pixels_coordinates_to_xy_coordinates"""
+        points_window_xy = coordinate_transforms.window_pixels_to_window_xy(points_window_pixels,
+                                                                            self._window_size_pixels)
+        return coordinate_transforms.apply_model_mat(self._window_model_mat_inverse_np, points_window_xy)
+
+    def xy_coordinates_to_window_pixel_coordinates_batch(self, points_xy: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        (N, 2) xy => (N, 2) window pixels, see xy_coordinates_to_window_pixel_coordinates
+        :return: (window pixels, mask of the points that are inside the window)
+        """
+        points_window_xy = coordinate_transforms.apply_model_mat(self._window_model_mat_np,
+                                                                 np.asarray(points_xy, dtype=np.float64))
+        return coordinate_transforms.window_xy_to_window_pixels(points_window_xy, self._window_size_pixels)
+
+    def _set_zoom_and_translation(self, zoom: float, translation_x: float, translation_y: float) -> bool:
+        # The image must always cover the window, so the translation is limited by how much we zoomed in
+        max_translation = zoom - 1.0
+        translation_x = min(max(translation_x, -max_translation), max_translation)
+        translation_y = min(max(translation_y, -max_translation), max_translation)
+
+        window_model_mat = glm.scale(glm.translate(glm.mat4(), glm.vec3(translation_x, translation_y, 0)),
+                                     glm.vec3(zoom, zoom, 1))
+        if window_model_mat == self._window_model_mat:
+            return False
+        self._set_window_model_mat(window_model_mat)
+        return True
+
+    def _set_window_model_mat(self, window_model_mat: glm.mat4):
+        if window_model_mat[0][0] == self._zoom:
+            # Only the translation changed, which moves the previous frame (in *window pixels*, y is down)
+            self.damage.scroll((window_model_mat[3].x - self._window_model_mat[3].x) * self._window_width_pixels / 2,
+                               (self._window_model_mat[3].y - window_model_mat[3].y) * self._window_height_pixels / 2)
+        else:
+            self.damage.damage_all()
+        self._window_model_mat = window_model_mat
+        self._window_model_mat_inverse = glm.inverse(window_model_mat)
+        self._window_model_mat_np = coordinate_transforms.mat4_to_numpy(self._window_model_mat)
+        self._window_model_mat_inverse_np = coordinate_transforms.mat4_to_numpy(self._window_model_mat_inverse)
+
+    @property
+    def _zoom(self) -> float:
+        return self._window_model_mat[0][0]
+
     @property
     def _image_width_pixels(self):
         return self._image_size_pixels[0]
@@ -1,43 +1,239 @@
+import functools
 import os
+import struct
 from pathlib import Path
 
 import glm
 import moderngl
 import numpy as np
+from attr import dataclass
 from PIL import Image
+from src.graphic_engine.image_source import MODE_OF_COMPONENTS, image_components, image_rows, image_size, \
+    to_pil_image
+from src.graphic_engine.tiled_texture import TiledTexture
 from src.logging_utils import get_logger
 
+MIPMAP_FILTERS = (moderngl.NEAREST_MIPMAP_NEAREST, moderngl.LINEAR_MIPMAP_NEAREST,
+                  moderngl.NEAREST_MIPMAP_LINEAR, moderngl.LINEAR_MIPMAP_LINEAR)
+
+
+def mat4_to_bytes(mat: glm.mat4) -> bytes:
+    # OpenGL expects column-major order, while bytes() of a PyGLM matrix is row-major in some PyGLM versions
+    return struct.pack('16f', *(value for column in mat for value in column))
+
+
+@functools.lru_cache(maxsize=None)
+def read_shader_source(file_path: str) -> str:
+    """Shader files are read once per process."""
+    with open(file_path, 'r') as f:
+        return f.read()
+
+
+def texture_gpu_bytes(texture) -> int:
+    """:return: The GPU memory used by a texture (including its mipmaps), or by the uploaded tiles of a TiledTexture."""
+    if isinstance(texture, TiledTexture):
+        return texture.bytes_used
+    # dtype is e.g. "f1" or "f4", where the digit is the size of a component in bytes
+    level_0_bytes = texture.width * texture.height * texture.components * int(texture.dtype[1:])
+    # A full mipmap chain adds a third
+    return level_0_bytes * 4 // 3 if texture.filter[0] in MIPMAP_FILTERS else level_0_bytes
+
+
+class TextureMemoryBudgetExceeded(MemoryError):
+    pass
+
+
+@dataclass
+class TextureSettings:
+    """
+    How images are uploaded to textures:
+
+    texture_format: FORMAT_AUTO keeps grayscale images single channel and RGBA images with their alpha,
+                    and anything else is uploaded as RGB. The other formats convert every image to that format.
+    mipmaps: Build mipmaps and sample them with trilinear filtering, which avoids aliasing when the image is shown
+             smaller than its size. Zooming in is still sampled NEAREST, so the image pixels stay sharp.
+    memory_budget_bytes: The maximal GPU memory of a single texture, None for no limit.
+                         It also limits the uploaded tiles of a TiledTexture.
+    over_budget: What to do with a texture that exceeds the budget - OVER_BUDGET_DOWNSCALE halves the image
+                 until it fits, OVER_BUDGET_TILE uploads it as a TiledTexture instead (in full resolution),
+                 and OVER_BUDGET_REFUSE raises TextureMemoryBudgetExceeded.
+    """
+    FORMAT_AUTO = 'auto'
+    FORMAT_RGB = 'rgb'
+    FORMAT_RGBA = 'rgba'
+    FORMAT_GRAY = 'gray'
+    OVER_BUDGET_DOWNSCALE = 'downscale'
+    OVER_BUDGET_REFUSE = 'refuse'
+    OVER_BUDGET_TILE = 'tile'
+
+    texture_format: str = 'auto'
+    mipmaps: bool = True
+    memory_budget_bytes: int = None
+    over_budget: str = 'downscale'
+
 
 class GraphicEngineInitializer:
     SHADERS_FOLDER_NAME = "shaders"
     VERTEX_SHADER_FILENAME = "vertex_shader.glsl"
     FRAGMENT_SHADER_FILENAME = "fragment_shader.glsl"
+    MARKER_VERTEX_SHADER_FILENAME = "marker_vertex_shader.glsl"
+    MARKER_FRAGMENT_SHADER_FILENAME = "marker_fragment_shader.glsl"
+    FULL_QUAD_XY_RECT = (-1.0, -1.0, 1.0, 1.0)
+    # Compiled programs are shared by all the engines (and marker layers) of a context, since they are
+    # only used to draw - every uniform that differs between their users is written before every draw
+    CACHE_PROGRAMS = True
+    # {context: {(vertex shader filename, fragment shader filename): program}}, the programs of a context are
+    # released by whoever owns the context (see release_programs). Keyed by the context itself and not by its id,
+    # which a later context could reuse - the programs reference their context anyway, so a weak key would not help
+    _programs: {moderngl.Context: dict} = {}
 
     def __init__(self):
         self._logger = get_logger()
         self.shaders_folder = os.path.join(Path(__file__).parent, self.SHADERS_FOLDER_NAME)
 
-    def load_image_to_texture(self, context: moderngl.Context, image: Image) -> moderngl.Texture:
-        texture = context.texture(image.size, 3, image.tobytes())
-        texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+    def load_image_to_texture(self, context: moderngl.Context, image, tiled: bool = None, levels: list = None,
+                              settings: TextureSettings = None):
+        """
+        :param image: PIL image, or an array of shape (height, width, components) with the top row first
+                      (e.g. a numpy.memmap of the decoded image cache, which is uploaded without copying it first).
+        :param tiled: Whether to split the image to a TiledTexture, by default see is_tiled.
+        :param levels: Pyramid levels for a TiledTexture, if they are already available.
+        :param settings: Defaults to TextureSettings(), only their memory budget applies to a TiledTexture.
+        :return: moderngl.Texture, or TiledTexture.
+        """
+        settings = settings or TextureSettings()
+        if tiled is None:
+            tiled = self.is_tiled(context, image, settings)
+        if tiled:
+            self._logger.debug(f"Loading image of size {image_size(image)} as a tiled texture")
+            return TiledTexture(context, image, memory_budget_bytes=settings.memory_budget_bytes, levels=levels)
+
+        image = self.prepare_image(image, settings)
+        texture = self.create_texture(context, image_size(image), image_components(image), settings)
+        texture.write(image_rows(image), alignment=self.row_alignment(texture.width, texture.components))
+        self.finish_texture(texture, settings)
         texture.use(0)
-        self._logger.debug(f"Loaded image of size {texture.size} to texture")
+        self._logger.debug(f"Loaded image of size {texture.size} to a texture with {texture.components} components, "
+                           f"using {texture_gpu_bytes(texture)} bytes of GPU memory")
         return texture
 
+    def is_tiled(self, context: moderngl.Context, image, settings: TextureSettings = None) -> bool:
+        """
+        :return: Whether the image is uploaded as a TiledTexture - if it is larger than the GPU allows,
+                 or if a single texture would exceed the memory budget and the settings tile such textures.
+        """
+        if max(image_size(image)) > context.info['GL_MAX_TEXTURE_SIZE']:
+            return True
+        settings = settings or TextureSettings()
+        if settings.over_budget != TextureSettings.OVER_BUDGET_TILE or settings.memory_budget_bytes is None:
+            return False
+        texture_bytes = self.texture_bytes(image_size(image), self.texture_components(image, settings),
+                                           settings.mipmaps)
+        return texture_bytes > settings.memory_budget_bytes
+
+    @staticmethod
+    def texture_components(image, settings: TextureSettings) -> int:
+        """:return: The components of the texture of the image, in the texture format of the settings."""
+        components = {TextureSettings.FORMAT_AUTO: image_components(image), TextureSettings.FORMAT_RGB: 3,
+                      TextureSettings.FORMAT_RGBA: 4, TextureSettings.FORMAT_GRAY: 1}.get(settings.texture_format)
+        if components is None:
+            raise ValueError(f"Unknown texture format: {settings.texture_format}")
+        return components
+
+    def prepare_image(self, image, settings: TextureSettings):
+        """
+        Converts the image to the texture format of the settings, and downscales it to fit the memory budget.
+        :return: The image, unchanged (and not copied) if neither is needed.
+        """
+        components = self.texture_components(image, settings)
+        if components != image_components(image):
+            image = to_pil_image(image).convert(MODE_OF_COMPONENTS[components])
+
+        if settings.memory_budget_bytes is None:
+            return image
+        size, downscale_factor = image_size(image), 1
+        while self.texture_bytes(size, components, settings.mipmaps) > settings.memory_budget_bytes:
+            if settings.over_budget == TextureSettings.OVER_BUDGET_REFUSE:
+                raise TextureMemoryBudgetExceeded(
+                    f"A texture of size {size} with {components} components needs "
+                    f"{self.texture_bytes(size, components, settings.mipmaps)} bytes, "
+                    f"while the budget is {settings.memory_budget_bytes} bytes")
+            if size == (1, 1):
+                break
+            size, downscale_factor = tuple(-(-s // 2) for s in size), downscale_factor * 2
+        if downscale_factor > 1:
+            self._logger.warning(f"Downscaling image of size {image_size(image)} to {size} to fit the texture budget")
+            image = to_pil_image(image).reduce(downscale_factor)
+        return image
+
+    def create_texture(self, context: moderngl.Context, size: (int, int), components: int,
+                       settings: TextureSettings) -> moderngl.Texture:
+        """:return: An empty texture, that images with the given size and components can be written into."""
+        texture = context.texture(size, components, alignment=self.row_alignment(size[0], components))
+        texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        if components == 1:
+            # Grayscale is sampled as (L, L, L, 1) instead of (L, 0, 0, 1)
+            texture.swizzle = 'RRR1'
+        return texture
+
+    @staticmethod
+    def finish_texture(texture: moderngl.Texture, settings: TextureSettings):
+        """Called once the image is written to the texture created by create_texture."""
+        if settings.mipmaps:
+            # build_mipmaps also sets the magnification filter to LINEAR, which blurs zoomed in pixels
+            texture.build_mipmaps()
+            texture.filter = (moderngl.LINEAR_MIPMAP_LINEAR, moderngl.NEAREST)
+
+    @staticmethod
+    def row_alignment(width: int, components: int) -> int:
+        """Rows of tightly packed pixels are 4 bytes aligned only if their size is, otherwise they are 1 byte aligned."""
+        return 4 if (width * components) % 4 == 0 else 1
+
+    @staticmethod
+    def texture_bytes(size: (int, int), components: int, mipmaps: bool) -> int:
+        level_0_bytes = size[0] * size[1] * components
+        return level_0_bytes * 4 // 3 if mipmaps else level_0_bytes
+
     def init_program(self, context: moderngl.Context):
-        with open(os.path.join(self.shaders_folder, self.VERTEX_SHADER_FILENAME), 'r') as f:
-            vertex_shader = f.read()
-        with open(os.path.join(self.shaders_folder, self.FRAGMENT_SHADER_FILENAME), 'r') as f:
-            fragment_shader = f.read()
-        program = context.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
-        program['model'].write(bytes(glm.mat4()))
+        program = self._load_program(context, self.VERTEX_SHADER_FILENAME, self.FRAGMENT_SHADER_FILENAME)
+        program['model'].write(mat4_to_bytes(glm.mat4()))
+        program['projection'].write(mat4_to_bytes(glm.mat4()))
+        program['quad_xy_rect'].value = self.FULL_QUAD_XY_RECT
+        return program
+
+    def init_marker_program(self, context: moderngl.Context):
+        program = self._load_program(context, self.MARKER_VERTEX_SHADER_FILENAME, self.MARKER_FRAGMENT_SHADER_FILENAME)
+        program['model'].write(mat4_to_bytes(glm.mat4()))
+        program['projection'].write(mat4_to_bytes(glm.mat4()))
         return program
+
+    def _load_program(self, context: moderngl.Context, vertex_shader_filename: str, fragment_shader_filename: str):
+        key = (vertex_shader_filename, fragment_shader_filename)
+        context_programs = self._programs.setdefault(context, {}) if self.CACHE_PROGRAMS else {}
+        if key not in context_programs:
+            context_programs[key] = context.program(
+                vertex_shader=read_shader_source(os.path.join(self.shaders_folder, vertex_shader_filename)),
+                fragment_shader=read_shader_source(os.path.join(self.shaders_folder, fragment_shader_filename)))
+            self._logger.debug(f"Compiled the program of {vertex_shader_filename} and {fragment_shader_filename}")
+        return context_programs[key]
+
+    @classmethod
+    def is_shared_program(cls, context: moderngl.Context, program: moderngl.Program) -> bool:
+        """Shared programs are released by release_programs, and must not be released by their users."""
+        return any(program is cached_program for cached_program in cls._programs.get(context, {}).values())
+
+    @classmethod
+    def release_programs(cls, context: moderngl.Context):
+        """Releases the shared programs of a context, called by its owner before the context is released."""
+        for program in cls._programs.pop(context, {}).values():
+            program.release()
     
     def init_vertex_array(self, context: moderngl.Context, program: moderngl.Program) -> moderngl.VertexArray:
         vertices_xy = self.get_vertices_for_quad_2d(size=(2.0, 2.0), bottom_left_corner=(-1.0, -1.0))
         vertex_buffer_xy = context.buffer(vertices_xy.tobytes())
 
-        vertices_uv = self.get_vertices_for_quad_2d(size=(1.0, 1.0), bottom_left_corner=(0.0, 0.0))
+        # Images are uploaded with their top row first, so the texture is flipped here (v=0 on top), and not on the CPU
+        vertices_uv = self.get_vertices_for_quad_2d(size=(1.0, -1.0), bottom_left_corner=(0.0, 1.0))
         vertex_buffer_uv = context.buffer(vertices_uv.tobytes())
 
         vertex_array = context.vertex_array(program, [(vertex_buffer_xy, "2f", "vertex_xy"),
@@ -0,0 +1,44 @@
+"""
+Images are uploaded to textures either from PIL images, or from numpy arrays of shape (height, width, components)
+with the top row first (e.g. a numpy.memmap of the decoded image cache).
+These helpers treat both the same way.
+"""
+import numpy as np
+from PIL import Image
+
+# PIL modes that are uploaded as they are, any other mode is converted to RGB
+COMPONENTS_OF_MODE = {'L': 1, 'RGB': 3, 'RGBA': 4}
+MODE_OF_COMPONENTS = {components: mode for mode, components in COMPONENTS_OF_MODE.items()}
+# Large images are split into tiles by the graphic engine, so the apps (and not this module, which is also a library)
+# allow PIL to open images beyond its default limit, by setting Image.MAX_IMAGE_PIXELS to this on startup
+MAXIMAL_IMAGE_PIXELS = 2 ** 31
+
+
+def image_size(image) -> (int, int):
+    return (image.shape[1], image.shape[0]) if isinstance(image, np.ndarray) else image.size
+
+
+def image_components(image) -> int:
+    if isinstance(image, np.ndarray):
+        return 1 if image.ndim == 2 else image.shape[2]
+    return COMPONENTS_OF_MODE.get(image.mode, 3)
+
+
+def to_supported_mode(image: Image) -> Image:
+    """:return: The image in one of the modes of COMPONENTS_OF_MODE, converting it only if it is not."""
+    return image if image.mode in COMPONENTS_OF_MODE else image.convert('RGB')
+
+
+def image_rows(image) -> np.ndarray:
+    """:return: The pixels as a (height, width, components) array, without copying them if possible."""
+    if not isinstance(image, np.ndarray):
+        image = np.asarray(to_supported_mode(image))
+    return image.reshape(image.shape[0], image.shape[1], -1)
+
+
+def to_pil_image(image) -> Image:
+    if not isinstance(image, np.ndarray):
+        return to_supported_mode(image)
+    rows = image_rows(image)
+    components = rows.shape[2]
+    return Image.fromarray(rows[:, :, 0] if components == 1 else np.asarray(rows), MODE_OF_COMPONENTS[components])
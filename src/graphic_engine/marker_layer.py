@@ -0,0 +1,81 @@
+import moderngl
+import numpy as np
+
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer, mat4_to_bytes
+from src.logging_utils import get_logger
+
+
+class MarkerLayer:
+    """
+    Draws all the markers (a circle with a cross, like the failed detections) in a single instanced draw call.
+
+    The marker centers are kept in *xy* coordinates in a vertex buffer that grows by doubling,
+    so adding a marker only writes its center, and resizing the window only changes a uniform.
+    """
+    INITIAL_CAPACITY = 64
+    CENTER_SIZE_BYTES = 2 * 4
+
+    def __init__(self, context: moderngl.Context, radius_pixels: float, line_width_pixels: float = 3.0,
+                 color: (float, float, float, float) = (1.0, 0.0, 0.0, 1.0)):
+        self._logger = get_logger()
+        self._context = context
+        self.radius_pixels = radius_pixels
+        self.line_width_pixels = line_width_pixels
+
+        initializer = GraphicEngineInitializer()
+        self._program: moderngl.Program = initializer.init_marker_program(context)
+        self.color = color
+
+        vertices_xy = initializer.get_vertices_for_quad_2d(size=(2.0, 2.0), bottom_left_corner=(-1.0, -1.0))
+        self._quad_buffer: moderngl.Buffer = context.buffer(vertices_xy.tobytes())
+        self._centers_buffer: moderngl.Buffer = None
+        self._vertex_array: moderngl.VertexArray = None
+        self._capacity = 0
+        self.num_markers = 0
+        self._allocate(self.INITIAL_CAPACITY)
+
+    def add_marker(self, x: float, y: float):
+        self.add_markers(np.array([[x, y]]))
+
+    def add_markers(self, centers_xy: np.ndarray):
+        centers_xy = np.ascontiguousarray(centers_xy, dtype=np.float32).reshape(-1, 2)
+        if self.num_markers + len(centers_xy) > self._capacity:
+            self._allocate(max(2 * self._capacity, self.num_markers + len(centers_xy)))
+        self._centers_buffer.write(centers_xy.tobytes(), offset=self.num_markers * self.CENTER_SIZE_BYTES)
+        self.num_markers += len(centers_xy)
+
+    def clear(self):
+        self.num_markers = 0
+
+    def render(self, window_model_mat_bytes: bytes, projection_mat_bytes: bytes, window_size_pixels: (int, int)):
+        if self.num_markers == 0:
+            return
+        self._program['model'].write(window_model_mat_bytes)
+        self._program['projection'].write(projection_mat_bytes)
+        self._program['marker_color'].value = self.color
+        # The window spans 2 in xy, so one pixel is 2 / size
+        self._program['marker_radius_window_xy'].value = (2 * self.radius_pixels / window_size_pixels[0],
+                                                          2 * self.radius_pixels / window_size_pixels[1])
+        self._program['line_width'].value = self.line_width_pixels / self.radius_pixels
+        self._vertex_array.render(moderngl.TRIANGLES, vertices=6, instances=self.num_markers)
+
+    def release(self):
+        self._vertex_array.release()
+        self._centers_buffer.release()
+        self._quad_buffer.release()
+        if not GraphicEngineInitializer.is_shared_program(self._context, self._program):
+            self._program.release()
+
+    def _allocate(self, capacity: int):
+        centers_buffer = self._context.buffer(reserve=capacity * self.CENTER_SIZE_BYTES)
+        if self._centers_buffer is not None:
+            if self.num_markers > 0:
+                self._context.copy_buffer(centers_buffer, self._centers_buffer,
+                                          size=self.num_markers * self.CENTER_SIZE_BYTES)
+            self._vertex_array.release()
+            self._centers_buffer.release()
+        self._centers_buffer, self._capacity = centers_buffer, capacity
+        self._vertex_array = self._context.vertex_array(self._program,
+                                                        [(self._quad_buffer, "2f", "vertex_xy"),
+                                                         (self._centers_buffer, "2f/i", "marker_center_xy")])
+        self._logger.debug("Allocated marker buffer for %d markers", capacity)
@@ -0,0 +1,77 @@
+import moderngl
+import numpy as np
+
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer, TextureSettings
+from src.graphic_engine.image_source import image_components, image_rows, image_size
+from src.logging_utils import get_logger
+
+
+class ProgressiveTextureUpload:
+    """
+    Uploads an image to a new texture a strip of rows at a time, so the upload can be spread between frames
+    (and the app stays responsive while a large image is uploaded).
+
+    Images that are tiled are not uploaded here at all, since their tiles are uploaded lazily anyway -
+    the TiledTexture is created right away, and the upload is complete from the start.
+
+    Mipmaps (see TextureSettings) are built once the last strip is uploaded.
+    """
+    DEFAULT_ROWS_PER_STRIP = 256
+
+    def __init__(self, context: moderngl.Context, image, rows_per_strip: int = DEFAULT_ROWS_PER_STRIP,
+                 tiled: bool = None, levels: list = None, settings: TextureSettings = None):
+        """
+        :param image: A PIL image, or an array of shape (height, width, components) with the top row first.
+        :param tiled: Whether to upload a TiledTexture, by default see GraphicEngineInitializer.is_tiled.
+        :param levels: Pyramid levels, if they are already available (used only if the image is tiled).
+        :param settings: See GraphicEngineInitializer.load_image_to_texture.
+        """
+        self._logger = get_logger()
+        initializer = GraphicEngineInitializer()
+        self.settings = settings or TextureSettings()
+        if tiled is None:
+            tiled = initializer.is_tiled(context, image, self.settings)
+
+        self._rows = None
+        self.rows_uploaded = 0
+        self.rows_per_strip = max(1, int(rows_per_strip))
+        if tiled:
+            self.size: (int, int) = image_size(image)
+            self.texture = initializer.load_image_to_texture(context, image, tiled=True, levels=levels,
+                                                             settings=self.settings)
+            self.rows_uploaded = self.size[1]
+            return
+
+        image = initializer.prepare_image(image, self.settings)
+        self.size: (int, int) = image_size(image)
+        self.texture: moderngl.Texture = initializer.create_texture(context, self.size, image_components(image),
+                                                                    self.settings)
+        self._alignment = initializer.row_alignment(self.size[0], self.texture.components)
+        self._rows = image_rows(image)
+
+    @property
+    def is_complete(self) -> bool:
+        return self.rows_uploaded >= self.size[1]
+
+    def upload_next_strip(self) -> bool:
+        """:return: Whether the upload is complete."""
+        if self.is_complete:
+            return True
+        y = self.rows_uploaded
+        rows = min(self.rows_per_strip, self.size[1] - y)
+        strip = np.ascontiguousarray(self._rows[y:y + rows])
+        self.texture.write(strip, viewport=(0, y, self.size[0], rows), alignment=self._alignment)
+        self.rows_uploaded += rows
+        if self.is_complete:
+            self._rows = None
+            GraphicEngineInitializer.finish_texture(self.texture, self.settings)
+            self._logger.debug("Finished a progressive upload of an image of size %s", self.size)
+        return self.is_complete
+
+    def upload_all(self):
+        while not self.upload_next_strip():
+            pass
+
+    def release(self):
+        self.texture.release()
+        self._rows = None
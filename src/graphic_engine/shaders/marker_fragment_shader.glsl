@@ -0,0 +1,23 @@
+#version 330
+
+// Position inside the marker quad, in [-1,1]X[-1,1]
+in vec2 fragment_offset;
+
+uniform vec4 marker_color;
+// Line width relative to the marker radius
+uniform float line_width;
+
+out vec4 fragment_color;
+
+void main() {
+    float half_width = line_width * 0.5;
+    bool on_circle = abs(length(fragment_offset) - (1.0 - half_width)) <= half_width;
+    // The two diagonals of the quad, at distance |x -+ y| / sqrt(2) from the fragment
+    float diagonal_half_width = half_width * sqrt(2.0);
+    bool on_cross = abs(fragment_offset.x - fragment_offset.y) <= diagonal_half_width
+                    || abs(fragment_offset.x + fragment_offset.y) <= diagonal_half_width;
+    if (!(on_circle || on_cross)) {
+        discard;
+    }
+    fragment_color = marker_color;
+}
@@ -0,0 +1,19 @@
+#version 330
+
+// A corner of the quad that bounds a single marker, in [-1,1]X[-1,1]
+in vec2 vertex_xy;
+// Per instance - the center of the marker in *xy* coordinates, so it moves with the image
+in vec2 marker_center_xy;
+
+uniform mat4 model;
+uniform mat4 projection;
+// The marker keeps its size in pixels, so this is the only thing that changes when the window is resized
+uniform vec2 marker_radius_window_xy;
+
+out vec2 fragment_offset;
+
+void main() {
+    vec4 center = model * vec4(marker_center_xy, 0.0, 1.0);
+    gl_Position = projection * vec4(center.xy + vertex_xy * marker_radius_window_xy, 0.0, 1.0);
+    fragment_offset = vertex_xy;
+}
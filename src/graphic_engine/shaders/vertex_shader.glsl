@@ -4,11 +4,15 @@ in vec2 vertex_xy;
 in vec2 vertex_uv;
 
 uniform mat4 model;
+uniform mat4 projection;
+// The quad is stretched over this rectangle (left, bottom, right, top) - the whole image unless it is tiled
+uniform vec4 quad_xy_rect;
 
 out vec2 fragment_uv;
 
 void main() {
-    vec4 p = vec4(vertex_xy, 0.0, 1.0);
-    gl_Position = model * p;
+    vec2 xy = mix(quad_xy_rect.xy, quad_xy_rect.zw, (vertex_xy + 1.0) * 0.5);
+    vec4 p = vec4(xy, 0.0, 1.0);
+    gl_Position = projection * model * p;
     fragment_uv = vertex_uv;
 }
\ No newline at end of file
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+from src.graphic_engine.graphic_engine_initializer import texture_gpu_bytes
+from src.graphic_engine.tiled_texture import TiledTexture
+from src.logging_utils import get_logger
+
+
+class TextureCache:
+    """
+    Keeps recently used textures on the GPU, so switching back to an image does not upload it again.
+
+    The cache is an LRU limited by the GPU memory of its textures (a TiledTexture counts as its whole memory budget,
+    since this is how much it may grow to). Pinned keys (e.g. the texture that is currently shown) are never evicted.
+    The cache owns its textures, and releases them when they are evicted.
+    """
+    DEFAULT_MEMORY_BUDGET_BYTES = 1024 * 1024 * 1024
+
+    def __init__(self, memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES):
+        self._logger = get_logger()
+        self.memory_budget_bytes = memory_budget_bytes
+        self._textures: OrderedDict = OrderedDict()  # key -> moderngl.Texture or TiledTexture
+        self.pinned_keys: set = set()
+        self.bytes_used = 0
+
+    def __contains__(self, key) -> bool:
+        return key in self._textures
+
+    def __len__(self):
+        return len(self._textures)
+
+    def get(self, key):
+        """:return: The texture, or None if it is not in the cache."""
+        if key not in self._textures:
+            return None
+        self._textures.move_to_end(key)
+        return self._textures[key]
+
+    def put(self, key, texture):
+        if key in self._textures:
+            self._remove(key)
+        self._textures[key] = texture
+        self.bytes_used += self.texture_bytes(texture)
+        # The new texture is kept even if it is over the budget on its own, it is evicted by the next put
+        self._evict(keep_key=key)
+
+    def release(self):
+        for key in list(self._textures):
+            self._remove(key)
+
+    @staticmethod
+    def texture_bytes(texture) -> int:
+        if isinstance(texture, TiledTexture):
+            return texture.memory_budget_bytes
+        return texture_gpu_bytes(texture)
+
+    def _evict(self, keep_key):
+        for key in list(self._textures):
+            if self.bytes_used <= self.memory_budget_bytes:
+                return
+            if key not in self.pinned_keys and key != keep_key:
+                self._logger.debug("Evicting texture %s from the texture cache", key)
+                self._remove(key)
+
+    def _remove(self, key):
+        texture = self._textures.pop(key)
+        self.bytes_used -= self.texture_bytes(texture)
+        texture.release()
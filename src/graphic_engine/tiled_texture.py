@@ -0,0 +1,171 @@
+import math
+from collections import OrderedDict
+
+import glm
+import moderngl
+import numpy as np
+
+from src.graphic_engine.image_source import image_components, image_rows, image_size, to_pil_image
+from src.logging_utils import get_logger
+
+
+class TiledTexture:
+    """
+    An image that is too large for a single texture.
+
+    The image is split into square tiles of TILE_SIZE_PIXELS, on several pyramid levels -
+    level 0 is the original image, and every level is downscaled by 2 from the one before it,
+    until the whole image fits in a single tile.
+
+    Only the tiles that are visible through the window are uploaded to the GPU, from the level whose resolution
+    best matches the window resolution. Uploaded tiles are kept in an LRU cache limited by memory_budget_bytes.
+
+    Tiles are placed by their exact *xy* rectangle, so converting between window and image coordinates
+    does not depend on the tiling at all.
+
+    Like a regular texture, tile row 0 is at the top of the image, and tiles are flipped in uv space when rendered.
+
+    Levels can be given up front (e.g. from the decoded image cache), either as PIL images or as
+    (height, width, components) arrays, in which case tiles are copied straight from them.
+    """
+    TILE_SIZE_PIXELS = 1024
+    DEFAULT_MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+
+    def __init__(self, context: moderngl.Context, image, tile_size_pixels: int = None,
+                 memory_budget_bytes: int = None, levels: list = None):
+        """
+        :param image: PIL image, or an array of shape (height, width, components) with the top row first.
+        :param levels: Optional pyramid levels, starting with level 0 (which replaces image).
+        """
+        self._logger = get_logger()
+        self._context = context
+        self.tile_size_pixels = tile_size_pixels or self.TILE_SIZE_PIXELS
+        self.memory_budget_bytes = memory_budget_bytes or self.DEFAULT_MEMORY_BUDGET_BYTES
+
+        self._levels: list = list(levels) if levels else [image]
+        self.size = image_size(self._levels[0])
+        self.components = image_components(self._levels[0])
+        self.num_levels = self.num_levels_for_size(self.size, self.tile_size_pixels)
+        self._tiles: OrderedDict = OrderedDict()  # (level, column, row) -> moderngl.Texture
+        self.bytes_used = 0
+
+    @classmethod
+    def num_levels_for_size(cls, size: (int, int), tile_size_pixels: int = None) -> int:
+        """:return: The number of levels until the whole image fits in a single tile."""
+        return 1 + max(0, math.ceil(math.log2(max(size) / (tile_size_pixels or cls.TILE_SIZE_PIXELS))))
+
+    def release(self):
+        for texture in self._tiles.values():
+            texture.release()
+        self._tiles.clear()
+        self.bytes_used = 0
+
+    def level_of_detail(self, window_model_mat: glm.mat4, window_width_pixels: int) -> int:
+        # How many image pixels are shown in a single window pixel
+        image_pixels_per_window_pixel = self.size[0] / (window_width_pixels * window_model_mat[0][0])
+        level = int(math.floor(math.log2(max(1.0, image_pixels_per_window_pixel))))
+        return min(level, self.num_levels - 1)
+
+    def visible_tiles(self, window_model_mat: glm.mat4, window_size_pixels: (int, int)) -> [(moderngl.Texture, tuple)]:
+        """
+        Uploads the missing visible tiles, and evicts least recently used ones if the memory budget is exceeded.
+        :return: List of (tile texture, (left, bottom, right, top) in *xy* coordinates) to render.
+        """
+        visible_xy_rect = self._visible_xy_rect(window_model_mat)
+        if visible_xy_rect is None:
+            return []
+
+        level = self.level_of_detail(window_model_mat, window_size_pixels[0])
+        keys = self._tile_keys_in_xy_rect(level, visible_xy_rect)
+        # If the visible tiles do not fit in the budget, show a coarser level rather than thrash the cache
+        while level < self.num_levels - 1 and len(keys) * self._tile_bytes_upper_bound > self.memory_budget_bytes:
+            level += 1
+            keys = self._tile_keys_in_xy_rect(level, visible_xy_rect)
+
+        tiles, keep = [], set(keys)
+        for key in keys:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+            else:
+                self._upload_tile(key, keep)
+            tiles += [(self._tiles[key], self._tile_xy_rect(key))]
+        return tiles
+
+    def _visible_xy_rect(self, window_model_mat: glm.mat4) -> (float, float, float, float):
+        inverse_model_mat = glm.inverse(window_model_mat)
+        x0, y0 = (inverse_model_mat * glm.vec4(-1, -1, 0, 1)).xy
+        x1, y1 = (inverse_model_mat * glm.vec4(1, 1, 0, 1)).xy
+        left, right = max(-1.0, min(x0, x1)), min(1.0, max(x0, x1))
+        bottom, top = max(-1.0, min(y0, y1)), min(1.0, max(y0, y1))
+        if left >= right or bottom >= top:
+            return None
+        return left, bottom, right, top
+
+    def _level_size(self, level: int) -> (int, int):
+        return tuple(-(-s // (2 ** level)) for s in self.size)
+
+    def _level_image(self, level: int):
+        while len(self._levels) <= level:
+            self._levels += [to_pil_image(self._levels[-1]).reduce(2)]
+        return self._levels[level]
+
+    def _tile_keys_in_xy_rect(self, level: int, xy_rect: (float, float, float, float)) -> [(int, int, int)]:
+        level_width, level_height = self._level_size(level)
+        left, bottom, right, top = xy_rect
+        first_column, last_column = self._xy_range_to_tile_range(left, right, level_width)
+        # Rows go from the top of the image down, while y goes up
+        first_row, last_row = self._xy_range_to_tile_range(-top, -bottom, level_height)
+        return [(level, column, row)
+                for row in range(first_row, last_row + 1) for column in range(first_column, last_column + 1)]
+
+    def _xy_range_to_tile_range(self, low: float, high: float, level_size_pixels: int) -> (int, int):
+        last_tile = (level_size_pixels - 1) // self.tile_size_pixels
+        first = math.floor(((low + 1) / 2) * level_size_pixels) // self.tile_size_pixels
+        # high is an exclusive edge, a tile that only touches it is not visible
+        last = (math.ceil(((high + 1) / 2) * level_size_pixels) - 1) // self.tile_size_pixels
+        return max(0, min(first, last_tile)), max(0, min(last, last_tile))
+
+    def _tile_pixels_box(self, key: (int, int, int)) -> (int, int, int, int):
+        """:return: (left, top, right, bottom) in *image pixels* of the level."""
+        level, column, row = key
+        level_width, level_height = self._level_size(level)
+        left, top = column * self.tile_size_pixels, row * self.tile_size_pixels
+        return left, top, min(left + self.tile_size_pixels, level_width), min(top + self.tile_size_pixels, level_height)
+
+    def _tile_xy_rect(self, key: (int, int, int)) -> (float, float, float, float):
+        level_width, level_height = self._level_size(key[0])
+        left, top, right, bottom = self._tile_pixels_box(key)
+        return (-1 + 2 * left / level_width, 1 - 2 * bottom / level_height,
+                -1 + 2 * right / level_width, 1 - 2 * top / level_height)
+
+    @property
+    def _tile_bytes_upper_bound(self) -> int:
+        return self.tile_size_pixels * self.tile_size_pixels * self.components
+
+    def _upload_tile(self, key: (int, int, int), keep: {(int, int, int)}):
+        left, top, right, bottom = self._tile_pixels_box(key)
+        level_image = self._level_image(key[0])
+        if isinstance(level_image, np.ndarray):
+            tile_pixels = np.ascontiguousarray(image_rows(level_image)[top:bottom, left:right])
+        else:
+            tile_pixels = to_pil_image(level_image).crop((left, top, right, bottom)).tobytes()
+        tile_size = (right - left, bottom - top)
+        tile_bytes = tile_size[0] * tile_size[1] * self.components
+        self._evict(tile_bytes, keep)
+
+        texture = self._context.texture(tile_size, self.components, tile_pixels, alignment=1)
+        texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        texture.repeat_x, texture.repeat_y = False, False
+        if self.components == 1:
+            texture.swizzle = 'RRR1'
+        self._tiles[key] = texture
+        self.bytes_used += tile_bytes
+        self._logger.debug("Uploaded tile %s, %d bytes used by %d tiles", key, self.bytes_used, len(self._tiles))
+
+    def _evict(self, needed_bytes: int, keep: {(int, int, int)}):
+        for key in [k for k in self._tiles if k not in keep]:
+            if self.bytes_used + needed_bytes <= self.memory_budget_bytes:
+                return
+            texture = self._tiles.pop(key)
+            self.bytes_used -= texture.width * texture.height * self.components
+            texture.release()
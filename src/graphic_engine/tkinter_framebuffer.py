@@ -3,18 +3,134 @@
 import moderngl
 from PIL import Image, ImageTk
 
+from src.frame_profiler import get_profiler
+from src.graphic_engine.damage_tracker import Damage
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+
 
 class TkinterFramebuffer(ImageTk.PhotoImage):
-    def __init__(self, ctx, size):
+    """
+    The rendering itself happens in an offscreen framebuffer (see FramebufferReadback for the readback modes),
+    and its pixels are pasted into this photo image when the `with` block exits.
+
+    In FramebufferReadback.MODE_PIXEL_BUFFERS the pixels only reach the photo image when `present` is called.
+
+    A frame can also only update the damage of the window (`with framebuffer.frame(damage)`, see DamageTracker):
+    the photo image is scrolled in place by Tk, and then only the damaged rects are read back and pasted,
+    so the pixels that go through python scale with the change, rather than with the window size.
+    """
+    def __init__(self, ctx, size, readback_mode: str = FramebufferReadback.MODE_READ_INTO):
         super(TkinterFramebuffer, self).__init__(Image.new('RGB', size, (0, 0, 0)))
         self.ctx = ctx
-        self.fbo: moderngl.Framebuffer = self.ctx.simple_framebuffer(size)
-        self.scope = self.ctx.scope(self.fbo)
+        self.readback: FramebufferReadback = FramebufferReadback(ctx, size, readback_mode)
+        self.size: (int, int) = self.readback.size
+        self.bytes_copied_last_frame = 0
+        # The damage of the frame being rendered, and the scroll of the frame that is pending
+        self._damage: Damage = None
+        self._pending_scroll_pixels: (int, int) = (0, 0)
+        # The damaged rects are pasted into this photo, and then copied from it into place by Tk
+        self._rects_photo: ImageTk.PhotoImage = None
+
+    def frame(self, damage: Damage = None):
+        """
+        :param damage: Only the rects of the damage are rendered (see GraphicEngine.render) and read back,
+                       after the previous frame is scrolled. The whole frame if None.
+        :return: The framebuffer, to render the frame inside its `with` block.
+        """
+        if self.has_pending_frame:
+            # The next frame only updates its own damage, so the frame before it must be in the photo first
+            self.present()
+        self._damage = None if damage is None or damage.is_full else damage
+        return self
 
     def __enter__(self):
-        self.scope.__enter__()
+        self.readback.scope.__enter__()
 
     def __exit__(self, *args):
-        self.scope.__exit__(*args)
-        self.paste(Image.frombytes('RGB', self.fbo.size, self.fbo.read(), 'raw', 'RGB', 0, -1))
+        self.readback.scope.__exit__(*args)
+        damage, self._damage = self._damage, None
+        with get_profiler().stage("readback"):
+            self.readback.finish_frame(None if damage is None else damage.rects)
+        self._pending_scroll_pixels = (0, 0) if damage is None else damage.scroll_pixels
+        if self.readback.mode != FramebufferReadback.MODE_PIXEL_BUFFERS:
+            self.present()
+
+    @property
+    def fbo(self) -> moderngl.Framebuffer:
+        return self.readback.fbo
+
+    @property
+    def flip_y_in_projection(self) -> bool:
+        return self.readback.flip_y_in_projection
+
+    @property
+    def has_pending_frame(self) -> bool:
+        return self.readback.has_pending_frame
+
+    def width(self):
+        return self.size[0]
+
+    def height(self):
+        return self.size[1]
+
+    def resize(self, size: (int, int)):
+        self.readback.resize(size)
+        self.size = self.readback.size
+        self._pending_scroll_pixels = (0, 0)
+        # The Tk photo is cropped to the window size, so the canvas item never needs to be re-created
+        self.tk.call(str(self), 'configure', '-width', self.size[0], '-height', self.size[1])
+
+    def present(self):
+        with get_profiler().stage("readback"):
+            regions = self.readback.take_regions()
+        if regions is None:
+            return
+        with get_profiler().stage("paste"):
+            self.bytes_copied_last_frame = self.readback.bytes_copied_last_frame
+            if self._pending_scroll_pixels != (0, 0):
+                self._scroll(*self._pending_scroll_pixels)
+                self._pending_scroll_pixels = (0, 0)
+            for rect, pixels in regions:
+                self._paste(rect, pixels)
+
+    def _paste(self, rect: (int, int, int, int), pixels):
+        size = (rect[2] - rect[0], rect[3] - rect[1])
+        if self.readback.mode == FramebufferReadback.MODE_READ:
+            image = Image.frombytes('RGB', size, pixels, 'raw', 'RGB', 0, -1)
+            self.bytes_copied_last_frame += len(pixels)
+        else:
+            # No copy - the image only wraps the readback buffer
+            image = Image.frombuffer('RGBA', size, pixels, 'raw', 'RGBA', 0, 1)
+
+        if size == tuple(self.size):
+            self.paste(image)
+        else:
+            # ImageTk only pastes at the top left corner, so the rect is pasted into a photo of its own first
+            rects_photo = self._get_rects_photo(size)
+            rects_photo.paste(image)
+            self.tk.call(str(self), 'copy', str(rects_photo), '-from', 0, 0, *size, '-to', rect[0], rect[1],
+                         '-compositingrule', 'set')
+        rect_size_rgb_bytes = size[0] * size[1] * 3
+        if not image.im.isblock() or image.mode != 'RGB':
+            # PIL first converts the image into a single memory block of the photo mode
+            self.bytes_copied_last_frame += rect_size_rgb_bytes
+        self.bytes_copied_last_frame += rect_size_rgb_bytes
+
+    def _scroll(self, dx_pixels: int, dy_pixels: int):
+        """Moves the content of the photo image in place, Tk copies it without going through python."""
+        width, height = self.size
+        from_rect = (max(0, -dx_pixels), max(0, -dy_pixels), width - max(0, dx_pixels), height - max(0, dy_pixels))
+        self.tk.call(str(self), 'copy', str(self), '-from', *from_rect, '-to', max(0, dx_pixels), max(0, dy_pixels),
+                     '-compositingrule', 'set')
+
+    def _get_rects_photo(self, size: (int, int)) -> ImageTk.PhotoImage:
+        # It only grows, since a rect is copied from its top left corner
+        current_capacity = (0, 0) if self._rects_photo is None else (self._rects_photo.width(),
+                                                                       self._rects_photo.height())
+        capacity = FramebufferReadback.compute_capacity(size, current_capacity)
+        if capacity != current_capacity:
+            self._rects_photo = ImageTk.PhotoImage('RGB', capacity, width=capacity[0], height=capacity[1])
+        return self._rects_photo
 
+    def release(self):
+        self.readback.release()
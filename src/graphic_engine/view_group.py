@@ -0,0 +1,107 @@
+import moderngl
+from attr import dataclass
+from PIL import Image
+
+from src.graphic_engine.graphic_engine import GraphicEngine
+from src.graphic_engine.graphic_engine_initializer import TextureSettings
+
+
+@dataclass
+class View:
+    graphic_engine: GraphicEngine
+    # TkinterFramebuffer, or FramebufferReadback - anything with frame(damage) and flip_y_in_projection
+    framebuffer: object
+    # The view follows the main view (the first one) with this zoom relative to it, or it is independent if None
+    follow_zoom_ratio: float = None
+
+
+class ViewGroup:
+    """
+    Several views of the same image - e.g. the main view and a minimap, or two zoom levels side by side.
+
+    Every view is a GraphicEngine, with its own model matrix (zoom and pan), window size and damage,
+    and renders into a framebuffer of its own. All the views share one context, one texture (which is only uploaded
+    once, see set_texture and replace_image) and one compiled program (see GraphicEngineInitializer.CACHE_PROGRAMS).
+
+    render() renders all the damaged views in a single pass, so one scheduled frame updates all of them,
+    and the views that did not change are not rendered (or read back) at all.
+    """
+    def __init__(self, context: moderngl.Context, image_size_pixels: (int, int),
+                 texture_settings: TextureSettings = None):
+        self._context = context
+        self.image_size_pixels: (int, int) = tuple(image_size_pixels)
+        self.texture_settings = texture_settings
+        self.views: [View] = []
+
+    def __len__(self):
+        return len(self.views)
+
+    @property
+    def main(self) -> GraphicEngine:
+        return self.views[0].graphic_engine
+
+    def add_view(self, window_size_pixels: (int, int), framebuffer, follow_zoom_ratio: float = None) -> GraphicEngine:
+        """
+        :param follow_zoom_ratio: Keep the view centered on the center of the main view, zoomed in this many times
+                                  more than it (e.g. a detail view). By default the view is independent
+                                  (e.g. a minimap, which always shows the whole image).
+        :return: The graphic engine of the view, the first view is the main one.
+        """
+        graphic_engine = GraphicEngine(self._context, window_size_pixels, Image.new('RGB', (1, 1)),
+                                       image_size_pixels=self.image_size_pixels, texture_settings=self.texture_settings)
+        if len(self.views) > 0:
+            graphic_engine.set_texture(self.main.texture, self.image_size_pixels)
+        self.views += [View(graphic_engine, framebuffer, follow_zoom_ratio)]
+        return graphic_engine
+
+    def view_of(self, graphic_engine: GraphicEngine) -> View:
+        return next(view for view in self.views if view.graphic_engine is graphic_engine)
+
+    def set_texture(self, texture, image_size_pixels: (int, int), reset_view: bool = True):
+        """Shows a texture that is owned by the caller in all the views, see GraphicEngine.set_texture."""
+        self.image_size_pixels = tuple(image_size_pixels)
+        for view in self.views:
+            view.graphic_engine.set_texture(texture, image_size_pixels, reset_view)
+
+    def replace_image(self, image, levels: list = None):
+        """
+        Uploads a different image once, into the texture of the main view (which owns it),
+        and shows it in the other views too. See GraphicEngine.replace_image.
+        """
+        self.main.replace_image(image, levels)
+        for view in self.views[1:]:
+            view.graphic_engine.set_texture(self.main.texture, self.image_size_pixels, reset_view=False)
+
+    def render(self) -> [View]:
+        """
+        Renders the views that were damaged since their last frame (after the views that follow the main view
+        catch up with it), each into its own framebuffer.
+        :return: The views that were rendered.
+        """
+        self._follow_main_view()
+        damaged_views = []
+        for view in self.views:
+            damage = view.graphic_engine.damage.take()
+            if damage.is_empty:
+                continue
+            flip_y = view.framebuffer.flip_y_in_projection
+            with view.framebuffer.frame(damage):
+                if damage.is_full:
+                    view.graphic_engine.clear()
+                    view.graphic_engine.render(flip_y=flip_y)
+                else:
+                    view.graphic_engine.render(flip_y=flip_y, rects=damage.rects)
+            damaged_views += [view]
+        return damaged_views
+
+    def release(self):
+        """Destroys the graphic engines of the views, the framebuffers are released by whoever created them."""
+        # The shared texture is owned by the main view (if by any view), so it is destroyed last
+        for view in reversed(self.views):
+            view.graphic_engine.destroy()
+        self.views = []
+
+    def _follow_main_view(self):
+        for view in self.views[1:]:
+            if view.follow_zoom_ratio is not None:
+                view.graphic_engine.look_at(self.main.view_center_xy, self.main.view_zoom * view.follow_zoom_ratio)
@@ -0,0 +1,119 @@
+import moderngl
+import numpy as np
+from PIL import Image
+
+from src import logging_utils
+from src.bounding_box import BoundingBoxCollection
+from src.frame_profiler import get_profiler
+from src.graphic_engine import coordinate_transforms
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+from src.graphic_engine.graphic_engine import GraphicEngine
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer
+
+
+def create_headless_context() -> moderngl.Context:
+    """
+    The default standalone context needs a display on Linux, so if there is none we fall back to EGL,
+    which also works with software drivers such as llvmpipe on machines without a GPU.
+    """
+    try:
+        return moderngl.create_standalone_context()
+    except Exception as e:
+        logging_utils.get_logger().debug(f"Could not create a standalone context ({e}), trying EGL")
+        return moderngl.create_standalone_context(backend='egl')
+
+
+class HeadlessRunner:
+    """
+    Drives the graphic engine without Tkinter - it renders into an offscreen framebuffer,
+    and the frames are available as numpy arrays.
+
+    The event handlers have the same names as the ones of WindowManager, so the same events can be fed to both.
+    """
+    # Same as WindowManager.ZOOM_STEP
+    ZOOM_STEP = 1.25
+
+    def __init__(self, image: Image, window_size: (int, int) = None, bounding_boxes: BoundingBoxCollection = None,
+                 readback_mode: str = FramebufferReadback.MODE_READ_INTO, context: moderngl.Context = None,
+                 tiled: bool = None):
+        """
+        :param window_size: Defaults to the image size.
+        """
+        self._logger = logging_utils.get_logger()
+        self.window_size: [int, int] = list(window_size or image.size)
+        self.bounding_boxes = bounding_boxes
+
+        # A context that is passed in is released by whoever created it
+        self._owns_context = context is None
+        self.context: moderngl.Context = context or create_headless_context()
+        self.graphic_engine = GraphicEngine(self.context, self.window_size, image, tiled)
+        self.readback = FramebufferReadback(self.context, self.window_size, readback_mode)
+        self.is_closed = False
+        self._pan_last_window_pixels: (int, int) = None
+
+    def destroy(self):
+        self.readback.release()
+        self.graphic_engine.destroy()
+        if self._owns_context:
+            GraphicEngineInitializer.release_programs(self.context)
+            self.context.release()
+
+    def render(self) -> np.ndarray:
+        """:return: The rendered frame, as a (height, width, components) array with the top row first."""
+        profiler = get_profiler()
+        with profiler.frame():
+            with self.readback.scope:
+                self.graphic_engine.clear()
+                self.graphic_engine.render(flip_y=self.readback.flip_y_in_projection)
+            with profiler.stage("readback"):
+                self.readback.finish_frame()
+                pixels = np.frombuffer(self.readback.take_pixels(), dtype=np.uint8)
+        pixels = pixels.reshape(self.window_size[1], self.window_size[0], self.readback.components)
+        return pixels if self.readback.flip_y_in_projection else pixels[::-1]
+
+    def resize(self, window_size: (int, int)):
+        self.window_size = [int(window_size[0]), int(window_size[1])]
+        self.graphic_engine.on_resize(self.window_size)
+        self.readback.resize(self.window_size)
+
+    def hit_test(self, points_window_pixels: np.ndarray) -> np.ndarray:
+        """:return: For every point, the index of the bounding box that was hit, or -1."""
+        points_image_pixels = self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates_batch(
+            points_window_pixels)
+        return self.bounding_boxes.contains(points_image_pixels)
+
+    def on_resize(self, event):
+        self.resize((event.width, event.height))
+        self.render()
+
+    def on_mouse_left_button_press(self, event) -> int:
+        return int(self.hit_test(np.array([[event.x, event.y]]))[0])
+
+    def on_key_press(self, event):
+        if event.keysym == 'Escape':
+            self.is_closed = True
+
+    def on_mouse_wheel(self, event):
+        zoom_in = event.num == 4 or event.delta > 0
+        if self.graphic_engine.zoom(self.ZOOM_STEP if zoom_in else 1 / self.ZOOM_STEP, event.x, event.y):
+            self.render()
+
+    def on_minimap_click(self, event):
+        """
+        Centers the view on the clicked point of the minimap, like WindowManager.on_minimap_click.
+        There is no minimap here, but it always shows the whole image, so its *xy* are its *window xy*,
+        and its size is recorded with the event.
+        """
+        [center_xy] = coordinate_transforms.window_pixels_to_window_xy(np.array([[event.x, event.y]]),
+                                                                        (event.width, event.height))
+        if self.graphic_engine.look_at(center_xy.tolist(), self.graphic_engine.view_zoom):
+            self.render()
+
+    def on_pan_start(self, event):
+        self._pan_last_window_pixels = (event.x, event.y)
+
+    def on_pan_move(self, event):
+        dx, dy = event.x - self._pan_last_window_pixels[0], event.y - self._pan_last_window_pixels[1]
+        self._pan_last_window_pixels = (event.x, event.y)
+        if self.graphic_engine.pan(dx, dy):
+            self.render()
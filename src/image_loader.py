@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+
+from PIL import Image
+
+from src.decoded_image_cache import DecodedImageCache
+from src.graphic_engine.image_source import to_supported_mode
+from src.graphic_engine.tiled_texture import TiledTexture
+from src.logging_utils import get_logger
+
+
+class BackgroundImageLoader:
+    """
+    Decodes an image on a worker thread, so the window can show up before the image is ready.
+
+    For JPEG images, a low resolution preview is decoded first using the JPEG draft mode
+    (which decodes at a reduced scale, and is therefore much faster), and only then the full resolution.
+
+    The results are handed to the GUI thread, which polls them with poll():
+    ("preview", image), ("full", image) or ("error", exception).
+
+    With a DecodedImageCache, an image that was decoded before is not decoded at all - the "full" image is then
+    a (height, width, components) numpy.memmap of the cached pixels, and there is no preview.
+    If the image is larger than max_texture_size_pixels, its pyramid levels are cached as well,
+    and are available in pyramid_levels.
+    """
+    EVENT_PREVIEW = "preview"
+    EVENT_FULL = "full"
+    EVENT_ERROR = "error"
+    PREVIEW_MAXIMAL_SIZE = (1024, 1024)
+
+    def __init__(self, image_path: str, preview_maximal_size: (int, int) = PREVIEW_MAXIMAL_SIZE,
+                 cache: DecodedImageCache = None, max_texture_size_pixels: int = None):
+        self._logger = get_logger()
+        self.image_path = image_path
+        self.preview_maximal_size = preview_maximal_size
+        self.cache = cache
+        # Only the header is read here, which is cheap
+        self.image_size: (int, int) = Image.open(image_path).size
+        self.num_pyramid_levels = 1
+        if max_texture_size_pixels is not None and max(self.image_size) > max_texture_size_pixels:
+            self.num_pyramid_levels = TiledTexture.num_levels_for_size(self.image_size)
+        # Set before the "full" event, if the levels came from the cache
+        self.pyramid_levels: list = None
+
+        self._events: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._decode, name="image_loader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def poll(self) -> [(str, object)]:
+        """:return: All the events since the last poll, without blocking."""
+        events = []
+        while True:
+            try:
+                events += [self._events.get_nowait()]
+            except queue.Empty:
+                return events
+
+    def _decode(self):
+        try:
+            cache_key = None
+            # The image file is only hashed for a cache that is available
+            if self.cache is not None and self.cache.is_available:
+                cache_key = self.cache.key(self.image_path, self.num_pyramid_levels)
+                levels = self.cache.get_by_key(cache_key)
+                if levels is not None:
+                    self.pyramid_levels = levels
+                    self._events.put((self.EVENT_FULL, levels[0]))
+                    return
+
+            preview = self._decode_preview()
+            if preview is not None:
+                self._events.put((self.EVENT_PREVIEW, preview))
+
+            start = time.perf_counter()
+            image = Image.open(self.image_path)
+            # Grayscale and RGBA images are kept as they are, and uploaded to 1 and 4 component textures
+            image = to_supported_mode(image)
+            image.load()
+            self._logger.debug(f"Decoded {self.image_path} in {time.perf_counter() - start:.3f} seconds")
+            self._events.put((self.EVENT_FULL, image))
+        except Exception as e:
+            self._events.put((self.EVENT_ERROR, e))
+            return
+
+        if cache_key is not None:
+            try:
+                # After the image is handed over, so caching does not delay showing it
+                self.cache.put_by_key(cache_key, image, self.num_pyramid_levels)
+            except Exception as e:
+                # The image was decoded fine, it is only decoded again the next time
+                self._logger.warning(f"Could not cache the decoded {self.image_path}: {e}")
+
+    def _decode_preview(self) -> Image:
+        image = Image.open(self.image_path)
+        if image.format != 'JPEG':
+            return None
+        requested_size = tuple(max(1, min(s, s * self.preview_maximal_size[0] // max(self.image_size)))
+                               for s in self.image_size)
+        # draft picks the smallest JPEG scale (1/2, 1/4 or 1/8) that is still at least the requested size
+        image.draft('RGB', requested_size)
+        if image.size == self.image_size:
+            return None
+        image = image.convert('RGB')
+        self._logger.debug(f"Decoded a preview of size {image.size}")
+        return image
@@ -0,0 +1,184 @@
+import struct
+import time
+
+import numpy as np
+from attr import dataclass
+
+from src.logging_utils import get_logger
+
+
+@dataclass
+class InputEvent:
+    """
+    A recorded input event. It has the attributes of tk.Event that the handlers use,
+    so it can be passed to the handlers of WindowManager (and HeadlessRunner) instead of a live event.
+    """
+    time_seconds: float
+    event_type: int
+    x: int = 0
+    y: int = 0
+    # The window size when the event happened, which is the new size for a resize event,
+    # and the size of the minimap for a minimap click
+    width: int = 0
+    height: int = 0
+    delta: int = 0
+    num: int = 0
+    keysym: str = ""
+
+
+class InputRecorder:
+    """
+    Records input events to a compact binary log, which InputReplayer can replay.
+
+    The log starts with MAGIC and VERSION, and then every event is a RECORD (16 bytes):
+    microseconds since the previous event, event type, x, y, window width and height, wheel delta and button number.
+    Key events are followed by the length of their keysym (1 byte) and the keysym itself (UTF-8).
+    """
+    MAGIC = b"PGGI"
+    VERSION = 1
+    HEADER = struct.Struct("<4sH")
+    RECORD = struct.Struct("<IBhhHHhB")
+
+    RESIZE = 0
+    LEFT_BUTTON_PRESS = 1
+    KEY_PRESS = 2
+    MOUSE_WHEEL = 3
+    PAN_START = 4
+    PAN_MOVE = 5
+    # A click (or a drag) on the minimap, in minimap pixels
+    MINIMAP_CLICK = 6
+    # The WindowManager (and HeadlessRunner) handler of every event type
+    HANDLER_NAMES = {RESIZE: "on_resize", LEFT_BUTTON_PRESS: "on_mouse_left_button_press", KEY_PRESS: "on_key_press",
+                     MOUSE_WHEEL: "on_mouse_wheel", PAN_START: "on_pan_start", PAN_MOVE: "on_pan_move",
+                     MINIMAP_CLICK: "on_minimap_click"}
+    EVENT_NAMES = {RESIZE: "resize", LEFT_BUTTON_PRESS: "left_button_press", KEY_PRESS: "key_press",
+                   MOUSE_WHEEL: "mouse_wheel", PAN_START: "pan_start", PAN_MOVE: "pan_move",
+                   MINIMAP_CLICK: "minimap_click"}
+
+    def __init__(self, file_path: str):
+        self._logger = get_logger()
+        self.file_path = file_path
+        self._file = open(file_path, 'wb')
+        self._file.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+        self._last_event_time_us = None
+        self.num_events = 0
+
+    def record(self, event_type: int, tkinter_event, window_size: (int, int)):
+        """
+        :param window_size: The window size at the time of the event (the minimap size for a minimap click),
+                            ignored for a resize event.
+        """
+        now_us = int(time.perf_counter() * 1e6)
+        delay_us = 0 if self._last_event_time_us is None else min(now_us - self._last_event_time_us, 2 ** 32 - 1)
+        self._last_event_time_us = now_us
+        if event_type == self.RESIZE:
+            window_size = (tkinter_event.width, tkinter_event.height)
+        self._file.write(self.RECORD.pack(
+            delay_us, event_type, self._clip(getattr(tkinter_event, 'x', 0), -2 ** 15, 2 ** 15 - 1),
+            self._clip(getattr(tkinter_event, 'y', 0), -2 ** 15, 2 ** 15 - 1),
+            self._clip(window_size[0], 0, 2 ** 16 - 1), self._clip(window_size[1], 0, 2 ** 16 - 1),
+            self._clip(getattr(tkinter_event, 'delta', 0), -2 ** 15, 2 ** 15 - 1),
+            self._clip(getattr(tkinter_event, 'num', 0), 0, 255)))
+        if event_type == self.KEY_PRESS:
+            keysym = tkinter_event.keysym.encode('utf-8')[:255]
+            self._file.write(bytes([len(keysym)]) + keysym)
+        self.num_events += 1
+
+    def close(self):
+        self._file.close()
+        self._logger.info(f"Recorded {self.num_events} input events to {self.file_path}")
+
+    @staticmethod
+    def _clip(value, minimal_value: int, maximal_value: int) -> int:
+        # Tk reports "??" for fields that do not apply to the event
+        value = value if isinstance(value, int) else 0
+        return min(max(value, minimal_value), maximal_value)
+
+
+class InputReplayer:
+    """
+    Replays a log of InputRecorder through the handlers of a target - a WindowManager, or a HeadlessRunner.
+
+    Events are replayed as fast as possible, or in real time (with the recorded delays between them).
+    The latency of every event is the time of its handler, and of after_event (e.g. to process the frame that the
+    event requested), and the report summarizes it per event type, in the format of BenchmarkSuite results -
+    so a recorded session can be compared to a baseline with BenchmarkSuite.find_regressions.
+
+    A key press of Escape ends the replay, since it closes the window.
+    """
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, file_path: str):
+        self.events: [InputEvent] = self.load(file_path)
+        self.latencies_seconds: np.ndarray = np.zeros(0)
+
+    @staticmethod
+    def load(file_path: str) -> [InputEvent]:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        magic, version = InputRecorder.HEADER.unpack_from(data)
+        if magic != InputRecorder.MAGIC or version != InputRecorder.VERSION:
+            raise ValueError(f"{file_path} is not an input log of version {InputRecorder.VERSION}")
+
+        events, offset, time_us = [], InputRecorder.HEADER.size, 0
+        while offset < len(data):
+            delay_us, event_type, x, y, width, height, delta, num = InputRecorder.RECORD.unpack_from(data, offset)
+            offset += InputRecorder.RECORD.size
+            keysym = ""
+            if event_type == InputRecorder.KEY_PRESS:
+                keysym = data[offset + 1:offset + 1 + data[offset]].decode('utf-8')
+                offset += 1 + data[offset]
+            time_us += delay_us
+            events += [InputEvent(time_us / 1e6, event_type, x, y, width, height, delta, num, keysym)]
+        return events
+
+    @property
+    def initial_window_size(self) -> (int, int):
+        """
+        :return: The size the recorded window started with, or None if there are no window events.
+        Every event records the window size, except minimap clicks, which record the size of the minimap.
+        """
+        for event in self.events:
+            if event.event_type != InputRecorder.MINIMAP_CLICK:
+                return event.width, event.height
+        return None
+
+    def replay(self, target, real_time: bool = False, after_event=None) -> dict:
+        """
+        :param after_event: Called after every handler, and included in the latency of the event.
+        :return: The report, see to_dict.
+        """
+        latencies = []
+        start = time.perf_counter()
+        for event in self.events:
+            if event.event_type == InputRecorder.KEY_PRESS and event.keysym == 'Escape':
+                break
+            if real_time:
+                time.sleep(max(0.0, start + event.time_seconds - time.perf_counter()))
+            event_start = time.perf_counter()
+            getattr(target, InputRecorder.HANDLER_NAMES[event.event_type])(event)
+            if after_event is not None:
+                after_event()
+            latencies += [time.perf_counter() - event_start]
+        self.latencies_seconds = np.array(latencies)
+        get_logger().info(f"Replayed {len(latencies)} input events in {time.perf_counter() - start:.3f} seconds")
+        return self.to_dict()
+
+    def to_dict(self) -> dict:
+        """
+        :return: {"results": {"replay/<event name>": latency summary in milliseconds}, "latencies_ms": [per event]},
+                 where "replay/all" summarizes all the events.
+        """
+        latencies_ms = self.latencies_seconds * 1000
+        event_types = np.array([event.event_type for event in self.events[:len(latencies_ms)]])
+        results = {"replay/all": self._summary(latencies_ms)} if len(latencies_ms) > 0 else {}
+        for event_type, event_name in InputRecorder.EVENT_NAMES.items():
+            if np.any(event_types == event_type):
+                results[f"replay/{event_name}"] = self._summary(latencies_ms[event_types == event_type])
+        return {"results": results, "latencies_ms": latencies_ms.tolist()}
+
+    def _summary(self, latencies_ms: np.ndarray) -> dict:
+        percentiles = np.percentile(latencies_ms, self.PERCENTILES)
+        return dict(count=len(latencies_ms), median_ms=float(np.median(latencies_ms)),
+                    mean_ms=float(latencies_ms.mean()), max_ms=float(latencies_ms.max()),
+                    **{f"p{p}_ms": float(value) for p, value in zip(self.PERCENTILES, percentiles)})
@@ -1,12 +1,26 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 
 LOGGER_NAME = 'where_is_waldo_logger'
 
+# The listener that writes the records of the queue, while init_logger(background=True) is in effect
+_listener: logging.handlers.QueueListener = None
 
-def init_logger(log_level_for_console: str = 'info', log_level_for_file: str = 'debug', save_dir: str = None):
+
+def init_logger(log_level_for_console: str = 'info', log_level_for_file: str = 'debug', save_dir: str = None,
+                background: bool = True):
+    """
+    Can be called many times (e.g. by every WindowManager) - the handlers of a previous call are replaced,
+    so every record is written exactly once.
+
+    :param background: Hand the records to a background thread through a queue, which formats and writes them,
+                       so logging does not block the calling (e.g. Tk) thread on I/O.
+    """
     logger = logging.getLogger(LOGGER_NAME)
-    logger.setLevel(level=logging.DEBUG)
+    shutdown_logger()
     logger.propagate = False
 
     formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(filename)s %(lineno)d - %(message)s',
@@ -16,13 +30,49 @@ def init_logger(log_level_for_console: str = 'info', log_level_for_file: str = '
     ch = logging.StreamHandler()
     ch.setLevel(log_level_for_console.upper())
     ch.setFormatter(formatter)
-    logger.addHandler(ch)
+    handlers = [ch]
 
     if save_dir is not None:
         fh = logging.FileHandler(os.path.join(save_dir, f"{LOGGER_NAME}.txt"))
         fh.setLevel(log_level_for_file.upper())
         fh.setFormatter(formatter)
-        logger.addHandler(fh)
+        handlers += [fh]
+
+    # Records below every handler level are dropped by logger.debug (and co.) before they are even created,
+    # so disabled debug logs only cost a level check
+    logger.setLevel(min(handler.level for handler in handlers))
+
+    if not background:
+        for handler in handlers:
+            logger.addHandler(handler)
+        return
+
+    global _listener
+    # Unbounded, so logging never blocks (queue.SimpleQueue needs Python 3.7)
+    records = queue.Queue()
+    # The queue handler only merges the message with its arguments (so they can not change before they are written),
+    # the formatter and the I/O run on the listener thread
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logger():
+    """Writes the records that are still queued, and removes the handlers of init_logger."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+
+# Queued records are written before the process exits
+atexit.register(shutdown_logger)
 
 
 def get_logger():
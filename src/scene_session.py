@@ -0,0 +1,219 @@
+import json
+import os
+
+import moderngl
+import numpy as np
+from attr import dataclass
+from PIL import Image
+
+from src.bounding_box import BoundingBoxCollection
+from src.decoded_image_cache import DecodedImageCache
+from src.graphic_engine.graphic_engine_initializer import TextureSettings
+from src.graphic_engine.progressive_texture_upload import ProgressiveTextureUpload
+from src.graphic_engine.texture_cache import TextureCache
+from src.image_loader import BackgroundImageLoader
+from src.logging_utils import get_logger
+
+
+@dataclass
+class Scene:
+    """
+    An image, and the file with the bounding boxes in it
+    """
+    image_path: str
+    bounding_box_file_path: str
+
+
+class SceneSession:
+    """
+    A playlist of scenes that are shown one after the other, with the same context (and graphic engine).
+
+    Scene textures are kept in a TextureCache, so going back to a recent scene does not upload it again.
+    While the current scene is on screen, the next one is decoded on a background thread,
+    and then uploaded a strip at a time by poll(), so switching to it only swaps textures.
+
+    poll() should be called periodically by the GUI thread (all the GPU work is done there), and returns events:
+    (scene index, "preview", image) for the current scene, (scene index, "ready", texture) for every scene,
+    and (scene index, "error", exception) for every scene whose image can not be read or decoded,
+    or whose bounding box file can not be read (or has no box labeled target_label, if it is given).
+    A scene that failed is not loaded again, and the other scenes keep loading.
+    """
+    EVENT_PREVIEW = BackgroundImageLoader.EVENT_PREVIEW
+    EVENT_READY = "ready"
+    EVENT_ERROR = BackgroundImageLoader.EVENT_ERROR
+    # The size of a scene whose image header can not be read, so it can still be shown (as a placeholder)
+    UNREADABLE_IMAGE_SIZE = (800, 600)
+
+    def __init__(self, context: moderngl.Context, scenes: [Scene], image_cache: DecodedImageCache = None,
+                 texture_cache_budget_bytes: int = TextureCache.DEFAULT_MEMORY_BUDGET_BYTES,
+                 rows_per_strip: int = ProgressiveTextureUpload.DEFAULT_ROWS_PER_STRIP, prefetch: bool = True,
+                 texture_settings: TextureSettings = None, target_label: str = None):
+        self._logger = get_logger()
+        self._context = context
+        self.scenes: [Scene] = list(scenes)
+        self.image_cache = image_cache
+        self.texture_cache = TextureCache(texture_cache_budget_bytes)
+        self.rows_per_strip = rows_per_strip
+        self.prefetch = prefetch
+        self.texture_settings = texture_settings
+        self.target_label = target_label
+        self.current_index = 0
+
+        # Shown while the current scene is not ready yet
+        self.placeholder_texture: moderngl.Texture = context.texture((1, 1), 3, bytes(3))
+        self._image_sizes: {int: (int, int)} = {}
+        self._bounding_boxes: {int: BoundingBoxCollection} = {}
+        self._loaders: {int: BackgroundImageLoader} = {}
+        self._uploads: {int: ProgressiveTextureUpload} = {}
+        self._errors: {int: Exception} = {}
+        # Errors that poll() did not return yet
+        self._error_events: [(int, str, Exception)] = []
+
+    def __len__(self):
+        return len(self.scenes)
+
+    @staticmethod
+    def load_playlist(json_file_path: str) -> [Scene]:
+        """
+        A playlist is a JSON list of {"image_path": ..., "bounding_box_file_path": ...},
+        where relative paths are relative to the playlist file.
+        """
+        playlist_folder = os.path.dirname(os.path.abspath(json_file_path))
+        return [Scene(*[os.path.join(playlist_folder, d[key]) for key in ("image_path", "bounding_box_file_path")])
+                for d in json.load(open(json_file_path, 'r'))]
+
+    def add_scene(self, scene: Scene, bounding_boxes: BoundingBoxCollection = None,
+                  image_size: (int, int) = None) -> int:
+        """
+        Appends a scene to the playlist.
+        :param bounding_boxes: The bounding boxes of the scene, if they were loaded already (e.g. on another thread),
+                               otherwise they are loaded from the file when they are first needed.
+        :param image_size: Like bounding_boxes, for the size of the image.
+        :return: The index of the scene.
+        """
+        index = len(self.scenes)
+        self.scenes += [scene]
+        if bounding_boxes is not None:
+            self._bounding_boxes[index] = self._checked_bounding_boxes(index, bounding_boxes)
+        if image_size is not None:
+            self._image_sizes[index] = tuple(image_size)
+        return index
+
+    def image_size(self, index: int) -> (int, int):
+        if index not in self._image_sizes:
+            try:
+                # Only the header is read, which is cheap
+                self._image_sizes[index] = Image.open(self.scenes[index].image_path).size
+            except OSError as e:
+                self._fail(index, e)
+                self._image_sizes[index] = self.UNREADABLE_IMAGE_SIZE
+        return self._image_sizes[index]
+
+    def error(self, index: int) -> Exception:
+        """:return: Why the scene (its image or bounding boxes) could not be loaded, or None."""
+        return self._errors.get(index)
+
+    def bounding_boxes(self, index: int) -> BoundingBoxCollection:
+        """:return: The bounding boxes of the scene, or no boxes if their file can not be read (and the scene fails)."""
+        if index not in self._bounding_boxes:
+            file_path = self.scenes[index].bounding_box_file_path
+            try:
+                bounding_boxes = BoundingBoxCollection.from_file(file_path)
+            except OSError as e:
+                self._fail(index, e)
+                bounding_boxes = BoundingBoxCollection(np.zeros((0, 4)))
+            except (ValueError, KeyError, TypeError) as e:
+                self._fail(index, ValueError(f"Invalid bounding box file {file_path}: {e}"))
+                bounding_boxes = BoundingBoxCollection(np.zeros((0, 4)))
+            self._bounding_boxes[index] = self._checked_bounding_boxes(index, bounding_boxes)
+        return self._bounding_boxes[index]
+
+    def texture(self, index: int):
+        """:return: The texture of the scene if it is ready, otherwise None."""
+        return self.texture_cache.get(index)
+
+    def go_to(self, index: int):
+        """Makes the scene the current one, and starts loading it if it is not ready."""
+        self.current_index = index
+        self.texture_cache.pinned_keys = {index}
+        self._load(index)
+
+    @property
+    def is_busy(self) -> bool:
+        """Whether there are scenes that are still being decoded or uploaded."""
+        return len(self._loaders) > 0 or len(self._uploads) > 0 or len(self._error_events) > 0
+
+    @property
+    def is_uploading(self) -> bool:
+        return len(self._uploads) > 0
+
+    def poll(self) -> [(int, str, object)]:
+        """
+        Hands decoded images over to be uploaded, and uploads a single strip (of the current scene first).
+        :return: The events since the last poll, see the class docstring.
+        """
+        events = []
+        for index, loader in list(self._loaders.items()):
+            for event, value in loader.poll():
+                if event == BackgroundImageLoader.EVENT_ERROR:
+                    self._loaders.pop(index, None)
+                    self._fail(index, value)
+                elif event == BackgroundImageLoader.EVENT_PREVIEW and index == self.current_index:
+                    events += [(index, self.EVENT_PREVIEW, value)]
+                elif event == BackgroundImageLoader.EVENT_FULL:
+                    self._loaders.pop(index, None)
+                    self._uploads[index] = ProgressiveTextureUpload(self._context, value, self.rows_per_strip,
+                                                                    levels=loader.pyramid_levels,
+                                                                    settings=self.texture_settings)
+
+        if len(self._uploads) > 0:
+            index = self.current_index if self.current_index in self._uploads else next(iter(self._uploads))
+            upload = self._uploads[index]
+            if upload.upload_next_strip():
+                del self._uploads[index]
+                self.texture_cache.put(index, upload.texture)
+                events += [(index, self.EVENT_READY, upload.texture)]
+
+        is_current_done = self.current_index in self.texture_cache or self.current_index in self._errors
+        if self.prefetch and is_current_done and self.current_index + 1 < len(self.scenes):
+            self._load(self.current_index + 1)
+        events, self._error_events = events + self._error_events, []
+        return events
+
+    def release(self):
+        for upload in self._uploads.values():
+            upload.release()
+        self._uploads.clear()
+        # Loader threads can not be stopped, they are daemon threads and their results are dropped
+        self._loaders.clear()
+        self.texture_cache.release()
+        self.placeholder_texture.release()
+
+    def _load(self, index: int):
+        if index in self.texture_cache or index in self._loaders or index in self._uploads or index in self._errors:
+            return
+        self._logger.debug(f"Loading scene {index}: {self.scenes[index].image_path}")
+        try:
+            loader = BackgroundImageLoader(self.scenes[index].image_path, cache=self.image_cache,
+                                           max_texture_size_pixels=self._context.info['GL_MAX_TEXTURE_SIZE'])
+        except OSError as e:
+            self._fail(index, e)
+            return
+        self._image_sizes[index] = loader.image_size
+        self._loaders[index] = loader
+        loader.start()
+
+    def _checked_bounding_boxes(self, index: int, bounding_boxes: BoundingBoxCollection) -> BoundingBoxCollection:
+        """Fails the scene if it has no target box, without failing it twice for a file that could not be read."""
+        if (self.target_label is not None and index not in self._errors
+                and len(bounding_boxes.indices_of_label(self.target_label)) == 0):
+            self._fail(index, ValueError(f"{self.scenes[index].bounding_box_file_path} "
+                                         f"has no bounding box labeled {self.target_label}"))
+        return bounding_boxes
+
+    def _fail(self, index: int, error: Exception):
+        if index in self._errors:
+            return
+        self._logger.error(f"Could not load scene {index} ({self.scenes[index].image_path}): {error}")
+        self._errors[index] = error
+        self._error_events += [(index, self.EVENT_ERROR, error)]
@@ -0,0 +1,68 @@
+import contextlib
+import importlib
+import sys
+import time
+
+# Suppressing no exceptions is a reusable no-op context (contextlib.nullcontext needs Python 3.7)
+_NULL_CONTEXT = contextlib.suppress()
+
+
+class StartupProfiler:
+    """
+    Times the startup of the app - the imports of the heavy modules, and the stages of initializing the window,
+    up to the first frame.
+
+    Steps are timed either as a stage (a `with` block), or by mark, which times the step since the previous one.
+    Like FrameProfiler, a disabled profiler only costs a shared no-op context per stage.
+    This module only imports the standard library, so it can time the imports of everything else.
+    """
+    # In import order, since a module is only timed if it was not imported (by a previous module) already
+    HEAVY_MODULES = ("numpy", "PIL.Image", "glm", "moderngl", "tkinter", "PIL.ImageTk")
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._start = time.perf_counter()
+        self._last_step_end = self._start
+        self.timings_seconds: [(str, float)] = []
+
+    def import_modules(self, module_names: [str] = HEAVY_MODULES):
+        """Imports the modules now, timing each one that was not imported yet."""
+        for module_name in module_names:
+            if module_name in sys.modules:
+                continue
+            with self.stage(f"import {module_name}"):
+                importlib.import_module(module_name)
+
+    def mark(self, name: str):
+        """Records the step that ended now, and started when the previous step (or stage) ended."""
+        now = time.perf_counter()
+        if self.enabled:
+            self.timings_seconds += [(name, now - self._last_step_end)]
+        self._last_step_end = now
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._stage(name)
+
+    @contextlib.contextmanager
+    def _stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last_step_end = time.perf_counter()
+            self.timings_seconds += [(name, self._last_step_end - start)]
+
+    def report(self) -> str:
+        lines = [f"{name:<32} {1000 * seconds:8.1f}ms" for name, seconds in self.timings_seconds]
+        lines += [f"{'total since the profiler started':<32} {1000 * (time.perf_counter() - self._start):8.1f}ms"]
+        return "\n".join(lines)
+
+
+_startup_profiler = StartupProfiler()
+
+
+def get_startup_profiler() -> StartupProfiler:
+    """The profiler of the app, like get_profiler for frames."""
+    return _startup_profiler
@@ -1,12 +1,25 @@
+import os
+import time
 import tkinter as tk
 
 from src import logging_utils
 import moderngl
+import numpy as np
 from PIL import Image
-from src.bounding_box import BoundingBox
+from src.async_hooks import AsyncEventHooks, ClickEvent
+from src.bounding_box import BoundingBoxCollection
+from src.decoded_image_cache import DecodedImageCache
+from src.frame_profiler import get_profiler
+from src.frame_scheduler import FrameScheduler
+from src.graphic_engine import coordinate_transforms
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
 from src.graphic_engine.graphic_engine import GraphicEngine
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer, TextureSettings
 from src.graphic_engine.tkinter_framebuffer import TkinterFramebuffer
-from tkinter import messagebox
+from src.graphic_engine.view_group import ViewGroup
+from src.input_recording import InputRecorder, InputReplayer
+from src.scene_session import Scene, SceneSession
+from src.startup_profiler import get_startup_profiler
 
 
 class WindowManager:
@@ -14,6 +27,33 @@ class WindowManager:
     FAIL_TAG = "FAIL"
     MAXIMAL_WINDOW_SIZE = [1600, 1200]
     WINDOW_TITLE = "Where Is Waldo"
+    FRAMEBUFFER_READBACK_MODE = FramebufferReadback.MODE_READ_INTO
+    ZOOM_STEP = 1.25
+    TARGET_LABEL = BoundingBoxCollection.DEFAULT_LABEL
+    SUCCESS_TAG = "SUCCESS"
+    ERROR_TAG = "ERROR"
+    IMAGE_LOADER_POLL_INTERVAL_MS = 10
+    # Rows uploaded to the GPU between two frames, while the full resolution image is uploaded
+    IMAGE_UPLOAD_ROWS_PER_STRIP = 256
+    TEXTURE_CACHE_BUDGET_BYTES = 1024 * 1024 * 1024
+    # A single scene larger than this is tiled on upload (only its visible tiles are on the GPU, in full resolution),
+    # so a few scenes always fit in the texture cache
+    TEXTURE_SETTINGS = TextureSettings(memory_budget_bytes=TEXTURE_CACHE_BUDGET_BYTES // 4,
+                                       over_budget=TextureSettings.OVER_BUDGET_TILE)
+    NEXT_SCENE_KEY = 'n'
+    PREVIOUS_SCENE_KEY = 'p'
+    HUD_TAG = "HUD"
+    PROFILING_TOGGLE_KEY = 'F2'
+    HUD_TOGGLE_KEY = 'F3'
+    TRACE_EXPORT_KEY = 'F4'
+    TRACE_FILE_PATH = "frame_trace.json"
+    # How often run_async processes Tk events - frames are still rendered at most once per display interval
+    ASYNC_PUMP_INTERVAL_SECONDS = 0.004
+    MINIMAP_MAXIMAL_SIZE = [240, 180]
+    MINIMAP_MARGIN_PIXELS = 10
+    MINIMAP_VIEWPORT_TAG = "MINIMAP_VIEWPORT"
+    # Until a scene with a target box is shown
+    DEFAULT_FAIL_CIRCLE_RADIUS_PIXELS = 10
 
     """
     Glossary:
@@ -57,20 +97,47 @@ class WindowManager:
                     This corresponds to the "window" coordinate system, where (0, 0) is the center.
 
     """
-    def __init__(self, image_path: str, waldo_bounding_box_json_file_path: str, debug: bool = False):
+    def __init__(self, image_path: str, waldo_bounding_box_json_file_path: str, debug: bool = False,
+                 gpu_markers: bool = False, image_cache_folder: str = None, use_image_cache: bool = True,
+                 more_scenes: [Scene] = None, profile_frames: bool = False, input_recording_path: str = None,
+                 minimap: bool = False):
+        """
+        :param gpu_markers: Draw the failed detections with the graphic engine (in a single draw call),
+                            instead of as Tkinter canvas items.
+        :param image_cache_folder: Where decoded images are cached, see DecodedImageCache for the default.
+        :param use_image_cache: Whether to cache decoded images on disk, so reopening an image does not decode it.
+        :param more_scenes: Scenes to play after the first one (press NEXT_SCENE_KEY and PREVIOUS_SCENE_KEY to move
+                            between them), in the same window, with the same graphic engine.
+        :param profile_frames: Time the stages of every frame from the start (see FrameProfiler).
+                               Press PROFILING_TOGGLE_KEY to toggle it, HUD_TOGGLE_KEY to show the timings on screen,
+                               and TRACE_EXPORT_KEY to export them as a Chrome trace to TRACE_FILE_PATH.
+        :param input_recording_path: Record the input events to this file, to replay them later (see InputReplayer).
+        :param minimap: Show the whole image in a corner of the window, with the part that is in view outlined.
+                        Click (or drag) on it to move the view. It shares the texture of the window, see ViewGroup.
+        """
+        self._start_time = time.perf_counter()
+        self.time_to_first_frame_seconds: float = None
+        self.time_to_full_resolution_seconds: float = None
         logging_utils.init_logger(log_level_for_console='debug' if debug is True else 'info')
         self._logger = logging_utils.get_logger()
-
-        self.waldo_bounding_box = BoundingBox.from_json(waldo_bounding_box_json_file_path)
-        self._fail_circle_radius = int(min([self.waldo_bounding_box.right - self.waldo_bounding_box.left,
-                                            self.waldo_bounding_box.bottom - self.waldo_bounding_box.top]) / 2)
-
-        image = Image.open(image_path).transpose(Image.FLIP_TOP_BOTTOM)
-        self._aspect_ratio = round(image.size[0] / image.size[1], 5)
-        self.window_size: [int, int] = self._compute_initial_window_size(image.size)
+        self.profiler = get_profiler()
+        self.profiler.enabled = profile_frames
+        self._show_hud = False
+        startup_profiler = get_startup_profiler()
+        startup_profiler.mark("init logger")
 
         self.context: moderngl.Context = moderngl.create_standalone_context()
-        self.graphic_engine = GraphicEngine(self.context, self.window_size, image)
+        startup_profiler.mark("create context")
+
+        # Images are decoded in the background, meanwhile a blank placeholder (and then a preview) is shown
+        image_cache = DecodedImageCache(image_cache_folder) if use_image_cache else None
+        self.session = SceneSession(self.context, [Scene(image_path, waldo_bounding_box_json_file_path)]
+                                    + list(more_scenes or []), image_cache, self.TEXTURE_CACHE_BUDGET_BYTES,
+                                    self.IMAGE_UPLOAD_ROWS_PER_STRIP, texture_settings=self.TEXTURE_SETTINGS,
+                                    target_label=self.TARGET_LABEL)
+        image_size = self.session.image_size(0)
+        self.window_size: [int, int] = self._compute_initial_window_size(image_size)
+        startup_profiler.mark("create scene session")
 
         self.root = tk.Tk()
         self.root.title(self.WINDOW_TITLE)
@@ -79,114 +146,534 @@ class WindowManager:
         self.main_canvas: tk.Canvas = tk.Canvas(self.root)
         self.main_canvas.place(relwidth=1, relheight=1, anchor=tk.NW)
 
-        self.framebuffer: TkinterFramebuffer = TkinterFramebuffer(self.context, self.window_size)
+        self.framebuffer: TkinterFramebuffer = TkinterFramebuffer(self.context, self.window_size,
+                                                                   self.FRAMEBUFFER_READBACK_MODE)
         self._add_framebuffer_image_to_canvas()
-
-        self.root.protocol("WM_DELETE_WINDOW", self.before_closing)
-        self.main_canvas.bind("<Configure>", self.on_resize)
-        self.main_canvas.bind("<ButtonPress-1>", self.on_mouse_left_button_press)
-        self.main_canvas.bind_all("<Key>", self.on_key_press)
+        startup_profiler.mark("create window")
+
+        # All the views of the window share the context, the texture and the program
+        self.views = ViewGroup(self.context, image_size, self.TEXTURE_SETTINGS)
+        self.graphic_engine: GraphicEngine = self.views.add_view(self.window_size, self.framebuffer)
+        self._gpu_markers = gpu_markers
+        self.minimap_canvas: tk.Canvas = None
+        self.minimap_framebuffer: TkinterFramebuffer = None
+        self.minimap_engine: GraphicEngine = None
+        if minimap:
+            self._create_minimap(image_size)
+        startup_profiler.mark("create graphic engine")
 
         self._detections_circle_center_xy: [[float, float]] = []
+        # The canvas items (circle, line, line) of every fail circle, in the order of _detections_circle_center_xy
+        self._fail_circle_items: [(int, int, int)] = []
+        self._pending_window_size: [int, int] = None
+        self._pan_last_window_pixels: (int, int) = None
+        self._frame_scheduler: FrameScheduler = FrameScheduler(self.root, self._render_frame)
+        self.input_recorder: InputRecorder = InputRecorder(input_recording_path) if input_recording_path else None
+
+        self.root.protocol("WM_DELETE_WINDOW", self.before_closing)
+        self.main_canvas.bind("<Configure>", self._handler(self.on_resize, InputRecorder.RESIZE))
+        self.main_canvas.bind("<ButtonPress-1>",
+                              self._handler(self.on_mouse_left_button_press, InputRecorder.LEFT_BUTTON_PRESS))
+        self.main_canvas.bind_all("<Key>", self._handler(self.on_key_press, InputRecorder.KEY_PRESS))
+        # Mouse wheel is <MouseWheel> on Windows and macOS, and buttons 4 and 5 on Linux
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.main_canvas.bind(sequence, self._handler(self.on_mouse_wheel, InputRecorder.MOUSE_WHEEL))
+        # Dragging with the right button (which is button 2 on macOS) or the middle button pans the image
+        for button in (2, 3):
+            self.main_canvas.bind(f"<ButtonPress-{button}>", self._handler(self.on_pan_start, InputRecorder.PAN_START))
+            self.main_canvas.bind(f"<B{button}-Motion>", self._handler(self.on_pan_move, InputRecorder.PAN_MOVE))
+
+        self._is_polling_session = False
+        self._success_label: tk.Label = None
+        self.hooks = AsyncEventHooks()
+        self.is_closed = False
+        self._is_running_async = False
+        # The open dialogs by (title, message), see _show_dialog
+        self._dialogs: {(str, str): tk.Toplevel} = {}
+        self._fail_circle_radius = self.DEFAULT_FAIL_CIRCLE_RADIUS_PIXELS
+        self.show_scene(0)
+        startup_profiler.mark("show first scene")
 
     def run(self):
         self.root.mainloop()
 
-    def before_closing(self):
-        if messagebox.askokcancel("Quit", "Are you done looking for Waldo?"):
+    async def run_async(self, pump_interval_seconds: float = ASYNC_PUMP_INTERVAL_SECONDS):
+        """
+        Runs the app in an asyncio loop instead of root.mainloop(), until the window is closed.
+
+        Tk events (and the frames they requested, see FrameScheduler) are processed every pump_interval_seconds,
+        and the loop runs other coroutines in between - e.g. ones that wait on the hooks (see AsyncEventHooks),
+        or add scenes with add_scene_async. A coroutine should not block the loop, blocking I/O belongs in
+        asyncio.to_thread, otherwise it stalls the frames.
+        Dialogs are not modal (see _show_dialog), since a modal dialog would block the loop until it is closed.
+        """
+        # Only needed in an asyncio loop, so it is not imported on startup
+        import asyncio
+        self._is_running_async = True
+        loop = asyncio.get_running_loop()
+        next_pump = loop.time()
+        while not self.is_closed:
+            self.root.update()
+            # Pumps at a fixed cadence, unless pumping takes longer than the interval, in which case it does not
+            # try to catch up
+            next_pump = max(next_pump + pump_interval_seconds, loop.time())
+            await asyncio.sleep(next_pump - loop.time())
+
+    async def add_scene_async(self, scene: Scene, show: bool = False) -> int:
+        """
+        Adds a scene to the session, reading its bounding boxes and image size on another thread,
+        so frames keep being rendered meanwhile. The image itself is decoded in the background (see SceneSession).
+        :param show: Switch to the scene once it is added.
+        :return: The index of the scene.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            loop.run_in_executor(None, BoundingBoxCollection.from_file, scene.bounding_box_file_path),
+            loop.run_in_executor(None, self._read_image_size, scene.image_path), return_exceptions=True)
+        # What could not be read is read again by the session when the scene is shown, which fails the scene
+        bounding_boxes, image_size = [None if isinstance(result, Exception) else result for result in results]
+        index = self.session.add_scene(scene, bounding_boxes, image_size)
+        if show and not self.is_closed:
+            self.show_scene(index)
+        return index
+
+    @staticmethod
+    def _read_image_size(image_path: str) -> (int, int):
+        # Only the header is read, which is cheap
+        with Image.open(image_path) as image:
+            return image.size
+
+    def replay_input(self, input_log_path: str, real_time: bool = False) -> dict:
+        """
+        Replays recorded input events (see InputRecorder) instead of running the main loop, and closes the window.
+        The latency of every event includes the frame it requested.
+        :return: The latency report of InputReplayer.
+        """
+        replayer = InputReplayer(input_log_path)
+        if replayer.initial_window_size is not None:
+            self._pending_window_size = list(replayer.initial_window_size)
+            self._frame_scheduler.request_frame()
+        # Shows the window and its first frame before the first event
+        self._finish_replayed_event()
+        report = replayer.replay(self, real_time, after_event=self._finish_replayed_event)
+        if not self.is_closed:
             self.on_closing()
+        return report
+
+    def _finish_replayed_event(self):
+        """
+        Processes the Tk events of a replayed event, and then renders and presents the frame it requested right away -
+        the FrameScheduler may have deferred it to after the next event, which would leave it out of the latency.
+        """
+        self.root.update()
+        if self.is_closed:
+            return
+        self._frame_scheduler.render_now()
+        for view in self.views.views:
+            if view.framebuffer.has_pending_frame:
+                view.framebuffer.present()
+
+    def before_closing(self):
+        self._show_dialog("Quit", "Are you done looking for Waldo?", self.on_closing)
 
     def on_closing(self):
-        self.graphic_engine.destroy()
+        self.is_closed = True
+        self.hooks.cancel_all()
+        self._frame_scheduler.cancel()
+        if self.input_recorder is not None:
+            self.input_recorder.close()
+        self.framebuffer.release()
+        if self.minimap_framebuffer is not None:
+            self.minimap_framebuffer.release()
+        self.views.release()
+        self.session.release()
+        GraphicEngineInitializer.release_programs(self.context)
+        self.context.release()
         self.root.destroy()
 
-    def on_resize(self, tkinter_event: tk.Event):
-        self._logger.debug(tkinter_event)
-        self.window_size = [tkinter_event.width, tkinter_event.height]
-
-        self.root.geometry(f'{self.window_size[0]}x{self.window_size[1]}')
-        self.graphic_engine.on_resize(self.window_size)
+    def _handler(self, handler, event_type: int, canvas_size=None):
+        """
+        :param canvas_size: Returns the size of the canvas of the event, which is recorded with it (the window size
+                            by default), e.g. the minimap size for a minimap click.
+        :return: The handler, which also records the event if input is recorded.
+        """
+        if self.input_recorder is None:
+            return handler
+
+        def record_and_handle(tkinter_event: tk.Event):
+            self.input_recorder.record(event_type, tkinter_event,
+                                       self.window_size if canvas_size is None else canvas_size())
+            return handler(tkinter_event)
+        return record_and_handle
+
+    def show_scene(self, index: int):
+        """Switches to another scene of the session, without recreating the window or the graphic engine."""
+        start = time.perf_counter()
+        # The file may also hold many labeled boxes (JSON or NDJSON), only the ones labeled TARGET_LABEL are Waldo.
+        # They are loaded before switching, a file that can not be read (or has no Waldo) fails the scene,
+        # like an unreadable image, and it is shown without a Waldo until it is skipped
+        bounding_boxes = self.session.bounding_boxes(index)
+        target_indices = bounding_boxes.indices_of_label(self.TARGET_LABEL)
+        self.session.go_to(index)
+        self.bounding_boxes = bounding_boxes
+        self.waldo_bounding_box = bounding_boxes[target_indices[0]] if len(target_indices) > 0 else None
+        if self.waldo_bounding_box is not None:
+            self._fail_circle_radius = int(min([self.waldo_bounding_box.right - self.waldo_bounding_box.left,
+                                                self.waldo_bounding_box.bottom - self.waldo_bounding_box.top]) / 2)
+        self._detections_circle_center_xy = []
+        self._fail_circle_items = []
+        if self._gpu_markers:
+            self.graphic_engine.enable_markers(self._fail_circle_radius)
+        self.main_canvas.delete(self.SUCCESS_TAG, self.ERROR_TAG, self.FAIL_TAG)
+        if self._success_label is not None:
+            self._success_label.destroy()
+            self._success_label = None
+
+        image_size = self.session.image_size(index)
+        self._aspect_ratio = round(image_size[0] / image_size[1], 5)
+        texture = self.session.texture(index)
+        self.views.set_texture(texture or self.session.placeholder_texture, image_size)
+        if self.minimap_engine is not None:
+            self._resize_minimap(image_size)
+        if list(self._compute_initial_window_size(image_size)) != list(self.window_size):
+            self._pending_window_size = self._compute_initial_window_size(image_size)
+        self._frame_scheduler.request_frame()
+        self._logger.debug(f"Switched to scene {index} in {1000 * (time.perf_counter() - start):.1f}ms"
+                           f"{'' if texture is not None else ', it is still loading'}")
+        if self.session.error(index) is not None:
+            self._show_scene_error(index)
+        self._start_polling_session()
+
+    def next_scene(self):
+        if self.session.current_index + 1 < len(self.session):
+            self.show_scene(self.session.current_index + 1)
+
+    def previous_scene(self):
+        if self.session.current_index > 0:
+            self.show_scene(self.session.current_index - 1)
 
-        self._update_framebuffer_image()
-        self._update_all_fail_circles()
+    def on_resize(self, tkinter_event: tk.Event):
+        with self.profiler.stage("configure"):
+            # The event is only formatted (by the logger) if debug logs are enabled
+            self._logger.debug("%s", tkinter_event)
+            # A drag-resize fires many events - only the last one is rendered, in the next frame
+            self._pending_window_size = [tkinter_event.width, tkinter_event.height]
+            self._frame_scheduler.request_frame()
+        self.hooks.fire(AsyncEventHooks.RESIZE, (tkinter_event.width, tkinter_event.height))
+
+    def on_mouse_wheel(self, tkinter_event: tk.Event):
+        zoom_in = tkinter_event.num == 4 or tkinter_event.delta > 0
+        factor = self.ZOOM_STEP if zoom_in else 1 / self.ZOOM_STEP
+        if self.graphic_engine.zoom(factor, tkinter_event.x, tkinter_event.y):
+            self._frame_scheduler.request_frame()
+
+    def on_pan_start(self, tkinter_event: tk.Event):
+        self._pan_last_window_pixels = (tkinter_event.x, tkinter_event.y)
+
+    def on_pan_move(self, tkinter_event: tk.Event):
+        dx, dy = tkinter_event.x - self._pan_last_window_pixels[0], tkinter_event.y - self._pan_last_window_pixels[1]
+        self._pan_last_window_pixels = (tkinter_event.x, tkinter_event.y)
+        if self.graphic_engine.pan(dx, dy):
+            self._frame_scheduler.request_frame()
+
+    def _start_polling_session(self):
+        if not self._is_polling_session:
+            self._is_polling_session = True
+            self.root.after_idle(self._poll_session)
+
+    def _poll_session(self):
+        try:
+            self._handle_session_events(self.session.poll())
+        finally:
+            # Even if handling the events failed, the other scenes (and the strips of the current one) keep loading
+            self._schedule_session_poll()
+
+    def _handle_session_events(self, events: [(int, str, object)]):
+        for index, event, value in events:
+            if index != self.session.current_index:
+                continue
+            if event == SceneSession.EVENT_ERROR:
+                self._show_scene_error(index)
+                # Not from within the poll, so a slow reply to the dialog does not delay it
+                self.root.after_idle(self._report_scene_error, index)
+            elif event == SceneSession.EVENT_PREVIEW:
+                self._logger.debug(f"Showing a preview of size {value.size}")
+                self.views.replace_image(value)
+            elif event == SceneSession.EVENT_READY:
+                # Keep the view, the user may have zoomed into the preview already
+                self.views.set_texture(value, self.session.image_size(index), reset_view=False)
+                if self.time_to_full_resolution_seconds is None:
+                    self.time_to_full_resolution_seconds = time.perf_counter() - self._start_time
+                    self._logger.info(f"Time to full resolution: {self.time_to_full_resolution_seconds:.3f} seconds")
+            self._frame_scheduler.request_frame()
+
+    def _schedule_session_poll(self):
+        if self.is_closed or not self.session.is_busy:
+            self._is_polling_session = False
+        elif self.session.is_uploading:
+            # One strip per idle callback, so input events and frames are handled between strips
+            self.root.after_idle(self._poll_session)
+        else:
+            self.root.after(self.IMAGE_LOADER_POLL_INTERVAL_MS, self._poll_session)
+
+    def _render_frame(self):
+        with self.profiler.frame():
+            if self._pending_window_size is not None:
+                self.window_size, self._pending_window_size = self._pending_window_size, None
+                self.root.geometry(f'{self.window_size[0]}x{self.window_size[1]}')
+                self.graphic_engine.on_resize(self.window_size)
+                self.framebuffer.resize(self.window_size)
+
+            self._update_framebuffer_image()
+            with self.profiler.stage("canvas"):
+                self._update_all_fail_circles()
+                self._update_hud()
+
+        if self.time_to_first_frame_seconds is None:
+            self.time_to_first_frame_seconds = time.perf_counter() - self._start_time
+            self._logger.info(f"Time to first frame: {self.time_to_first_frame_seconds:.3f} seconds")
+            startup_profiler = get_startup_profiler()
+            if startup_profiler.enabled:
+                startup_profiler.mark("first frame")
+                self._logger.info("Startup timings:\n" + startup_profiler.report())
 
     def on_key_press(self, tkinter_event: tk.Event):
         if tkinter_event.keysym == 'Escape':
             self.before_closing()
+        elif tkinter_event.keysym == self.NEXT_SCENE_KEY:
+            self.next_scene()
+        elif tkinter_event.keysym == self.PREVIOUS_SCENE_KEY:
+            self.previous_scene()
+        elif tkinter_event.keysym == self.PROFILING_TOGGLE_KEY:
+            self.profiler.enabled = not self.profiler.enabled
+            self._logger.info(f"Frame profiling {'enabled' if self.profiler.enabled else 'disabled'}")
+        elif tkinter_event.keysym == self.HUD_TOGGLE_KEY:
+            self._show_hud = not self._show_hud
+            # The HUD shows the profiler timings, so it needs the profiler
+            self.profiler.enabled = self.profiler.enabled or self._show_hud
+            self._frame_scheduler.request_frame()
+        elif tkinter_event.keysym == self.TRACE_EXPORT_KEY:
+            self.profiler.export_chrome_trace(self.TRACE_FILE_PATH)
+            self._logger.info(f"Exported {len(self.profiler)} frame samples to {self.TRACE_FILE_PATH}")
+            for name, stage_summary in self.profiler.summary().items():
+                self._logger.info(f"{name}: " + ", ".join(f"{key} {value:.3f}" for key, value in stage_summary.items()))
 
     def on_mouse_left_button_press(self, tkinter_event: tk.Event):
-        self._logger.debug(tkinter_event)
-        if self._is_this_waldo(tkinter_event.x, tkinter_event.y):
+        self._logger.debug("%s", tkinter_event)
+        xy_image_pixels = self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates_batch(
+            np.array([[tkinter_event.x, tkinter_event.y]]))
+        click = ClickEvent(self.session.current_index, tkinter_event.x, tkinter_event.y,
+                           *[int(v) for v in xy_image_pixels[0]], self._is_this_waldo(xy_image_pixels))
+        if click.is_hit:
             self._successful_detection(tkinter_event.x, tkinter_event.y)
         else:
             current_detection_center_xy = self.graphic_engine.window_pixels_coordinates_to_xy_coordinates(tkinter_event.x,
                                                                                                           tkinter_event.y)
             self._detections_circle_center_xy += [current_detection_center_xy]
-            self._draw_fail_circle(current_detection_center_xy)
+            if self._gpu_markers:
+                self.graphic_engine.add_marker(*current_detection_center_xy)
+                self._frame_scheduler.request_frame()
+            else:
+                self._draw_fail_circle(current_detection_center_xy)
+        self.hooks.fire(AsyncEventHooks.CLICK, click)
+        if click.is_hit:
+            self.hooks.fire(AsyncEventHooks.DETECTION, click)
+
+    def _show_scene_error(self, index: int):
+        """The scene stays on its placeholder, the other scenes can still be played."""
+        self.main_canvas.delete(self.ERROR_TAG)
+        self.main_canvas.create_text(*self._window_center, anchor=tk.CENTER, fill='red', font="Times 16 bold",
+                                     width=int(0.8 * self.window_size[0]), justify=tk.CENTER, tags=self.ERROR_TAG,
+                                     text=f"Could not load {os.path.basename(self.session.scenes[index].image_path)}:"
+                                          f"\n{self.session.error(index)}")
+
+    def _report_scene_error(self, index: int):
+        """Tells the user that the scene could not be loaded, and skips it (or closes the window, if it is the last)."""
+        has_next_scene = index + 1 < len(self.session)
+        self._show_dialog("Could not load the scene",
+                          f"{self.session.scenes[index].image_path}\n\n{self.session.error(index)}\n\n"
+                          f"{'Skipping to the next scene.' if has_next_scene else 'Closing the window.'}",
+                          lambda: self._skip_failed_scene(index), can_cancel=False)
+
+    def _skip_failed_scene(self, index: int):
+        if self.is_closed or self.session.current_index != index:
+            return
+        if index + 1 < len(self.session):
+            self.next_scene()
+        else:
+            self.on_closing()
+
+    def _show_dialog(self, title: str, message: str, on_ok, can_cancel: bool = True):
+        """
+        Shows a message, and calls on_ok once the user accepts it (or closes it, if it can not be cancelled).
+
+        In the Tk main loop this is a modal message box. In an asyncio loop (see run_async) it is a window of its own,
+        which Tk handles with the rest of the events - a modal message box runs a loop of its own until it is closed,
+        which would stall the asyncio loop (and every coroutine in it). The same dialog is only raised if it is open.
+        """
+        if not self._is_running_async:
+            # Only needed for dialogs, so it is not imported on startup
+            from tkinter import messagebox
+            if can_cancel and not messagebox.askokcancel(title, message):
+                return
+            if not can_cancel:
+                messagebox.showerror(title, message)
+            on_ok()
+            return
+
+        key = (title, message)
+        if key in self._dialogs:
+            self._dialogs[key].lift()
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title(title)
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        self._dialogs[key] = dialog
+
+        def close(is_ok: bool):
+            self._dialogs.pop(key, None)
+            dialog.destroy()
+            if is_ok and not self.is_closed:
+                on_ok()
+
+        tk.Label(dialog, text=message, justify=tk.LEFT, wraplength=400, padx=20, pady=10).pack()
+        buttons = tk.Frame(dialog)
+        buttons.pack(pady=(0, 10))
+        tk.Button(buttons, text="OK", width=8, command=lambda: close(True)).pack(side=tk.LEFT, padx=5)
+        if can_cancel:
+            tk.Button(buttons, text="Cancel", width=8, command=lambda: close(False)).pack(side=tk.LEFT, padx=5)
+        dialog.protocol("WM_DELETE_WINDOW", lambda: close(not can_cancel))
 
     def _add_framebuffer_image_to_canvas(self):
         self.main_canvas.create_image(0, 0, image=self.framebuffer, anchor=tk.NW, tags=self.IMG_TAG)
+        # Canvas items are created once and then only updated, every frame
+        self._hud_item = self.main_canvas.create_text(10, 10, anchor=tk.NW, fill='yellow', font="Courier 10 bold",
+                                                      state=tk.HIDDEN, tags=self.HUD_TAG)
 
     def _update_framebuffer_image(self):
-        self.framebuffer = TkinterFramebuffer(self.context, self.window_size)
-        self.main_canvas.delete(self.IMG_TAG)
-        self._add_framebuffer_image_to_canvas()
-
-        with self.framebuffer:
-            self.graphic_engine.clear()
-            self.graphic_engine.render()
-
-    def _is_this_waldo(self, x_window_pixels: int, y_window_pixels: int) -> bool:
-        xy_image_pixels = self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates(x_window_pixels,
-                                                                                                  y_window_pixels)
-        return self.waldo_bounding_box.contains(*xy_image_pixels)
+        # Views that did not change (e.g. only the HUD did) are not rendered, their image on the canvas is up to date
+        for view in self.views.render():
+            if view.framebuffer.has_pending_frame:
+                # The frame is still being copied on the GPU, it is presented once Tk is done with pending events
+                self.root.after_idle(view.framebuffer.present)
+            self._logger.debug("Frame readback copied %d bytes", view.framebuffer.bytes_copied_last_frame)
+        if self.minimap_engine is not None:
+            self._update_minimap_viewport()
+
+    def _create_minimap(self, image_size: (int, int)):
+        size = coordinate_transforms.initial_window_size(image_size, self.MINIMAP_MAXIMAL_SIZE)
+        self.minimap_canvas = tk.Canvas(self.main_canvas, width=size[0], height=size[1], borderwidth=0,
+                                        highlightthickness=1, highlightbackground='white')
+        self.minimap_canvas.place(relx=1.0, rely=1.0, x=-self.MINIMAP_MARGIN_PIXELS, y=-self.MINIMAP_MARGIN_PIXELS,
+                                  anchor=tk.SE)
+        self.minimap_framebuffer = TkinterFramebuffer(self.context, size, self.FRAMEBUFFER_READBACK_MODE)
+        self.minimap_canvas.create_image(0, 0, image=self.minimap_framebuffer, anchor=tk.NW, tags=self.IMG_TAG)
+        self._minimap_viewport_item = self.minimap_canvas.create_rectangle(0, 0, 0, 0, outline='yellow', width=2.0,
+                                                                           tags=self.MINIMAP_VIEWPORT_TAG)
+        # The minimap does not follow the main view, it always shows the whole image
+        self.minimap_engine = self.views.add_view(size, self.minimap_framebuffer)
+        for sequence in ("<ButtonPress-1>", "<B1-Motion>"):
+            self.minimap_canvas.bind(sequence, self._handler(self.on_minimap_click, InputRecorder.MINIMAP_CLICK,
+                                                             lambda: self.minimap_framebuffer.size))
+
+    def _resize_minimap(self, image_size: (int, int)):
+        size = coordinate_transforms.initial_window_size(image_size, self.MINIMAP_MAXIMAL_SIZE)
+        if list(size) == list(self.minimap_framebuffer.size):
+            return
+        self.minimap_canvas.config(width=size[0], height=size[1])
+        self.minimap_engine.on_resize(size)
+        self.minimap_framebuffer.resize(size)
+
+    def on_minimap_click(self, tkinter_event: tk.Event):
+        """Centers the main view on the clicked point of the minimap."""
+        if self.minimap_engine is None:
+            # A recorded minimap click, replayed without a minimap
+            self._logger.debug("Ignoring a minimap click, there is no minimap")
+            return
+        center_xy = self.minimap_engine.window_pixels_coordinates_to_xy_coordinates(tkinter_event.x, tkinter_event.y)
+        if self.graphic_engine.look_at(center_xy, self.graphic_engine.view_zoom):
+            self._frame_scheduler.request_frame()
+
+    def _update_minimap_viewport(self):
+        """Outlines the part of the image that is in the main view."""
+        corners_xy = self.graphic_engine.window_pixels_coordinates_to_xy_coordinates_batch(
+            np.array([[0, 0], self.window_size]))
+        corners_pixels, _ = self.minimap_engine.xy_coordinates_to_window_pixel_coordinates_batch(corners_xy)
+        self.minimap_canvas.coords(self._minimap_viewport_item, *corners_pixels.ravel().tolist())
+
+    def _is_this_waldo(self, xy_image_pixels: np.ndarray) -> bool:
+        """:param xy_image_pixels: A single click, in *image pixels*, of shape (1, 2)."""
+        hit_idx = self.bounding_boxes.contains(xy_image_pixels)[0]
+        if hit_idx < 0:
+            return False
+        self._logger.debug("Clicked on bounding box %d labeled %s", hit_idx, self.bounding_boxes.labels[hit_idx])
+        # Waldo may be partly covered by a smaller box with another label, a click inside any Waldo box is a hit
+        return bool(self.bounding_boxes.contains_label(xy_image_pixels, self.TARGET_LABEL)[0])
 
     def _successful_detection(self, x_pixels, y_pixels):
         r = self._fail_circle_radius * 2
-        self.main_canvas.create_oval(x_pixels - r, y_pixels - r, x_pixels + r, y_pixels + r, outline='green', width=5.0)
+        self.main_canvas.create_oval(x_pixels - r, y_pixels - r, x_pixels + r, y_pixels + r, outline='green', width=5.0,
+                                     tags=self.SUCCESS_TAG)
 
         label = tk.Label(self.main_canvas, text="Well Done! You have found Waldo!",
                          font="Times 20 bold", borderwidth=2, relief=tk.GROOVE)
 
+        has_next_scene = self.session.current_index + 1 < len(self.session)
         button_ok = tk.Button(label, bg='pink', fg='black', font="Times 20 bold", relief=tk.RAISED,
-                              text="Cool! Bye!", command=self.on_closing)
+                              text="Next scene!" if has_next_scene else "Cool! Bye!",
+                              command=self.next_scene if has_next_scene else self.on_closing)
         button_ok.bind("<Enter>", lambda x: button_ok.config(background="magenta"))
         button_ok.bind("<Leave>", lambda x: button_ok.config(background="pink"))
         button_ok.pack(side='bottom', padx=5, pady=5, fill='x')
 
         self.main_canvas.create_window(*self._window_center, window=label, anchor=tk.CENTER,
-                                       width=int(self.window_size[0]/2), height=int(self.window_size[1]/2))
+                                       width=int(self.window_size[0]/2), height=int(self.window_size[1]/2),
+                                       tags=self.SUCCESS_TAG)
+        self._success_label = label
+
+    def _update_hud(self):
+        if self._show_hud:
+            self.main_canvas.itemconfigure(self._hud_item, text=self.profiler.hud_text(), state=tk.NORMAL)
+        else:
+            self.main_canvas.itemconfigure(self._hud_item, state=tk.HIDDEN)
 
     def _update_all_fail_circles(self):
-        self.main_canvas.delete(self.FAIL_TAG)
-        for detection_center_xy in self._detections_circle_center_xy:
-            self._draw_fail_circle(detection_center_xy)
+        """Moves the items of every fail circle, and hides the ones that are outside of the window after zooming in."""
+        if self._gpu_markers or len(self._fail_circle_items) == 0:
+            return
+        centers_pixels, inside_window = self.graphic_engine.xy_coordinates_to_window_pixel_coordinates_batch(
+            np.array(self._detections_circle_center_xy))
+        for item_ids, center_pixels, is_inside in zip(self._fail_circle_items, centers_pixels.tolist(),
+                                                      inside_window.tolist()):
+            for item_id, coordinates in zip(item_ids, self._fail_circle_coordinates(center_pixels)):
+                if is_inside:
+                    self.main_canvas.coords(item_id, *coordinates)
+                self.main_canvas.itemconfigure(item_id, state=tk.NORMAL if is_inside else tk.HIDDEN)
 
     def _draw_fail_circle(self, current_detection_center_xy: [float, float]):
         xy_pixels = self.graphic_engine.xy_coordinates_to_window_pixel_coordinates(*current_detection_center_xy)
+        # Hidden if it is outside of the window after zooming in, until it is moved into it
+        state = tk.HIDDEN if xy_pixels is None else tk.NORMAL
+        oval, line, other_line = self._fail_circle_coordinates(xy_pixels if xy_pixels is not None else (0, 0))
+        self._fail_circle_items += [(
+            self.main_canvas.create_oval(*oval, outline='red', width=3.0, state=state, tags=self.FAIL_TAG),
+            self.main_canvas.create_line(*line, fill='red', width=3.0, state=state, tags=self.FAIL_TAG),
+            self.main_canvas.create_line(*other_line, fill='red', width=3.0, state=state, tags=self.FAIL_TAG))]
+
+    def _fail_circle_coordinates(self, xy_pixels: [int, int]) -> [(int, int, int, int)]:
+        """:return: The coordinates of the circle, and of the two lines of the cross in it."""
         left, top = xy_pixels[0] - self._fail_circle_radius, xy_pixels[1] - self._fail_circle_radius
         right, bottom = xy_pixels[0] + self._fail_circle_radius, xy_pixels[1] + self._fail_circle_radius
-        self.main_canvas.create_oval(left, top, right, bottom, outline='red', width=3.0, tags=self.FAIL_TAG)
-        self.main_canvas.create_line(left, top, right, bottom, fill='red', width=3.0, tags=self.FAIL_TAG)
-        self.main_canvas.create_line(left, bottom, right, top, fill='red', width=3.0, tags=self.FAIL_TAG)
+        return [(left, top, right, bottom), (left, top, right, bottom), (left, bottom, right, top)]
 
     def _compute_initial_window_size(self, image_size: (int, int)) -> [int, int]:
-        if image_size[0] <= self.MAXIMAL_WINDOW_SIZE[0] and image_size[1] <= self.MAXIMAL_WINDOW_SIZE[1]:
-            return list(image_size)
-
-        # For more info on this calculation, see https://stackoverflow.com/a/62307044/2934048
-        image_to_window_ratio = ((image_size[0] / image_size[1])
-                                 / (self.MAXIMAL_WINDOW_SIZE[0] / self.MAXIMAL_WINDOW_SIZE[1]))
-        if image_to_window_ratio > 1:  # image is wider than window
-            width = self.MAXIMAL_WINDOW_SIZE[0]
-            height = int(self.MAXIMAL_WINDOW_SIZE[1] * (1 / image_to_window_ratio))
-        else:  # window is wider than image
-            width = int(self.MAXIMAL_WINDOW_SIZE[0] * image_to_window_ratio)
-            height = self.MAXIMAL_WINDOW_SIZE[1]
-
-        self._logger.debug(f"Image is larger than maximal window size, set initial window size to ({width}, {height})")
-
-        return [width, height]
+        window_size = coordinate_transforms.initial_window_size(image_size, self.MAXIMAL_WINDOW_SIZE)
+        if window_size != list(image_size):
+            self._logger.debug(f"Image is larger than maximal window size, set initial window size to "
+                               f"({window_size[0]}, {window_size[1]})")
+        return window_size
 
     @property
     def _window_center(self) -> [int, int]:
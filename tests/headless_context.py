@@ -0,0 +1,17 @@
+from src.headless_runner import create_headless_context
+
+
+def create_test_context():
+    try:
+        return create_headless_context()
+    except Exception:
+        return None
+
+
+# Shared by the tests that render, which are skipped if it is None
+CONTEXT = create_test_context()
+
+
+def restore_shared_context():
+    """Releasing a context leaves no context current, so a test that releases a context of its own calls this."""
+    CONTEXT.__enter__()
@@ -0,0 +1,54 @@
+import asyncio
+from unittest import TestCase
+
+from src.async_hooks import AsyncEventHooks, ClickEvent
+
+
+class TestAsyncEventHooks(TestCase):
+
+    def setUp(self):
+        self.hooks = AsyncEventHooks()
+        self.click = ClickEvent(0, 10, 20, 100, 200, True)
+
+    def test_waiters_get_the_next_event_only(self):
+        async def scenario():
+            first, other = self.hooks.wait_for(AsyncEventHooks.CLICK), self.hooks.wait_for(AsyncEventHooks.RESIZE)
+            self.hooks.fire(AsyncEventHooks.CLICK, self.click)
+            self.assertEqual(self.click, await first)
+            self.assertFalse(other.done())
+            # A future that is waited for again only gets the event after it
+            second = self.hooks.wait_for(AsyncEventHooks.CLICK)
+            self.assertFalse(second.done())
+            self.hooks.cancel_all()
+            self.assertTrue(other.cancelled() and second.cancelled())
+        asyncio.run(scenario())
+
+    def test_callbacks_run_as_tasks_without_blocking_the_event(self):
+        results = []
+
+        async def slow_io(click: ClickEvent):
+            await asyncio.sleep(0.01)
+            results.append(click.scene_index)
+
+        async def failing(_):
+            raise ValueError("A failing callback is only logged")
+
+        async def scenario():
+            self.hooks.add_callback(AsyncEventHooks.DETECTION, slow_io)
+            self.hooks.add_callback(AsyncEventHooks.DETECTION, failing)
+            self.hooks.fire(AsyncEventHooks.DETECTION, self.click)
+            self.assertEqual([], results)
+            self.assertEqual(2, self.hooks.num_running_tasks)
+            while self.hooks.num_running_tasks > 0:
+                await asyncio.sleep(0.001)
+            self.assertEqual([0], results)
+            self.hooks.remove_callback(AsyncEventHooks.DETECTION, slow_io)
+            self.hooks.remove_callback(AsyncEventHooks.DETECTION, failing)
+            self.hooks.fire(AsyncEventHooks.DETECTION, self.click)
+            self.assertEqual(0, self.hooks.num_running_tasks)
+        asyncio.run(scenario())
+
+    def test_firing_without_a_running_loop_does_nothing(self):
+        self.hooks.add_callback(AsyncEventHooks.CLICK, lambda click: None)
+        self.hooks.fire(AsyncEventHooks.CLICK, self.click)
+        self.assertEqual(0, self.hooks.num_running_tasks)
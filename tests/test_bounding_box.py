@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from src.bounding_box import BoundingBox, BoundingBoxCollection
+
+
+class TestBoundingBoxCollection(TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        left_top = random_state.randint(0, 1000, (300, 2))
+        self.boxes = np.hstack([left_top, left_top + random_state.randint(0, 60, (300, 2))])
+        self.collection = BoundingBoxCollection(self.boxes)
+        self.points = random_state.randint(-20, 1080, (2000, 2))
+
+    def _brute_force_hits(self, x, y) -> [int]:
+        return [idx for idx, box in enumerate(self.boxes.tolist()) if BoundingBox(*box).contains(x, y)]
+
+    def test_contains_returns_the_smallest_box_that_contains_each_point(self):
+        areas = (self.boxes[:, 2] - self.boxes[:, 0] + 1) * (self.boxes[:, 3] - self.boxes[:, 1] + 1)
+        hits = self.collection.contains(self.points)
+        for (x, y), hit in zip(self.points.tolist(), hits.tolist()):
+            expected = self._brute_force_hits(x, y)
+            if len(expected) == 0:
+                self.assertEqual(-1, hit)
+            else:
+                self.assertIn(hit, expected)
+                self.assertEqual(min(areas[expected]), areas[hit])
+
+    def test_query_point(self):
+        for x, y in self.points[:200].tolist():
+            self.assertEqual(self._brute_force_hits(x, y), self.collection.query_point(x, y).tolist())
+
+    def test_query_rect(self):
+        left, top, right, bottom = 100, 200, 400, 260
+        expected = [idx for idx, (l, t, r, b) in enumerate(self.boxes.tolist())
+                    if l <= right and left <= r and t <= bottom and top <= b]
+        self.assertEqual(expected, self.collection.query_rect(left, top, right, bottom).tolist())
+
+    def test_contains_label_ignores_smaller_boxes_with_other_labels(self):
+        collection = BoundingBoxCollection([[0, 0, 10, 10], [4, 4, 6, 6], [20, 20, 22, 22]],
+                                           ["waldo", "distractor", "distractor"])
+        points = np.array([[5, 5], [1, 1], [21, 21], [50, 50]])
+        self.assertEqual([1, 0, 2, -1], collection.contains(points).tolist())
+        self.assertEqual([True, True, False, False], collection.contains_label(points, "waldo").tolist())
+        self.assertEqual([True, False, True, False], collection.contains_label(points, "distractor").tolist())
+        self.assertEqual([False] * 4, collection.contains_label(points, "wenda").tolist())
+        self.assertEqual([1, 2], collection.indices_of_label("distractor"))
+
+    def test_empty_collection(self):
+        collection = BoundingBoxCollection(np.zeros((0, 4)))
+        self.assertEqual([-1, -1], collection.contains(np.array([[1, 2], [3, 4]])).tolist())
+        self.assertEqual([False, False], collection.contains_label(np.array([[1, 2], [3, 4]]), "waldo").tolist())
+        self.assertEqual([], collection.query_rect(0, 0, 10, 10).tolist())
+
+    def test_from_json_supports_a_single_box_and_ndjson(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            single_box_path = os.path.join(tmp_dir, "box.json")
+            BoundingBox(735, 50, 770, 80).to_json(single_box_path)
+            collection = BoundingBoxCollection.from_file(single_box_path)
+            self.assertEqual(BoundingBox(735, 50, 770, 80), collection[0])
+            self.assertEqual([BoundingBoxCollection.DEFAULT_LABEL], collection.labels)
+
+            ndjson_path = os.path.join(tmp_dir, "boxes.ndjson")
+            with open(ndjson_path, 'w') as f:
+                f.write(json.dumps({"left": 0, "top": 0, "right": 5, "bottom": 5, "label": "distractor"}) + "\n")
+                f.write(json.dumps({"left": 3, "top": 3, "right": 4, "bottom": 4}) + "\n")
+            collection = BoundingBoxCollection.from_file(ndjson_path)
+            self.assertEqual(["distractor", "waldo"], collection.labels)
+            self.assertEqual([1, 0, -1], collection.contains(np.array([[3, 4], [0, 5], [6, 6]])).tolist())
@@ -0,0 +1,156 @@
+import csv
+import json
+import os
+import tempfile
+
+import glm
+import numpy as np
+from PIL import Image
+
+from src.bounding_box import BoundingBoxCollection
+from src.click_log_scoring import ClickLogScorer
+from src.scene_session import Scene
+from tests.graphic_engine_base_test import GraphicEngineBaseTest
+
+
+class TestClickLogScorer(GraphicEngineBaseTest):
+    IMAGE_SIZE = (48, 32)
+    WINDOW_SIZE = (12, 8)
+
+    def setUp(self):
+        super().setUp()
+        self.folder = tempfile.TemporaryDirectory()
+        self.scenes = []
+        for scene_index, waldo_box in enumerate(([10, 4, 17, 9], [30, 20, 40, 28])):
+            image_path = self._path(f"image_{scene_index}.png")
+            Image.new('RGB', self.IMAGE_SIZE).save(image_path)
+            bounding_box_file_path = self._path(f"boxes_{scene_index}.json")
+            # A smaller box covers part of Waldo
+            distractor_box = [waldo_box[0] + 2, waldo_box[1] + 1, waldo_box[0] + 4, waldo_box[1] + 3]
+            BoundingBoxCollection([waldo_box, [0, 0, 3, 3], distractor_box],
+                                  ["waldo", "tree", "tree"]).to_json(bounding_box_file_path)
+            self.scenes += [Scene(image_path, bounding_box_file_path)]
+
+        random_state = np.random.RandomState(0)
+        self.clicks = [{"user": f"user_{i % 3}", "scene": i % 2,
+                        "x": int(random_state.randint(0, self.WINDOW_SIZE[0])),
+                        "y": int(random_state.randint(0, self.WINDOW_SIZE[1])),
+                        "window_width": self.WINDOW_SIZE[0], "window_height": self.WINDOW_SIZE[1],
+                        "zoom": [1.0, 2.0][i % 4 // 2], "translation_x": 0.5 * (i % 4 // 2), "translation_y": 0.0}
+                       for i in range(200)]
+        self.graphic_engine._image_size_pixels = list(self.IMAGE_SIZE)
+        self.graphic_engine._window_width_pixels, self.graphic_engine._window_height_pixels = self.WINDOW_SIZE
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.folder.name, file_name)
+
+    def _write_csv(self, clicks: [dict]) -> str:
+        click_log_path = self._path("clicks.csv")
+        with open(click_log_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, list(clicks[0].keys()))
+            writer.writeheader()
+            writer.writerows(clicks)
+        return click_log_path
+
+    def _write_ndjson(self, clicks: [dict]) -> str:
+        click_log_path = self._path("clicks.ndjson")
+        with open(click_log_path, 'w') as f:
+            f.writelines(json.dumps(click) + "\n" for click in clicks)
+        return click_log_path
+
+    def _expected_image_pixels(self, click: dict) -> (int, int):
+        # The model matrix of GraphicEngine._set_zoom_and_translation
+        self.graphic_engine._set_window_model_mat(
+            glm.scale(glm.translate(glm.mat4(), glm.vec3(click["translation_x"], click["translation_y"], 0)),
+                      glm.vec3(click["zoom"], click["zoom"], 1)))
+        # The batch conversion is the one WindowManager._is_this_waldo uses
+        [image_pixels] = self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates_batch(
+            np.array([[click["x"], click["y"]]])).tolist()
+        return tuple(image_pixels)
+
+    def test_results_match_the_graphic_engine(self):
+        results_path = self._path("results.ndjson")
+        summary = ClickLogScorer(self.scenes, num_processes=1, chunk_size_clicks=32).score(
+            self._write_csv(self.clicks), results_path)
+        with open(results_path, 'r') as f:
+            results = [json.loads(line) for line in f]
+
+        self.assertEqual(len(self.clicks), len(results))
+        for click, result in zip(self.clicks, results):
+            self.assertEqual(click["user"], result["user"])
+            image_pixels = self._expected_image_pixels(click)
+            self.assertEqual(image_pixels, (result["image_x"], result["image_y"]))
+            bounding_boxes = BoundingBoxCollection.from_file(self.scenes[click["scene"]].bounding_box_file_path)
+            self.assertEqual(bool(bounding_boxes.contains_label(np.array([image_pixels]), "waldo")[0]), result["hit"])
+            self.assertEqual(result["hit"], result["distance_pixels"] == 0)
+
+        self.assertEqual(len(self.clicks), summary["clicks"])
+        self.assertEqual(sum(result["hit"] for result in results), summary["hits"])
+        self.assertEqual([0, 1], [scene["scene"] for scene in summary["scenes"]])
+        self.assertEqual(0, summary["skipped_clicks"])
+
+    def test_a_click_on_a_box_that_covers_the_target_is_a_hit(self):
+        click = {"scene": 0, "x": 13, "y": 6}
+        results_path = self._path("results.ndjson")
+        ClickLogScorer(self.scenes, num_processes=1).score(self._write_ndjson([click]), results_path)
+        result = json.load(open(results_path, 'r'))
+        self.assertEqual((True, "tree", 0), (result["hit"], result["label"], result["distance_pixels"]))
+
+    def test_clicks_without_a_valid_scene_or_position_are_skipped(self):
+        bad_clicks = [dict(self.clicks[0], scene=scene) for scene in (-1, 2, 0.5, "", "first")]
+        bad_clicks += [dict(self.clicks[0], x="")]
+        for write in (self._write_csv, self._write_ndjson):
+            results_path = self._path("results.csv")
+            summary = ClickLogScorer(self.scenes, num_processes=1, chunk_size_clicks=4).score(
+                write(self.clicks[:5] + bad_clicks + self.clicks[5:10]), results_path)
+            self.assertEqual((10, len(bad_clicks)), (summary["clicks"], summary["skipped_clicks"]))
+            with open(results_path, 'r', newline='') as f:
+                self.assertEqual([click["user"] for click in self.clicks[:10]],
+                                 [result["user"] for result in csv.DictReader(f)])
+
+    def test_csv_rows_with_quoted_line_breaks_are_not_split(self):
+        clicks = [dict(click, user=f"line 1\nline 2, \"{i}\"") for i, click in enumerate(self.clicks[:9])]
+        click_log_path = self._write_csv(clicks)
+        for chunk_size_clicks in (3, 100):
+            results_path = self._path(f"results_{chunk_size_clicks}.csv")
+            summary = ClickLogScorer(self.scenes, num_processes=1, chunk_size_clicks=chunk_size_clicks).score(
+                click_log_path, results_path)
+            self.assertEqual((9, 0), (summary["clicks"], summary["skipped_clicks"]))
+            with open(results_path, 'r', newline='') as f:
+                self.assertEqual([click["user"] for click in clicks], [result["user"] for result in csv.DictReader(f)])
+
+    def test_distance_to_the_nearest_target(self):
+        click = dict(self.clicks[0], scene=0, x=0, y=0, zoom=1.0, translation_x=0.0)
+        results_path = self._path("results.csv")
+        ClickLogScorer(self.scenes, num_processes=1).score(self._write_csv([click]), results_path)
+        with open(results_path, 'r', newline='') as f:
+            [result] = list(csv.DictReader(f))
+        # The top left window pixel is the top left image pixel, in the "tree" box
+        self.assertEqual(("0", "0", "False", "tree"), (result["image_x"], result["image_y"], result["hit"],
+                                                       result["label"]))
+        self.assertAlmostEqual(np.hypot(10, 4), float(result["distance_pixels"]), places=3)
+
+    def test_process_pool_matches_a_single_process(self):
+        click_log_path = self._write_ndjson(self.clicks)
+        summary_path = self._path("summary.json")
+        single_process_summary = ClickLogScorer(self.scenes, num_processes=1, chunk_size_clicks=16).score(
+            click_log_path, self._path("single.csv"))
+        pool_summary = ClickLogScorer(self.scenes, num_processes=2, chunk_size_clicks=16).score(
+            click_log_path, self._path("pool.csv"), summary_path)
+
+        self.assertEqual(single_process_summary, pool_summary)
+        self.assertEqual(pool_summary, json.load(open(summary_path, 'r')))
+        with open(self._path("single.csv"), 'r') as single, open(self._path("pool.csv"), 'r') as pool:
+            self.assertEqual(single.read(), pool.read())
+
+    def test_view_defaults_to_the_initial_window(self):
+        # Without the view fields, the window has the size of the image (which fits in the maximal window size)
+        click = {"scene": 1, "x": 35, "y": 24}
+        results_path = self._path("results.ndjson")
+        ClickLogScorer(self.scenes, num_processes=1).score(self._write_ndjson([click]), results_path)
+        result = json.load(open(results_path, 'r'))
+        self.assertEqual((35, 24, True, "waldo"), (result["image_x"], result["image_y"], result["hit"],
+                                                    result["label"]))
@@ -0,0 +1,102 @@
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.graphic_engine.damage_tracker import DamageTracker, rect_to_viewport
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+from src.graphic_engine.graphic_engine import GraphicEngine
+from tests.headless_context import CONTEXT
+
+
+class TestDamageTracker(TestCase):
+
+    def setUp(self):
+        self.tracker = DamageTracker((100, 80))
+        self.assertTrue(self.tracker.take().is_full)
+
+    def test_rects_are_clipped_and_merged(self):
+        self.assertTrue(self.tracker.take().is_empty)
+        self.tracker.damage((-5, 70, 10, 90))
+        self.tracker.damage((200, 0, 210, 10))
+        self.assertEqual([(0, 70, 10, 80)], self.tracker.take().rects)
+
+        for idx in range(DamageTracker.MAX_RECTS + 1):
+            self.tracker.damage((idx, idx, idx + 2, idx + 2))
+        self.assertEqual([(0, 0, DamageTracker.MAX_RECTS + 2, DamageTracker.MAX_RECTS + 2)], self.tracker.take().rects)
+
+        self.tracker.damage((0, 0, 100, 40))
+        self.assertTrue(self.tracker.take().is_full)
+
+    def test_scroll_moves_the_damage_and_exposes_strips(self):
+        self.tracker.damage((10, 10, 20, 20))
+        self.tracker.scroll(5, -3)
+        self.tracker.scroll(1, 0)
+        damage = self.tracker.take()
+        self.assertFalse(damage.is_full)
+        self.assertEqual((6, -3), damage.scroll_pixels)
+        self.assertEqual([(16, 7, 26, 17), (1, 0, 6, 80), (1, 77, 100, 80), (0, 0, 1, 80)], damage.rects)
+
+    def test_partial_and_large_scrolls_damage_everything(self):
+        self.tracker.scroll(2.5, 0)
+        self.assertTrue(self.tracker.take().is_full)
+        self.tracker.scroll(0, 41)
+        self.assertTrue(self.tracker.take().is_full)
+        self.tracker.scroll(0, 1e-6)
+        self.assertTrue(self.tracker.take().is_empty)
+
+    def test_rect_to_viewport(self):
+        self.assertEqual((1, 2, 3, 4), rect_to_viewport((1, 2, 4, 6), 10, flip_y=True))
+        self.assertEqual((1, 4, 3, 4), rect_to_viewport((1, 2, 4, 6), 10, flip_y=False))
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestPartialFrames(TestCase):
+
+    def setUp(self):
+        pixels = np.random.RandomState(0).randint(0, 256, (48, 64, 3), dtype=np.uint8)
+        self.graphic_engine = GraphicEngine(CONTEXT, (64, 48), Image.fromarray(pixels, 'RGB'))
+        self.graphic_engine.enable_markers(4)
+
+    def tearDown(self):
+        self.graphic_engine.destroy()
+
+    def _render(self, readback: FramebufferReadback, previous_frame: np.ndarray = None) -> np.ndarray:
+        """Renders the damage, and applies it to the previous frame like TkinterFramebuffer does to its photo."""
+        damage = self.graphic_engine.damage.take()
+        rects = None if damage.is_full else damage.rects
+        with readback.scope:
+            if rects is None:
+                self.graphic_engine.clear()
+            self.graphic_engine.render(flip_y=readback.flip_y_in_projection, rects=rects)
+        readback.finish_frame(rects)
+        frame = np.zeros((48, 64, 3), dtype=np.uint8) if previous_frame is None else previous_frame.copy()
+        if not damage.is_full:
+            dx, dy = damage.scroll_pixels
+            frame[max(0, dy):48 + min(0, dy), max(0, dx):64 + min(0, dx)] = \
+                previous_frame[max(0, -dy):48 - max(0, dy), max(0, -dx):64 - max(0, dx)]
+        for (left, top, right, bottom), pixels in readback.take_regions():
+            pixels = np.frombuffer(pixels, dtype=np.uint8).reshape(bottom - top, right - left, readback.components)
+            frame[top:bottom, left:right] = (pixels if readback.flip_y_in_projection else pixels[::-1])[:, :, :3]
+        return frame
+
+    def test_partial_frames_match_full_frames(self):
+        for mode in (FramebufferReadback.MODE_READ, FramebufferReadback.MODE_READ_INTO,
+                     FramebufferReadback.MODE_PIXEL_BUFFERS):
+            self.graphic_engine.reset_view()
+            self.graphic_engine.clear_markers()
+            readback = FramebufferReadback(CONTEXT, (64, 48), mode)
+            full_readback = FramebufferReadback(CONTEXT, (64, 48))
+            frame = self._render(readback)
+            self.graphic_engine.zoom(2.0, 32, 24)
+            frame = self._render(readback, frame)
+            for dx, dy in ((3, 0), (0, -2), (-5, 4)):
+                self.graphic_engine.pan(dx, dy)
+                self.graphic_engine.add_marker(0.05 * dx, 0.05 * dy)
+                frame = self._render(readback, frame)
+                self.graphic_engine.damage.damage_all()
+                np.testing.assert_array_equal(self._render(full_readback), frame)
+            # Only the exposed strips and the marker were read back
+            self.assertLess(readback.bytes_copied_last_frame, 64 * 48 * readback.components / 2)
+            readback.release()
+            full_readback.release()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import time
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.decoded_image_cache import DecodedImageCache
+from src.headless_runner import HeadlessRunner
+from src.image_loader import BackgroundImageLoader
+from tests.headless_context import CONTEXT
+
+
+class TestDecodedImageCache(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = DecodedImageCache(os.path.join(self.folder.name, "cache"))
+        self.pixels = np.random.RandomState(0).randint(0, 256, (30, 41, 3), dtype=np.uint8)
+        self.image_path = self._save(self.pixels, "image.png")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _save(self, pixels: np.ndarray, file_name: str) -> str:
+        image_path = os.path.join(self.folder.name, file_name)
+        Image.fromarray(pixels, 'RGB').save(image_path)
+        return image_path
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get(self.image_path))
+        self.cache.put(self.image_path, Image.open(self.image_path))
+        [level] = self.cache.get(self.image_path)
+        self.assertIsInstance(level, np.memmap)
+        np.testing.assert_array_equal(self.pixels, level)
+
+    def test_a_cache_folder_that_can_not_be_created_disables_the_cache(self):
+        # A folder inside of a file can not be created, even by root
+        cache = DecodedImageCache(os.path.join(self.image_path, "cache"))
+        self.assertFalse(cache.is_available)
+        self.assertIsNone(cache.put(self.image_path, Image.open(self.image_path)))
+        self.assertIsNone(cache.get(self.image_path))
+        self.assertEqual(0, cache.size_bytes())
+
+    def test_pyramid_levels_are_reduced_by_2(self):
+        levels = self.cache.put(self.image_path, Image.open(self.image_path), num_levels=3)
+        self.assertEqual([(30, 41, 3), (15, 21, 3), (8, 11, 3)], [level.shape for level in levels])
+        np.testing.assert_array_equal(np.asarray(Image.fromarray(self.pixels).reduce(2)), levels[1])
+        # The number of levels is a decode parameter
+        self.assertIsNone(self.cache.get(self.image_path, num_levels=1))
+
+    def test_grayscale_and_rgba_images_keep_their_components(self):
+        for mode, components in (('L', 1), ('RGBA', 4)):
+            image = Image.fromarray(self.pixels, 'RGB').convert(mode)
+            image_path = os.path.join(self.folder.name, f"image_{mode}.png")
+            image.save(image_path)
+            [level] = self.cache.put(image_path, Image.open(image_path))
+            self.assertEqual((30, 41, components), level.shape)
+            np.testing.assert_array_equal(np.asarray(image).reshape(level.shape), self.cache.get(image_path)[0])
+
+    def test_key_depends_on_content(self):
+        key = self.cache.key(self.image_path)
+        self.assertEqual(key, self.cache.key(self._save(self.pixels, "copy.png")))
+        self.assertNotEqual(key, self.cache.key(self._save(255 - self.pixels, "other.png")))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        entry_size_bytes = self.pixels.nbytes
+        self.cache.max_size_bytes = 2 * entry_size_bytes
+        image_paths = [self._save(np.roll(self.pixels, shift, axis=1), f"image_{shift}.png") for shift in range(3)]
+        for image_path in image_paths[:2]:
+            self.cache.put(image_path, Image.open(image_path))
+        # Make sure the modification times are different, and use the first entry
+        time.sleep(0.01)
+        self.assertIsNotNone(self.cache.get(image_paths[0]))
+
+        self.cache.put(image_paths[2], Image.open(image_paths[2]))
+        self.assertEqual(2 * entry_size_bytes, self.cache.size_bytes())
+        self.assertIsNotNone(self.cache.get(image_paths[0]))
+        self.assertIsNone(self.cache.get(image_paths[1]))
+        self.assertIsNotNone(self.cache.get(image_paths[2]))
+
+    def test_warm_start_skips_decoding(self):
+        events = []
+        for _ in range(2):
+            loader = BackgroundImageLoader(self.image_path, cache=self.cache)
+            loader.start()
+            loader._thread.join()
+            events += [loader.poll()]
+        [(cold_event, cold_image)], [(warm_event, warm_image)] = events
+        self.assertEqual(BackgroundImageLoader.EVENT_FULL, cold_event)
+        self.assertIsInstance(cold_image, Image.Image)
+        self.assertEqual(BackgroundImageLoader.EVENT_FULL, warm_event)
+        self.assertIsInstance(warm_image, np.memmap)
+        np.testing.assert_array_equal(self.pixels, warm_image)
+
+    @skipIf(CONTEXT is None, "No OpenGL context available")
+    def test_cached_levels_render_like_the_image(self):
+        image = Image.open(self.image_path)
+        expected_runner = HeadlessRunner(image, context=CONTEXT)
+        expected = expected_runner.render()
+        expected_runner.destroy()
+
+        levels = self.cache.put(self.image_path, image, num_levels=2)
+        for tiled in (False, True):
+            runner = HeadlessRunner(Image.new('RGB', (1, 1)), window_size=image.size, context=CONTEXT, tiled=tiled)
+            runner.graphic_engine.replace_image(levels[0], levels)
+            np.testing.assert_array_equal(expected, runner.render())
+            runner.destroy()
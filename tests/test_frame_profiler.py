@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from src.frame_profiler import FrameProfiler
+
+
+class TestFrameProfiler(TestCase):
+
+    def test_disabled_profiler_records_nothing(self):
+        profiler = FrameProfiler()
+        with profiler.stage("render"):
+            pass
+        profiler.record("render", 0.0, 1.0)
+        self.assertEqual(0, len(profiler))
+        self.assertEqual({}, profiler.summary())
+
+    def test_ring_buffer_keeps_the_latest_samples(self):
+        profiler = FrameProfiler(capacity=4, enabled=True)
+        for idx in range(6):
+            profiler.record("render", idx, idx + (idx + 1) / 1000)
+        self.assertEqual(4, len(profiler))
+        np.testing.assert_allclose([3, 4, 5, 6], profiler.durations_ms("render"))
+
+    def test_summary_percentiles(self):
+        profiler = FrameProfiler(enabled=True)
+        for idx in range(100):
+            profiler.record("render", idx, idx + (idx + 1) / 1000)
+        profiler.record("paste", 0, 0.002)
+        summary = profiler.summary()
+        self.assertEqual(["render", "paste"], list(summary))
+        self.assertEqual(100, summary["render"]["count"])
+        self.assertAlmostEqual(50.5, summary["render"]["p50_ms"])
+        self.assertAlmostEqual(99.01, summary["render"]["p99_ms"])
+        self.assertAlmostEqual(2.0, summary["paste"]["mean_ms"])
+
+    def test_fps(self):
+        profiler = FrameProfiler(enabled=True)
+        for idx in range(31):
+            profiler.record(FrameProfiler.FRAME_STAGE, idx / 30, idx / 30 + 0.001)
+        self.assertAlmostEqual(30.0, profiler.fps(), places=3)
+        self.assertIn("30.0 fps", profiler.hud_text())
+
+    def test_export_chrome_trace(self):
+        profiler = FrameProfiler(enabled=True)
+        with profiler.frame():
+            with profiler.stage("render"):
+                pass
+        with tempfile.TemporaryDirectory() as folder:
+            trace_path = os.path.join(folder, "trace.json")
+            profiler.export_chrome_trace(trace_path)
+            events = json.load(open(trace_path))["traceEvents"]
+        # Samples are recorded when a stage ends, so the inner stage comes first
+        self.assertEqual(["render", FrameProfiler.FRAME_STAGE], [event["name"] for event in events])
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in events))
+        self.assertLessEqual(events[1]["ts"], events[0]["ts"])
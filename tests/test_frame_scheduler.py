@@ -0,0 +1,76 @@
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from src.frame_scheduler import FrameScheduler
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay_ms, callback):
+        self.scheduled += [(delay_ms, callback)]
+        return f"after#{len(self.scheduled)}"
+
+    def after_idle(self, callback):
+        return self.after(0, callback)
+
+    def after_cancel(self, callback_id):
+        pass
+
+    def run_scheduled(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for _, callback in scheduled:
+            callback()
+
+
+class TestFrameScheduler(TestCase):
+
+    def setUp(self):
+        self.root = FakeRoot()
+        self.render_callback = MagicMock()
+        self.frame_scheduler = FrameScheduler(self.root, self.render_callback, frame_interval_ms=16)
+
+    def test_requests_are_coalesced_into_one_frame(self):
+        for _ in range(10):
+            self.frame_scheduler.request_frame()
+        self.assertEqual(1, len(self.root.scheduled))
+        self.root.run_scheduled()
+        self.assertEqual(1, self.render_callback.call_count)
+
+    def test_nothing_is_rendered_when_nothing_is_dirty(self):
+        self.frame_scheduler.request_frame()
+        self.root.run_scheduled()
+        self.root.run_scheduled()
+        self.assertEqual(1, self.render_callback.call_count)
+        self.assertEqual([], self.root.scheduled)
+
+    @patch("src.frame_scheduler.time.perf_counter")
+    def test_frames_are_rendered_at_most_once_per_interval(self, mock_perf_counter):
+        mock_perf_counter.return_value = 1.0
+        self.frame_scheduler.request_frame()
+        self.root.run_scheduled()
+
+        mock_perf_counter.return_value = 1.006
+        self.frame_scheduler.request_frame()
+        delay_ms, _ = self.root.scheduled[0]
+        self.assertEqual(11, delay_ms)
+
+    def test_cancel(self):
+        self.frame_scheduler.request_frame()
+        self.frame_scheduler.cancel()
+        self.root.run_scheduled()
+        self.render_callback.assert_not_called()
+
+    def test_render_now(self):
+        self.frame_scheduler.render_now()
+        self.render_callback.assert_not_called()
+        self.frame_scheduler.request_frame()
+        self.frame_scheduler.render_now()
+        self.assertEqual(1, self.render_callback.call_count)
+        self.root.run_scheduled()
+        self.assertEqual(1, self.render_callback.call_count)
+        # The frame that was rendered right away is not scheduled anymore
+        self.frame_scheduler.request_frame()
+        self.assertEqual(1, len(self.root.scheduled))
@@ -0,0 +1,59 @@
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+from src.graphic_engine.graphic_engine import GraphicEngine
+from tests.headless_context import CONTEXT
+
+
+class TestFramebufferReadbackCapacity(TestCase):
+
+    def test_compute_capacity_rounds_up_to_step(self):
+        step = FramebufferReadback.CAPACITY_STEP_PIXELS
+        self.assertEqual((step, 2 * step), FramebufferReadback.compute_capacity((1, step + 1)))
+
+    def test_compute_capacity_never_shrinks(self):
+        step = FramebufferReadback.CAPACITY_STEP_PIXELS
+        self.assertEqual((4 * step, 2 * step),
+                         FramebufferReadback.compute_capacity((10, 2 * step), current_capacity=(4 * step, step)))
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestFramebufferReadbackModes(TestCase):
+
+    def setUp(self):
+        # Top half is red, bottom half is blue
+        image = Image.new('RGB', (6, 4), (0, 0, 255))
+        image.paste((255, 0, 0), (0, 0, 6, 2))
+        self.graphic_engine = GraphicEngine(CONTEXT, (6, 4), image)
+
+    def tearDown(self):
+        self.graphic_engine.destroy()
+
+    def _render_top_to_bottom_rgb(self, mode: str) -> np.array:
+        readback = FramebufferReadback(CONTEXT, (6, 4), mode)
+        with readback.scope:
+            self.graphic_engine.clear()
+            self.graphic_engine.render(flip_y=readback.flip_y_in_projection)
+        readback.finish_frame()
+        pixels = np.frombuffer(bytes(readback.take_pixels()), dtype=np.uint8).reshape(4, 6, readback.components)
+        readback.release()
+        return pixels[:, :, :3] if readback.flip_y_in_projection else pixels[::-1, :, :3]
+
+    def test_all_modes_read_the_same_image(self):
+        expected = self._render_top_to_bottom_rgb(FramebufferReadback.MODE_READ)
+        self.assertEqual([255, 0, 0], expected[0, 0].tolist())
+        self.assertEqual([0, 0, 255], expected[3, 0].tolist())
+        for mode in (FramebufferReadback.MODE_READ_INTO, FramebufferReadback.MODE_PIXEL_BUFFERS):
+            np.testing.assert_array_equal(expected, self._render_top_to_bottom_rgb(mode))
+
+    def test_pixel_buffers_mode_copies_on_take(self):
+        readback = FramebufferReadback(CONTEXT, (6, 4), FramebufferReadback.MODE_PIXEL_BUFFERS)
+        readback.finish_frame()
+        self.assertEqual(0, readback.bytes_copied_last_frame)
+        readback.take_pixels()
+        self.assertEqual(6 * 4 * 4, readback.bytes_copied_last_frame)
+        self.assertIsNone(readback.take_pixels())
+        readback.release()
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.benchmark_suite import BenchmarkSuite
+from src.bounding_box import BoundingBoxCollection
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer
+from src.headless_runner import HeadlessRunner
+from tests.headless_context import CONTEXT, restore_shared_context
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestHeadlessRunner(TestCase):
+
+    def setUp(self):
+        image = Image.new('RGB', (40, 30), (0, 255, 0))
+        image.paste((255, 0, 0), (0, 0, 20, 15))  # Top left quarter
+        bounding_boxes = BoundingBoxCollection([[0, 0, 9, 9]])
+        self.runner = HeadlessRunner(image, bounding_boxes=bounding_boxes, context=CONTEXT)
+
+    def tearDown(self):
+        self.runner.destroy()
+
+    def test_render_returns_the_frame_top_row_first(self):
+        for readback_mode in (FramebufferReadback.MODE_READ, FramebufferReadback.MODE_READ_INTO):
+            self.runner.readback.release()
+            self.runner.readback = FramebufferReadback(CONTEXT, self.runner.window_size, readback_mode)
+            pixels = self.runner.render()
+            self.assertEqual((30, 40), pixels.shape[:2])
+            self.assertEqual([255, 0, 0], pixels[0, 0, :3].tolist())
+            self.assertEqual([0, 255, 0], pixels[29, 39, :3].tolist())
+
+    def test_events_are_handled_like_the_window_manager(self):
+        self.runner.on_resize(SimpleNamespace(width=80, height=60))
+        self.assertEqual((60, 80), self.runner.render().shape[:2])
+        self.assertEqual(0, self.runner.on_mouse_left_button_press(SimpleNamespace(x=10, y=10)))
+        self.assertEqual(-1, self.runner.on_mouse_left_button_press(SimpleNamespace(x=30, y=30)))
+        self.runner.on_key_press(SimpleNamespace(keysym='Escape'))
+        self.assertTrue(self.runner.is_closed)
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestBenchmarkSuite(TestCase):
+
+    def test_run_and_find_regressions(self):
+        suite = BenchmarkSuite(image_sizes=[(64, 48)], repeats=1, context=CONTEXT)
+        results = suite.run()
+        # The context was passed in, so it is not released with the suite
+        suite.release()
+        self.assertIn(CONTEXT, GraphicEngineInitializer._programs)
+        self.assertIn("render/64x48", results["results"])
+        self.assertEqual([], BenchmarkSuite.find_regressions(results, results))
+
+        slower = {"results": {name: dict(result, median_ms=result["median_ms"] * 2 + 1)
+                              for name, result in results["results"].items()}}
+        self.assertEqual(len(results["results"]), len(BenchmarkSuite.find_regressions(slower, results)))
+
+    def test_release_the_context_it_created(self):
+        suite = BenchmarkSuite(image_sizes=[(16, 12)], repeats=1)
+        suite.run()
+        self.assertIn(suite.context, GraphicEngineInitializer._programs)
+        suite.release()
+        self.assertNotIn(suite.context, GraphicEngineInitializer._programs)
+        restore_shared_context()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.headless_runner import HeadlessRunner
+from src.image_loader import BackgroundImageLoader
+from tests.headless_context import CONTEXT
+
+
+class TestBackgroundImageLoader(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _load(self, image: Image, file_name: str) -> [(str, object)]:
+        image_path = os.path.join(self.folder.name, file_name)
+        image.save(image_path)
+        loader = BackgroundImageLoader(image_path, preview_maximal_size=(256, 256))
+        self.assertEqual(image.size, loader.image_size)
+        loader.start()
+        events = []
+        deadline = time.time() + 10
+        while not any(event != BackgroundImageLoader.EVENT_PREVIEW for event, _ in events) and time.time() < deadline:
+            events += loader.poll()
+            time.sleep(0.001)
+        return events
+
+    def test_jpeg_preview_is_decoded_before_the_full_image(self):
+        events = self._load(Image.new('RGB', (2048, 1024), (10, 200, 30)), "image.jpg")
+        self.assertEqual([BackgroundImageLoader.EVENT_PREVIEW, BackgroundImageLoader.EVENT_FULL],
+                         [event for event, _ in events])
+        self.assertEqual((256, 128), events[0][1].size)
+        self.assertEqual((2048, 1024), events[1][1].size)
+        self.assertEqual('RGB', events[1][1].mode)
+
+    def test_other_formats_are_only_decoded_at_full_resolution(self):
+        events = self._load(Image.new('L', (64, 32), 7), "image.png")
+        self.assertEqual([BackgroundImageLoader.EVENT_FULL], [event for event, _ in events])
+        # Grayscale images are uploaded to single channel textures, so they are not converted to RGB
+        self.assertEqual('L', events[0][1].mode)
+
+    def test_decoding_errors_are_reported(self):
+        image_path = os.path.join(self.folder.name, "image.png")
+        Image.new('RGB', (64, 32)).save(image_path)
+        loader = BackgroundImageLoader(image_path)
+        os.remove(image_path)
+        loader.start()
+        loader._thread.join()
+        [(event, error)] = loader.poll()
+        self.assertEqual(BackgroundImageLoader.EVENT_ERROR, event)
+        self.assertIsInstance(error, OSError)
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestProgressiveImageUpload(TestCase):
+
+    def test_progressive_upload_renders_like_a_direct_upload(self):
+        # An odd width, so rows are not aligned to 4 bytes
+        pixels = np.random.RandomState(0).randint(0, 256, (30, 41, 3), dtype=np.uint8)
+        image = Image.fromarray(pixels, 'RGB')
+        expected_runner = HeadlessRunner(image, context=CONTEXT)
+        expected = expected_runner.render()
+        expected_runner.destroy()
+
+        for source in (image, pixels):
+            runner = HeadlessRunner(Image.new('RGB', (1, 1)), window_size=image.size, context=CONTEXT)
+            runner.graphic_engine.start_progressive_image_upload(source, rows_per_strip=7)
+            num_strips = 1
+            while not runner.graphic_engine.upload_next_image_strip():
+                self.assertTrue(runner.graphic_engine.is_uploading_image)
+                num_strips += 1
+            self.assertEqual(5, num_strips)
+            self.assertFalse(runner.graphic_engine.is_uploading_image)
+            np.testing.assert_array_equal(expected, runner.render())
+            runner.destroy()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.benchmark_suite import BenchmarkSuite
+from src.bounding_box import BoundingBoxCollection
+from src.headless_runner import HeadlessRunner
+from src.input_recording import InputEvent, InputRecorder, InputReplayer
+from tests.headless_context import CONTEXT
+
+
+class HandlerCalls:
+    """A replay target that remembers the handlers that were called."""
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda event: self.calls.append((name, event))
+
+
+class TestInputRecording(TestCase):
+    EVENTS = [(InputRecorder.RESIZE, InputEvent(0, 0, width=40, height=30)),
+              (InputRecorder.MOUSE_WHEEL, InputEvent(0, 0, x=20, y=15, delta=120)),
+              (InputRecorder.PAN_START, InputEvent(0, 0, x=20, y=15, num=3)),
+              (InputRecorder.PAN_MOVE, InputEvent(0, 0, x=25, y=12)),
+              (InputRecorder.LEFT_BUTTON_PRESS, InputEvent(0, 0, x=-3, y=7, num=1)),
+              (InputRecorder.KEY_PRESS, InputEvent(0, 0, keysym='n')),
+              (InputRecorder.KEY_PRESS, InputEvent(0, 0, keysym='Escape')),
+              (InputRecorder.LEFT_BUTTON_PRESS, InputEvent(0, 0, x=1, y=1))]
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.input_log_path = os.path.join(self.folder.name, "input.log")
+        recorder = InputRecorder(self.input_log_path)
+        for event_type, event in self.EVENTS:
+            recorder.record(event_type, event, window_size=(40, 30))
+        recorder.close()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_events_are_recorded_compactly(self):
+        events = InputReplayer.load(self.input_log_path)
+        self.assertEqual([event_type for event_type, _ in self.EVENTS], [event.event_type for event in events])
+        self.assertEqual([(20, 15, 120), (-3, 7, 0)], [(events[i].x, events[i].y, events[i].delta) for i in (1, 4)])
+        self.assertEqual(['n', 'Escape'], [event.keysym for event in events if event.keysym])
+        self.assertEqual({(40, 30)}, {(event.width, event.height) for event in events})
+        self.assertEqual(sorted(event.time_seconds for event in events), [event.time_seconds for event in events])
+        keysym_bytes = 2 + len('n') + len('Escape')
+        self.assertEqual(InputRecorder.HEADER.size + len(self.EVENTS) * InputRecorder.RECORD.size + keysym_bytes,
+                         os.path.getsize(self.input_log_path))
+
+    def test_replay_calls_the_handlers_until_escape(self):
+        target, after_event_calls = HandlerCalls(), []
+        results = InputReplayer(self.input_log_path).replay(target, after_event=lambda: after_event_calls.append(1))
+        self.assertEqual(["on_resize", "on_mouse_wheel", "on_pan_start", "on_pan_move", "on_mouse_left_button_press",
+                          "on_key_press"], [name for name, _ in target.calls])
+        self.assertEqual(6, len(after_event_calls))
+        self.assertEqual(6, len(results["latencies_ms"]))
+        self.assertEqual(6, results["results"]["replay/all"]["count"])
+        self.assertEqual(1, results["results"]["replay/pan_move"]["count"])
+        self.assertEqual([], BenchmarkSuite.find_regressions(results, results))
+
+    def test_initial_window_size_skips_minimap_clicks(self):
+        recorder = InputRecorder(self.input_log_path)
+        recorder.record(InputRecorder.MINIMAP_CLICK, InputEvent(0, 0, x=5, y=3), window_size=(20, 15))
+        recorder.record(InputRecorder.KEY_PRESS, InputEvent(0, 0, keysym='n'), window_size=(40, 30))
+        recorder.close()
+        self.assertEqual((40, 30), InputReplayer(self.input_log_path).initial_window_size)
+
+    def test_other_files_are_rejected(self):
+        with open(self.input_log_path, 'wb') as f:
+            f.write(b"not an input log")
+        with self.assertRaises(ValueError):
+            InputReplayer.load(self.input_log_path)
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestHeadlessReplay(TestCase):
+
+    def test_replay_is_deterministic(self):
+        with tempfile.TemporaryDirectory() as folder:
+            input_log_path = os.path.join(folder, "input.log")
+            recorder = InputRecorder(input_log_path)
+            for event_type, event in TestInputRecording.EVENTS[:5]:
+                recorder.record(event_type, event, window_size=(40, 30))
+            recorder.close()
+
+            image = Image.fromarray(np.random.RandomState(0).randint(0, 256, (30, 40, 3), dtype=np.uint8), 'RGB')
+            frames = []
+            for _ in range(2):
+                runner = HeadlessRunner(image, (32, 24), BoundingBoxCollection([[0, 0, 5, 5]]), context=CONTEXT)
+                InputReplayer(input_log_path).replay(runner)
+                self.assertEqual([40, 30], runner.window_size)
+                frames += [runner.render()]
+                runner.destroy()
+            np.testing.assert_array_equal(frames[0], frames[1])
+
+    def test_minimap_clicks_center_the_view(self):
+        image = Image.fromarray(np.random.RandomState(0).randint(0, 256, (30, 40, 3), dtype=np.uint8), 'RGB')
+        runner = HeadlessRunner(image, context=CONTEXT)
+        runner.graphic_engine.zoom(4.0, 20, 15)
+        # A click on the top left quarter of a 20x15 minimap
+        runner.on_minimap_click(InputEvent(0, InputRecorder.MINIMAP_CLICK, x=5, y=3, width=20, height=15))
+        np.testing.assert_allclose((-0.5, 0.6), runner.graphic_engine.view_center_xy, atol=1e-6)
+        self.assertEqual(4.0, runner.graphic_engine.view_zoom)
+        runner.destroy()
@@ -0,0 +1,67 @@
+import logging
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from src import logging_utils
+
+
+class FormattedOnce:
+    """A log argument that remembers which threads formatted it."""
+    def __init__(self):
+        self.formatting_threads = []
+
+    def __str__(self):
+        self.formatting_threads += [threading.current_thread()]
+        return "formatted"
+
+
+class TestLoggingUtils(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.log_file_path = os.path.join(self.folder.name, f"{logging_utils.LOGGER_NAME}.txt")
+
+    def tearDown(self):
+        logging_utils.shutdown_logger()
+        self.folder.cleanup()
+
+    def _log_lines(self) -> [str]:
+        with open(self.log_file_path, 'r') as f:
+            return f.read().splitlines()
+
+    def test_handlers_are_installed_once(self):
+        for _ in range(3):
+            logging_utils.init_logger(log_level_for_console='critical', save_dir=self.folder.name)
+        self.assertEqual(1, len(logging_utils.get_logger().handlers))
+        logging_utils.get_logger().info("once")
+        logging_utils.shutdown_logger()
+        self.assertEqual(1, len([line for line in self._log_lines() if line.endswith("once")]))
+
+    def test_records_are_written_in_the_background(self):
+        logging_utils.init_logger(log_level_for_console='critical', save_dir=self.folder.name)
+        writing_threads = []
+        file_handler = logging_utils._listener.handlers[1]
+        emit = file_handler.emit
+        file_handler.emit = lambda record: writing_threads.append(threading.current_thread()) or emit(record)
+
+        logging_utils.get_logger().debug("lazy %s", "message")
+        logging_utils.shutdown_logger()
+        self.assertTrue(self._log_lines()[0].endswith("lazy message"))
+        self.assertEqual(1, len(writing_threads))
+        self.assertIsNot(threading.current_thread(), writing_threads[0])
+
+    def test_disabled_debug_logs_are_not_formatted(self):
+        logging_utils.init_logger(log_level_for_console='info')
+        self.assertFalse(logging_utils.get_logger().isEnabledFor(logging.DEBUG))
+        argument = FormattedOnce()
+        logging_utils.get_logger().debug("%s", argument)
+        logging_utils.shutdown_logger()
+        self.assertEqual([], argument.formatting_threads)
+
+    def test_foreground_logging(self):
+        logging_utils.init_logger(log_level_for_console='critical', save_dir=self.folder.name, background=False)
+        self.assertIsNone(logging_utils._listener)
+        logging_utils.get_logger().warning("now")
+        self.assertTrue(self._log_lines()[0].endswith("now"))
@@ -0,0 +1,56 @@
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+from src.graphic_engine.graphic_engine import GraphicEngine
+from src.graphic_engine.marker_layer import MarkerLayer
+from tests.headless_context import CONTEXT
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestMarkerLayer(TestCase):
+    WINDOW_SIZE = (64, 48)
+
+    def setUp(self):
+        self.graphic_engine = GraphicEngine(CONTEXT, self.WINDOW_SIZE, Image.new('RGB', (32, 24), (0, 0, 255)))
+        self.graphic_engine.enable_markers(radius_pixels=8, line_width_pixels=2)
+
+    def tearDown(self):
+        self.graphic_engine.destroy()
+
+    def _render(self) -> np.array:
+        readback = FramebufferReadback(CONTEXT, self.WINDOW_SIZE)
+        with readback.scope:
+            self.graphic_engine.clear()
+            self.graphic_engine.render(flip_y=readback.flip_y_in_projection)
+        readback.finish_frame()
+        pixels = np.frombuffer(bytes(readback.take_pixels()), dtype=np.uint8).reshape(48, 64, 4)[:, :, :3]
+        readback.release()
+        return pixels
+
+    def test_marker_is_drawn_around_its_center(self):
+        center_xy = self.graphic_engine.window_pixels_coordinates_to_xy_coordinates(20, 30)
+        self.graphic_engine.add_marker(*center_xy)
+        pixels = self._render()
+
+        red, blue = [255, 0, 0], [0, 0, 255]
+        self.assertEqual(red, pixels[30, 20].tolist())  # The cross
+        self.assertEqual(red, pixels[30, 20 + 7].tolist())  # The circle
+        self.assertEqual(blue, pixels[30, 20 + 4].tolist())  # Between the cross and the circle
+        self.assertEqual(blue, pixels[30, 20 + 10].tolist())  # Outside
+        self.assertEqual(blue, pixels[10, 50].tolist())
+
+    def test_buffer_grows_and_keeps_markers(self):
+        centers_xy = self.graphic_engine.window_pixels_coordinates_to_xy_coordinates_batch(
+            np.array([[x, 24] for x in range(0, 64, 4)]))
+        for _ in range(MarkerLayer.INITIAL_CAPACITY - 1):
+            self.graphic_engine.add_marker(0.9, 0.9)
+        self.graphic_engine._marker_layer.add_markers(centers_xy)
+        self.assertGreater(self.graphic_engine._marker_layer._capacity, MarkerLayer.INITIAL_CAPACITY)
+
+        pixels = self._render()
+        self.assertEqual([255, 0, 0], pixels[24, 32].tolist())
+        self.graphic_engine.clear_markers()
+        self.assertEqual([0, 0, 255], self._render()[24, 32].tolist())
@@ -1,3 +1,5 @@
+import numpy as np
+
 from tests.graphic_engine_base_test import GraphicEngineBaseTest
 
 
@@ -23,3 +25,55 @@ class TestMathematicalCalculations(GraphicEngineBaseTest):
 
         self.assertEqual((0, 0), self.graphic_engine.xy_coordinates_to_window_pixel_coordinates(-1.0, 1.0))
         self.assertEqual((12, 6), self.graphic_engine.xy_coordinates_to_window_pixel_coordinates(1.0, 0.0))
+
+    def test_zoom_keeps_the_point_under_the_mouse_in_place(self):
+        self.graphic_engine._image_size_pixels = [48, 48]
+        self.graphic_engine._window_width_pixels, self.graphic_engine._window_height_pixels = 12, 12
+
+        self.assertTrue(self.graphic_engine.zoom(2.0, 3, 3))
+        self.assertEqual((12, 12), self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates(3, 3))
+        self.assertEqual((6, 6), self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates(0, 0))
+
+    def test_zoom_is_limited(self):
+        self.graphic_engine._window_width_pixels, self.graphic_engine._window_height_pixels = 12, 12
+
+        self.assertFalse(self.graphic_engine.zoom(0.5, 6, 6))
+        self.graphic_engine.zoom(1000.0, 6, 6)
+        self.assertEqual(self.graphic_engine.MAX_ZOOM, self.graphic_engine._zoom)
+
+    def test_pan_keeps_the_image_inside_the_window(self):
+        self.graphic_engine._image_size_pixels = [48, 48]
+        self.graphic_engine._window_width_pixels, self.graphic_engine._window_height_pixels = 12, 12
+
+        self.assertFalse(self.graphic_engine.pan(3, 0))
+        self.graphic_engine.zoom(2.0, 6, 6)
+        self.assertTrue(self.graphic_engine.pan(3, 0))
+        self.assertEqual((18, 12), self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates(6, 0))
+        self.graphic_engine.pan(100, 100)
+        self.assertEqual((0, 0), self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates(0, 0))
+
+    def test_batch_conversions_match_single_point_conversions(self):
+        self.graphic_engine._image_size_pixels = [48, 36]
+        self.graphic_engine._window_width_pixels, self.graphic_engine._window_height_pixels = 12, 9
+        self.graphic_engine.zoom(3.0, 2, 7)
+        self.graphic_engine.pan(-1, 2)
+
+        points_window_pixels = np.array([[x, y] for x in range(13) for y in range(10)])
+        np.testing.assert_array_equal(
+            [self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates(x, y) for x, y in points_window_pixels],
+            self.graphic_engine.window_pixel_coordinates_to_image_pixel_coordinates_batch(points_window_pixels))
+
+        points_xy = self.graphic_engine.window_pixels_coordinates_to_xy_coordinates_batch(points_window_pixels)
+        np.testing.assert_allclose(
+            [self.graphic_engine.window_pixels_coordinates_to_xy_coordinates(x, y) for x, y in points_window_pixels],
+            points_xy, atol=1e-6)
+
+    def test_batch_xy_to_window_pixels_masks_points_outside_of_the_window(self):
+        self.graphic_engine._window_width_pixels, self.graphic_engine._window_height_pixels = 12, 12
+        self.graphic_engine.zoom(2.0, 6, 6)
+
+        points_xy = np.array([[0.0, 0.0], [0.25, -0.5], [0.75, 0.0]])
+        window_pixels, inside_window = self.graphic_engine.xy_coordinates_to_window_pixel_coordinates_batch(points_xy)
+        self.assertEqual([True, True, False], inside_window.tolist())
+        self.assertEqual([self.graphic_engine.xy_coordinates_to_window_pixel_coordinates(*p) for p in points_xy[:2]],
+                         [tuple(p) for p in window_pixels[:2].tolist()])
@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import time
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.graphic_engine.texture_cache import TextureCache
+from src.headless_runner import HeadlessRunner
+from src.scene_session import Scene, SceneSession
+from tests.headless_context import CONTEXT
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestTextureCache(TestCase):
+
+    def test_least_recently_used_textures_are_evicted(self):
+        texture_bytes = 4 * 4 * 3
+        cache = TextureCache(memory_budget_bytes=2 * texture_bytes)
+        cache.put("a", CONTEXT.texture((4, 4), 3))
+        cache.put("b", CONTEXT.texture((4, 4), 3))
+        cache.get("a")
+        cache.put("c", CONTEXT.texture((4, 4), 3))
+        self.assertEqual(2 * texture_bytes, cache.bytes_used)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+
+        cache.pinned_keys = {"a", "c"}
+        cache.put("d", CONTEXT.texture((4, 4), 3))
+        self.assertEqual({"a", "c", "d"}, {key for key in "abcd" if key in cache})
+        cache.release()
+        self.assertEqual(0, cache.bytes_used)
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestSceneSession(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.scenes, self.images = [], []
+        for idx, color in enumerate([(255, 0, 0), (0, 255, 0), (0, 0, 255)]):
+            image = Image.new('RGB', (40 + idx, 30), color)
+            image_path = os.path.join(self.folder.name, f"scene_{idx}.png")
+            image.save(image_path)
+            bounding_box_path = os.path.join(self.folder.name, f"scene_{idx}.json")
+            json.dump({"left": idx, "top": 0, "right": 10, "bottom": 10}, open(bounding_box_path, 'w'))
+            self.scenes += [Scene(image_path, bounding_box_path)]
+            self.images += [image]
+        self.session = SceneSession(CONTEXT, self.scenes, rows_per_strip=8)
+
+    def tearDown(self):
+        self.session.release()
+        self.folder.cleanup()
+
+    def _poll_until_idle(self) -> [(int, str, object)]:
+        events, deadline = [], time.time() + 10
+        while self.session.is_busy and time.time() < deadline:
+            events += self.session.poll()
+            time.sleep(0.001)
+        return events
+
+    def test_next_scene_is_prefetched(self):
+        self.session.go_to(0)
+        self.assertIsNone(self.session.texture(0))
+        events = self._poll_until_idle()
+        events += self._poll_until_idle()  # The prefetch starts once the current scene is ready
+        self.assertEqual([(0, SceneSession.EVENT_READY), (1, SceneSession.EVENT_READY)],
+                         [(index, event) for index, event, _ in events])
+        self.assertIsNotNone(self.session.texture(1))
+        self.assertIsNone(self.session.texture(2))
+        self.assertEqual(1, self.session.bounding_boxes(1)[0].left)
+
+    def test_scene_textures_render_like_their_images(self):
+        runner = HeadlessRunner(Image.new('RGB', (1, 1)), window_size=(40, 30), context=CONTEXT)
+        for index in (0, 1, 2, 0):
+            self.session.go_to(index)
+            self._poll_until_idle()
+            runner.graphic_engine.set_texture(self.session.texture(index), self.session.image_size(index))
+            expected = np.asarray(self.images[index])[0, 0]
+            self.assertEqual(expected.tolist(), runner.render()[15, 20, :3].tolist())
+        runner.destroy()
+
+    def test_load_playlist(self):
+        playlist_path = os.path.join(self.folder.name, "playlist.json")
+        json.dump([{"image_path": "scene_0.png", "bounding_box_file_path": "scene_0.json"}], open(playlist_path, 'w'))
+        self.assertEqual([self.scenes[0]], SceneSession.load_playlist(playlist_path))
+
+    def test_added_scene_is_played_after_the_others(self):
+        session = SceneSession(CONTEXT, self.scenes[:1], rows_per_strip=8)
+        bounding_boxes = self.session.bounding_boxes(2)
+        self.assertEqual(1, session.add_scene(self.scenes[2], bounding_boxes, (41, 30)))
+        self.assertIs(bounding_boxes, session.bounding_boxes(1))
+        self.assertEqual((41, 30), session.image_size(1))
+        self.assertEqual(2, session.add_scene(self.scenes[1]))
+        self.assertEqual(1, session.bounding_boxes(2)[0].left)
+        session.release()
+
+    def test_unreadable_images_do_not_stop_the_other_scenes(self):
+        # Scene 1 is not an image at all, and scene 2 is truncated, so only decoding it fails
+        open(self.scenes[1].image_path, 'wb').write(b"not an image")
+        png_bytes = open(self.scenes[2].image_path, 'rb').read()
+        open(self.scenes[2].image_path, 'wb').write(png_bytes[:len(png_bytes) // 2])
+        session = SceneSession(CONTEXT, self.scenes + [self.scenes[0]], rows_per_strip=8)
+        session.go_to(0)
+        events = []
+        for index in (0, 1, 2, 3):
+            session.go_to(index)
+            deadline = time.time() + 10
+            while session.is_busy and time.time() < deadline:
+                events += session.poll()
+                time.sleep(0.001)
+        self.assertEqual({(0, SceneSession.EVENT_READY), (1, SceneSession.EVENT_ERROR),
+                          (2, SceneSession.EVENT_ERROR), (3, SceneSession.EVENT_READY)},
+                         {(index, event) for index, event, _ in events})
+        self.assertEqual(1, len([event for index, event, _ in events if index == 1]))
+        self.assertEqual(SceneSession.UNREADABLE_IMAGE_SIZE, session.image_size(1))
+        self.assertIsInstance(session.error(2), OSError)
+        self.assertIsNone(session.error(3))
+        self.assertIsNotNone(session.texture(3))
+        session.release()
+
+    def test_unreadable_bounding_boxes_fail_the_scene(self):
+        os.remove(self.scenes[1].bounding_box_file_path)
+        open(self.scenes[2].bounding_box_file_path, 'w').write("{not json")
+        self.assertEqual(0, len(self.session.bounding_boxes(1)))
+        self.assertEqual(0, len(self.session.bounding_boxes(2)))
+        self.assertIsInstance(self.session.error(1), OSError)
+        self.assertIsInstance(self.session.error(2), ValueError)
+        self.assertIsNone(self.session.error(0))
+        self.assertEqual([(1, SceneSession.EVENT_ERROR), (2, SceneSession.EVENT_ERROR)],
+                         [(index, event) for index, event, _ in self.session.poll()])
+
+    def test_playlist_entry_without_a_target_box_fails_the_scene(self):
+        json.dump([{"left": 0, "top": 0, "right": 10, "bottom": 10, "label": "wenda"}],
+                  open(self.scenes[1].bounding_box_file_path, 'w'))
+        playlist_path = os.path.join(self.folder.name, "playlist.json")
+        json.dump([{"image_path": f"scene_{idx}.png", "bounding_box_file_path": f"scene_{idx}.json"} for idx in (0, 1)],
+                  open(playlist_path, 'w'))
+        session = SceneSession(CONTEXT, SceneSession.load_playlist(playlist_path), rows_per_strip=8,
+                               target_label="waldo")
+        self.assertEqual(1, len(session.bounding_boxes(0)))
+        self.assertEqual(["wenda"], session.bounding_boxes(1).labels)
+        self.assertIsNone(session.error(0))
+        self.assertIsInstance(session.error(1), ValueError)
+        self.assertEqual([(1, SceneSession.EVENT_ERROR)], [(index, event) for index, event, _ in session.poll()])
+        # Boxes that were loaded elsewhere are checked too
+        self.assertEqual(2, session.add_scene(self.scenes[1], session.bounding_boxes(1)))
+        self.assertIsInstance(session.error(2), ValueError)
+        session.release()
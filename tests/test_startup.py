@@ -0,0 +1,91 @@
+import subprocess
+import sys
+import time
+from unittest import TestCase, skipIf
+
+import numpy as np
+from mock import patch
+from PIL import Image
+
+from src.graphic_engine import graphic_engine_initializer
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer
+from src.headless_runner import HeadlessRunner
+from src.startup_profiler import StartupProfiler
+from tests.headless_context import CONTEXT, restore_shared_context
+
+
+class TestStartupProfiler(TestCase):
+
+    def test_marks_and_stages(self):
+        start = time.perf_counter()
+        profiler = StartupProfiler(enabled=True)
+        with profiler.stage("stage"):
+            time.sleep(0.01)
+        time.sleep(0.01)
+        profiler.mark("mark")
+        elapsed_seconds = time.perf_counter() - start
+        self.assertEqual(["stage", "mark"], [name for name, _ in profiler.timings_seconds])
+        # The mark starts when the stage ended, and does not include it (sleep only bounds the timings from below)
+        (_, stage_seconds), (_, mark_seconds) = profiler.timings_seconds
+        self.assertGreaterEqual(stage_seconds, 0.01)
+        self.assertGreaterEqual(mark_seconds, 0.01)
+        self.assertLessEqual(stage_seconds + mark_seconds, elapsed_seconds)
+        self.assertIn("mark", profiler.report())
+
+    def test_disabled_profiler_records_nothing(self):
+        profiler = StartupProfiler()
+        with profiler.stage("stage"):
+            pass
+        profiler.mark("mark")
+        profiler.import_modules(["json"])
+        self.assertEqual([], profiler.timings_seconds)
+
+    def test_only_modules_that_were_not_imported_are_timed(self):
+        profiler = StartupProfiler(enabled=True)
+        profiler.import_modules(["sys", "json"])
+        self.assertNotIn("import sys", [name for name, _ in profiler.timings_seconds])
+
+    def test_help_does_not_import_the_app(self):
+        code = ("import runpy, sys; sys.argv = ['run_where_is_waldo.py', '--help']\n"
+                "try:\n    runpy.run_path('run_where_is_waldo.py', run_name='__main__')\n"
+                "except SystemExit:\n    pass\n"
+                "print(sorted(name for name in ('numpy', 'moderngl', 'tkinter', 'glm') if name in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual("[]", output.strip().splitlines()[-1])
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestProgramCache(TestCase):
+
+    def setUp(self):
+        self.image = Image.fromarray(np.random.RandomState(0).randint(0, 256, (6, 8, 3), dtype=np.uint8), 'RGB')
+
+    def test_engines_of_a_context_share_their_programs(self):
+        first, second = HeadlessRunner(self.image, context=CONTEXT), HeadlessRunner(self.image, context=CONTEXT)
+        self.assertIs(first.graphic_engine._program, second.graphic_engine._program)
+        first.graphic_engine.enable_markers(2)
+        second.graphic_engine.enable_markers(2)
+        self.assertIs(first.graphic_engine._marker_layer._program, second.graphic_engine._marker_layer._program)
+
+        expected = second.render()
+        first.destroy()
+        # The shared program is still alive
+        np.testing.assert_array_equal(expected, second.render())
+        second.destroy()
+
+    def test_programs_are_released_with_their_context(self):
+        runner = HeadlessRunner(self.image)
+        self.assertTrue(GraphicEngineInitializer.is_shared_program(runner.context, runner.graphic_engine._program))
+        runner.destroy()
+        # The cache does not hold the context, or its released programs
+        self.assertNotIn(runner.context, GraphicEngineInitializer._programs)
+        restore_shared_context()
+
+    def test_shader_sources_are_read_once(self):
+        HeadlessRunner(self.image, context=CONTEXT).destroy()
+        with patch.object(GraphicEngineInitializer, 'CACHE_PROGRAMS', False), \
+                patch("builtins.open", side_effect=AssertionError("read a shader file again")):
+            runner = HeadlessRunner(self.image, context=CONTEXT)
+        self.assertFalse(GraphicEngineInitializer.is_shared_program(CONTEXT, runner.graphic_engine._program))
+        runner.destroy()
+        self.assertGreater(graphic_engine_initializer.read_shader_source.cache_info().hits, 0)
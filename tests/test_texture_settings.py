@@ -0,0 +1,82 @@
+from unittest import TestCase, skipIf
+
+import moderngl
+import numpy as np
+from PIL import Image
+
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer, TextureMemoryBudgetExceeded, \
+    TextureSettings, texture_gpu_bytes
+from src.graphic_engine.progressive_texture_upload import ProgressiveTextureUpload
+from src.graphic_engine.tiled_texture import TiledTexture
+from src.headless_runner import HeadlessRunner
+from tests.headless_context import CONTEXT
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestTextureSettings(TestCase):
+
+    def setUp(self):
+        self.initializer = GraphicEngineInitializer()
+        # An odd width, so RGB rows are not aligned to 4 bytes
+        self.pixels = np.random.RandomState(0).randint(0, 256, (30, 41, 3), dtype=np.uint8)
+
+    def _load(self, image, settings: TextureSettings = None) -> moderngl.Texture:
+        texture = self.initializer.load_image_to_texture(CONTEXT, image, tiled=False, settings=settings)
+        self.addCleanup(texture.release)
+        return texture
+
+    def test_odd_width_rgb_image_is_uploaded_unskewed(self):
+        texture = self._load(Image.fromarray(self.pixels, 'RGB'))
+        self.assertEqual(3, texture.components)
+        uploaded = np.frombuffer(texture.read(alignment=1), np.uint8).reshape(self.pixels.shape)
+        np.testing.assert_array_equal(self.pixels, uploaded)
+
+    def test_texture_components_follow_the_image_mode(self):
+        self.assertEqual(1, self._load(Image.fromarray(self.pixels[:, :, 0], 'L')).components)
+        self.assertEqual(4, self._load(Image.new('RGBA', (5, 3))).components)
+        self.assertEqual(3, self._load(Image.new('P', (5, 3))).components)
+        self.assertEqual(1, self._load(self.pixels, TextureSettings(texture_format=TextureSettings.FORMAT_GRAY))
+                         .components)
+        with self.assertRaises(ValueError):
+            self._load(self.pixels, TextureSettings(texture_format='bgr'))
+
+    def test_grayscale_texture_renders_gray(self):
+        gray = self.pixels[:, :, 0]
+        runner = HeadlessRunner(Image.fromarray(gray, 'L'), context=CONTEXT)
+        rendered = runner.render()
+        runner.destroy()
+        np.testing.assert_array_equal(np.stack([gray] * 3, axis=2), rendered[:, :, :3])
+
+    def test_mipmaps_use_trilinear_minification_and_more_memory(self):
+        image = Image.fromarray(self.pixels, 'RGB')
+        with_mipmaps = self._load(image)
+        without_mipmaps = self._load(image, TextureSettings(mipmaps=False))
+        self.assertEqual((moderngl.LINEAR_MIPMAP_LINEAR, moderngl.NEAREST), with_mipmaps.filter)
+        self.assertEqual((moderngl.NEAREST, moderngl.NEAREST), without_mipmaps.filter)
+        self.assertEqual(41 * 30 * 3, texture_gpu_bytes(without_mipmaps))
+        self.assertEqual(41 * 30 * 3 * 4 // 3, texture_gpu_bytes(with_mipmaps))
+
+    def test_over_budget_texture_is_refused(self):
+        settings = TextureSettings(memory_budget_bytes=1000, over_budget=TextureSettings.OVER_BUDGET_REFUSE)
+        with self.assertRaises(TextureMemoryBudgetExceeded):
+            self._load(self.pixels, settings)
+
+    def test_over_budget_texture_is_downscaled(self):
+        texture = self._load(self.pixels, TextureSettings(memory_budget_bytes=1000))
+        self.assertEqual((11, 8), texture.size)
+        self.assertLessEqual(texture_gpu_bytes(texture), 1000)
+
+    def test_over_budget_texture_is_tiled(self):
+        settings = TextureSettings(memory_budget_bytes=1000, over_budget=TextureSettings.OVER_BUDGET_TILE)
+        texture = self.initializer.load_image_to_texture(CONTEXT, self.pixels, settings=settings)
+        self.addCleanup(texture.release)
+        self.assertIsInstance(texture, TiledTexture)
+        self.assertEqual((41, 30), texture.size)
+        self.assertEqual(1000, texture.memory_budget_bytes)
+
+        upload = ProgressiveTextureUpload(CONTEXT, self.pixels, settings=settings)
+        self.addCleanup(upload.release)
+        self.assertTrue(upload.is_complete)
+        self.assertIsInstance(upload.texture, TiledTexture)
+        # Within the budget, the image is a single texture
+        self.assertFalse(self.initializer.is_tiled(CONTEXT, self.pixels[:8, :8], settings))
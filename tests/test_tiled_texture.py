@@ -0,0 +1,65 @@
+from unittest import TestCase, skipIf
+
+import glm
+import numpy as np
+from mock import patch
+from PIL import Image
+
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+from src.graphic_engine.graphic_engine import GraphicEngine
+from src.graphic_engine.tiled_texture import TiledTexture
+from tests.headless_context import CONTEXT
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestTiledTexture(TestCase):
+    IMAGE_SIZE = (10, 7)
+
+    def setUp(self):
+        pixels = np.random.RandomState(0).randint(0, 256, (self.IMAGE_SIZE[1], self.IMAGE_SIZE[0], 3), dtype=np.uint8)
+        self.image = Image.fromarray(pixels, 'RGB')
+
+    def _render(self, tiled: bool, window_model_mat: glm.mat4 = glm.mat4()) -> bytes:
+        graphic_engine = GraphicEngine(CONTEXT, self.IMAGE_SIZE, self.image, tiled=tiled)
+        graphic_engine._set_window_model_mat(window_model_mat)
+        readback = FramebufferReadback(CONTEXT, self.IMAGE_SIZE, FramebufferReadback.MODE_READ)
+        with readback.scope:
+            graphic_engine.clear()
+            graphic_engine.render()
+        readback.finish_frame()
+        pixels = bytes(readback.take_pixels())
+        readback.release()
+        graphic_engine.destroy()
+        return pixels
+
+    @patch.object(TiledTexture, 'TILE_SIZE_PIXELS', 4)
+    def test_tiled_texture_renders_like_a_single_texture(self):
+        self.assertEqual(self._render(tiled=False), self._render(tiled=True))
+        zoom_mat = glm.translate(glm.scale(glm.mat4(), glm.vec3(3, 3, 1)), glm.vec3(-0.1, 0.2, 0))
+        self.assertEqual(self._render(tiled=False, window_model_mat=zoom_mat),
+                         self._render(tiled=True, window_model_mat=zoom_mat))
+
+    def test_only_visible_tiles_are_uploaded(self):
+        tiled_texture = TiledTexture(CONTEXT, self.image, tile_size_pixels=4)
+        self.assertEqual(3, tiled_texture.num_levels)
+        # Zoom in x2 on the bottom left quarter of the image
+        window_model_mat = glm.translate(glm.scale(glm.mat4(), glm.vec3(2, 2, 1)), glm.vec3(0.5, 0.5, 0))
+        tiles = tiled_texture.visible_tiles(window_model_mat, (20, 14))
+        self.assertEqual([(-1.0, -0.142857, -0.2, 1.0), (-0.2, -0.142857, 0.6, 1.0),
+                          (-1.0, -1.0, -0.2, -0.142857), (-0.2, -1.0, 0.6, -0.142857)],
+                         [tuple(round(c, 6) for c in tile_xy_rect) for _, tile_xy_rect in tiles])
+        tiled_texture.release()
+
+    def test_level_of_detail_follows_the_window_resolution(self):
+        tiled_texture = TiledTexture(CONTEXT, self.image, tile_size_pixels=2)
+        self.assertEqual(0, tiled_texture.level_of_detail(glm.mat4(), 10))
+        self.assertEqual(1, tiled_texture.level_of_detail(glm.mat4(), 5))
+        self.assertEqual(tiled_texture.num_levels - 1, tiled_texture.level_of_detail(glm.mat4(), 1))
+
+    def test_memory_budget_evicts_least_recently_used_tiles(self):
+        tiled_texture = TiledTexture(CONTEXT, self.image, tile_size_pixels=4, memory_budget_bytes=4 * 4 * 3 * 2)
+        for x_offset in (0.5, -0.5, 0.5):
+            window_model_mat = glm.translate(glm.scale(glm.mat4(), glm.vec3(4, 4, 1)), glm.vec3(x_offset, 0, 0))
+            tiled_texture.visible_tiles(window_model_mat, (40, 28))
+            self.assertLessEqual(tiled_texture.bytes_used, tiled_texture.memory_budget_bytes)
+        tiled_texture.release()
@@ -0,0 +1,57 @@
+from unittest import TestCase, skipIf
+
+import numpy as np
+from PIL import Image
+
+from src.graphic_engine.framebuffer_readback import FramebufferReadback
+from src.graphic_engine.graphic_engine_initializer import GraphicEngineInitializer
+from src.graphic_engine.view_group import ViewGroup
+from tests.headless_context import CONTEXT
+
+
+@skipIf(CONTEXT is None, "No OpenGL context available")
+class TestViewGroup(TestCase):
+
+    def setUp(self):
+        self.image = Image.fromarray(np.random.RandomState(0).randint(0, 256, (48, 64, 3), dtype=np.uint8), 'RGB')
+        self.views = ViewGroup(CONTEXT, self.image.size)
+        self.framebuffers = [FramebufferReadback(CONTEXT, size) for size in ((64, 48), (64, 48), (32, 24))]
+        self.main = self.views.add_view((64, 48), self.framebuffers[0])
+        self.detail = self.views.add_view((64, 48), self.framebuffers[1], follow_zoom_ratio=2.0)
+        self.minimap = self.views.add_view((32, 24), self.framebuffers[2])
+        self.views.replace_image(self.image)
+
+    def tearDown(self):
+        self.views.release()
+        for framebuffer in self.framebuffers:
+            framebuffer.release()
+
+    def _frame(self, view_idx: int) -> np.ndarray:
+        framebuffer = self.framebuffers[view_idx]
+        return np.frombuffer(framebuffer.take_pixels(), dtype=np.uint8).reshape(
+            framebuffer.size[1], framebuffer.size[0], framebuffer.components)[:, :, :3]
+
+    def test_views_share_the_texture_and_the_program(self):
+        self.assertIs(self.main.texture, self.detail.texture)
+        self.assertIs(self.main.texture, self.minimap.texture)
+        for graphic_engine in (self.main, self.detail, self.minimap):
+            self.assertTrue(GraphicEngineInitializer.is_shared_program(CONTEXT, graphic_engine._program))
+
+    def test_only_damaged_views_are_rendered(self):
+        self.assertEqual(3, len(self.views.render()))
+        np.testing.assert_array_equal(np.asarray(self.image), self._frame(0))
+        self.assertEqual([], self.views.render())
+
+        # The detail view follows the main view, the minimap keeps showing the whole image
+        self.main.zoom(2.0, 32, 24)
+        self.assertEqual([self.main, self.detail], [view.graphic_engine for view in self.views.render()])
+        self.assertEqual(4.0, self.detail.view_zoom)
+        self.main.pan(4, 0)
+        self.views.render()
+        np.testing.assert_allclose(self.main.view_center_xy, self.detail.view_center_xy)
+
+    def test_follower_with_the_same_zoom_renders_the_same_frame(self):
+        self.views.view_of(self.detail).follow_zoom_ratio = 1.0
+        self.main.zoom(3.0, 10, 10)
+        self.views.render()
+        np.testing.assert_array_equal(self._frame(0), self._frame(1))